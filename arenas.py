@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from multiprocessing import reduction
+
+import server
+from logs import AsyncLog
+
+# Several arenas, one process each
+#
+# The world in server.py is a set of module globals run by one game loop,
+# so a single process and its GIL cap how many players one server can take.
+# With --arenas every arena is a worker process running its own copy of
+# that world and its own game loop, and a router process owns the public
+# port: it accepts each TCP connection, picks an arena and passes the
+# socket itself to that worker over a Unix socket pair (SCM_RIGHTS), so
+# the client never reconnects and the router is out of the data path
+# from then on.
+#
+# Arenas are filled one at a time up to --arena-size players, so a few
+# players still meet in the same arena; once every arena is full the
+# least loaded one takes the next player. Each worker reports how many
+# players have left it, the router knows how many it sent there.
+#
+# UDP datagrams cannot be handed over, so arena i binds its own UDP port,
+# --port + 1 + i, and its welcome message tells the client where to send.
+# Spectator relays subscribe to one arena each, arena i on --relay-port + i.
+
+REPORT = struct.Struct("!I")  # Players that have left the arena so far
+REPORT_INTERVAL = 0.25  # Seconds between an arena's departure reports
+SHUTDOWN_TIMEOUT = 3  # Seconds the router waits for arenas to exit before killing them
+
+log = AsyncLog()
+
+
+def available_cores():
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def arena_count(requested):
+    """Arenas to start for --arenas, 0 meaning one per core left after the router"""
+    if requested > 0:
+        return requested
+    return max(1, available_cores() - 1)
+
+
+def arena_options(args, index):
+    """The command line options of one arena: its own UDP, relay and metrics ports, seed and recording"""
+    options = argparse.Namespace(**vars(args))
+    options.udp_port = args.port + 1 + index if args.udp else 0
+    options.relay_port = args.relay_port + index if args.relay_port else 0
+    if args.metrics_port:
+        options.metrics_port = args.metrics_port + index
+    if args.seed is not None:
+        options.seed = args.seed + index
+    if args.record:
+        root, ext = os.path.splitext(args.record)
+        options.record = f"{root}.arena{index}{ext}"
+    return options
+
+
+# Arena worker
+
+def report_departures(control):
+    """Tell the router how many players left, whenever that changes"""
+    reported = 0
+    while True:
+        time.sleep(REPORT_INTERVAL)
+        departures = server.departures.value
+        if departures != reported:
+            try:
+                control.sendall(REPORT.pack(departures))
+            except OSError:
+                return  # The router is gone
+            reported = departures
+
+
+def receive_connection(control):
+    """The next socket the router handed over, None once the router is gone"""
+    try:
+        fds = reduction.recvfds(control, 1)
+    except (OSError, EOFError, RuntimeError):
+        return None
+    if not fds:
+        return None
+    return socket.socket(fileno=fds[0])
+
+
+def run_arena_threaded(control, options):
+    if options.udp_port:
+        server.open_udp(options.udp_port, server.netsim_options(options))
+    if options.relay_port:
+        server.open_relay_port(options.relay_port)
+    server.start_game_loop()
+    while True:
+        conn = receive_connection(control)
+        if conn is None:
+            break
+        try:
+            server.accept_client(conn, conn.getpeername())
+        except OSError as e:
+            server.log(f"[SERVER] Error taking over a connection: {e}")
+            conn.close()
+
+
+async def run_arena_async(control, options):
+    loop = asyncio.get_running_loop()
+    if options.udp_port:
+        await server.async_open_udp(options.udp_port, server.netsim_options(options))
+    if options.relay_port:
+        await server.async_open_relay_port(options.relay_port)
+    router_gone = loop.create_future()
+
+    async def take_over(conn):
+        reader, writer = await asyncio.open_connection(sock=conn)
+        await server.async_manage_client(reader, writer)
+
+    def on_readable():
+        conn = receive_connection(control)
+        if conn is None:
+            loop.remove_reader(control)
+            if not router_gone.done():
+                router_gone.set_result(None)
+            return
+        loop.create_task(take_over(conn))
+
+    loop.add_reader(control, on_readable)
+    game = loop.create_task(server.async_game_loop())
+    await router_gone
+    game.cancel()
+
+
+def arena_main(index, control, options):
+    """Entry point of an arena worker process"""
+    server.log.output = lambda message: print(f"[ARENA {index}] {message}", flush=True)
+    server.configure(options)
+    threading.Thread(target=report_departures, args=(control,), name="arena-report", daemon=True).start()
+    try:
+        if options.mode == "asyncio":
+            asyncio.run(run_arena_async(control, options))
+        else:
+            run_arena_threaded(control, options)
+    except KeyboardInterrupt:
+        pass  # The router shuts the arenas down
+    finally:
+        server.stop_game_loop()
+        server.stop_recording()
+        server.log.close()
+
+
+# Router
+
+class Arena:
+    """The router's view of one worker process"""
+
+    def __init__(self, index, process, control):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.sent = 0  # Connections handed over
+        self.departures = 0  # Players that left, as last reported
+        self.report = bytearray()
+        self.alive = True
+
+    @property
+    def players(self):
+        return self.sent - self.departures
+
+
+def pick_arena(arenas, arena_size):
+    """The first arena with room, else the least loaded one"""
+    alive = [arena for arena in arenas if arena.alive]
+    if not alive:
+        return None
+    for arena in alive:
+        if arena.players < arena_size:
+            return arena
+    return min(alive, key=lambda arena: arena.players)
+
+
+def start_arenas(args, count):
+    # Spawn instead of fork: the router's threads and sockets stay out of the workers
+    context = multiprocessing.get_context("spawn")
+    arenas = []
+    for index in range(count):
+        router_end, arena_end = socket.socketpair()
+        process = context.Process(target=arena_main, args=(index, arena_end, arena_options(args, index)),
+                                  name=f"arena-{index}", daemon=True)
+        process.start()
+        arena_end.close()
+        arenas.append(Arena(index, process, router_end))
+    return arenas
+
+
+def read_report(arena):
+    """Take in an arena's departure reports, False once the worker is gone"""
+    try:
+        data = arena.control.recv(4096)
+    except OSError:
+        data = b""
+    if not data:
+        return False
+    arena.report += data
+    while len(arena.report) >= REPORT.size:
+        arena.departures, = REPORT.unpack_from(arena.report)
+        del arena.report[:REPORT.size]
+    return True
+
+
+def hand_over(arena, conn, addr):
+    try:
+        reduction.sendfds(arena.control, [conn.fileno()])
+    except OSError as e:
+        log(f"[ROUTER] Could not hand {addr} to arena {arena.index}: {e}")
+        return False
+    arena.sent += 1
+    log(f"[ROUTER] {addr} -> arena {arena.index} ({arena.players} players)")
+    return True
+
+
+def run_router(args):
+    if not hasattr(reduction, "sendfds"):
+        log("[ROUTER] Arenas need to pass sockets between processes, which this platform cannot; use --arenas 1")
+        log.close()
+        return
+    count = arena_count(args.arenas)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    arenas = []
+    try:
+        listener.bind(("0.0.0.0", args.port))
+        listener.listen(128)
+        arenas = start_arenas(args, count)
+        log(f"[ROUTER] Routing port {args.port} to {count} arenas of {args.arena_size} players "
+            f"({available_cores()} cores, {args.mode})")
+        if args.udp:
+            log(f"[ROUTER] Arena UDP ports {args.port + 1}-{args.port + count}")
+        if args.relay_port:
+            log(f"[ROUTER] Arena relay ports {args.relay_port}-{args.relay_port + count - 1}")
+
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        for arena in arenas:
+            selector.register(arena.control, selectors.EVENT_READ, arena)
+
+        while any(arena.alive for arena in arenas):
+            for key, _ in selector.select():
+                arena = key.data
+                if arena is not None:
+                    if not read_report(arena):
+                        selector.unregister(arena.control)
+                        arena.alive = False
+                        log(f"[ROUTER] Arena {arena.index} exited, no more players go there")
+                    continue
+                try:
+                    conn, addr = listener.accept()
+                except OSError as e:
+                    log(f"[ROUTER] Error accepting connections: {e}")
+                    continue
+                with conn:  # The arena has its own copy of the socket once it is handed over
+                    target = pick_arena(arenas, args.arena_size)
+                    if target is None or not hand_over(target, conn, addr):
+                        log(f"[ROUTER] No arena for {addr}, closing")
+        log("[ROUTER] Every arena exited")
+    except KeyboardInterrupt:
+        log("\n[ROUTER] Closing server...")
+    except Exception as e:
+        log(f"[ROUTER] Error: {e}")
+    finally:
+        listener.close()
+        for arena in arenas:
+            arena.control.close()  # Workers stop taking players and shut down
+        for arena in arenas:
+            arena.process.join(SHUTDOWN_TIMEOUT)
+            if arena.process.is_alive():
+                arena.process.kill()
+        log.close()
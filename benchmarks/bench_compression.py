@@ -0,0 +1,179 @@
+"""Snapshot compression: bytes saved versus CPU spent, over recorded matches.
+
+Replays each recording given (server.py --record) through the server's
+simulation, sends every connected player a snapshot at the server's send
+rate like a live match (acked a few snapshots late) and keeps the snapshot
+bodies. Without recordings it plays a seeded synthetic match instead. The
+first half of the snapshots trains a dictionary, the second half is
+compressed with plain zlib, the shipped dictionary (snapshot.zdict) and
+the freshly trained one, at several levels:
+
+    python benchmarks/bench_compression.py [match.rec ...] [--players 30] [--ticks 1200]
+
+--train PATH writes a dictionary trained on all the snapshots to PATH, which
+is how snapshot.zdict is made.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import server  # noqa: E402
+from bullets import make_bullet_pool  # noqa: E402
+from compression import TRAINED_SIZE, SnapshotCodec, load_dictionary, train_dictionary  # noqa: E402
+from entities import InputState  # noqa: E402
+from history import PositionHistory  # noqa: E402
+from pickups import PickupManager  # noqa: E402
+from protocol import FRAME_HEADER, SNAPSHOT_CLIENT, unpack_input  # noqa: E402
+from recording import RecordingReader, REC_TICK, REC_JOIN, REC_LEAVE, REC_INPUT, REC_RTT, REC_INTERP  # noqa: E402
+from rules import VIEW_WIDTH, VIEW_HEIGHT  # noqa: E402
+from stubs import RecordingOutbox  # noqa: E402
+
+ACK_DELAY = 3  # Snapshots between sending one and getting its ack back
+LEVELS = (1, 6, 9)
+
+
+def bodies_of(frames):
+    """Snapshot bodies of the frames the outboxes kept, without the per-client header"""
+    return [frame[FRAME_HEADER.size + SNAPSHOT_CLIENT.size:] for frame in frames]
+
+
+def send_snapshot(tick, sent):
+    """Broadcast one snapshot, with every client acking the one sent ACK_DELAY snapshots ago.
+
+    sent maps each player id to the ticks it was sent.
+    """
+    for pid in server.conns:
+        ticks = sent.get(pid, ())
+        server.acks[pid] = ticks[-ACK_DELAY] if len(ticks) >= ACK_DELAY else 0
+    server.broadcast_snapshot(*server.collect_snapshot(tick))
+    server.snapshot_times.clear()  # Round trips come from the recording, not from these acks
+    for pid in server.conns:
+        sent.setdefault(pid, []).append(tick)
+
+
+def recorded_snapshots(path):
+    """Snapshot bodies of a replayed recording"""
+    reader = RecordingReader(path)
+    server.reset_world()
+    server.TICK_RATE = reader.tick_rate
+    server.history = PositionHistory(reader.history_capacity)
+    server.bullet_pool = make_bullet_pool(reader.backend)
+    server.rng.seed(reader.seed)
+    server.pickups = PickupManager(server.rng, reader.pickup_spawn, reader.pickup_mix, reader.pickups_per_player)
+    server.recorder = None
+    send_every = server.every(1 / server.SEND_RATE)
+    frames = []
+    sent = {}
+    for rec_type, values in reader:
+        if rec_type == REC_TICK:
+            tick = values[0]
+            server.simulate_tick(tick)
+            if tick % send_every == 0 and server.conns:
+                send_snapshot(tick, sent)
+        elif rec_type == REC_INPUT:
+            server.handle_input(values[0], unpack_input(values[1]))
+        elif rec_type == REC_RTT:
+            server.update_rtt(*values)
+        elif rec_type == REC_INTERP:
+            server.set_interp_delay(*values)
+        elif rec_type == REC_JOIN:
+            server.add_player(values[0])
+            server.conns[values[0]] = RecordingOutbox(frames)
+        elif rec_type == REC_LEAVE:
+            server.remove_player(values[0])
+            sent.pop(values[0], None)
+    return bodies_of(frames)
+
+
+def synthetic_snapshots(player_count, ticks, seed):
+    """Snapshot bodies of a seeded match where everyone wanders and shoots"""
+    rng = random.Random(seed)
+    server.reset_world()
+    server.rng.seed(seed)
+    frames = []
+    sent = {}
+    for pid in range(1, player_count + 1):
+        server.add_player(pid)
+        server.conns[pid] = RecordingOutbox(frames)
+    for tick in range(1, ticks + 1):
+        for pid, p in server.players.items():
+            if tick % 30 == 0 or pid not in server.inputs:
+                server.inputs[pid] = InputState(
+                    move_x=rng.randint(-1, 1), move_y=rng.randint(-1, 1), sprint=rng.random() < 0.3,
+                    shoot=(rng.randint(0, VIEW_WIDTH), rng.randint(0, VIEW_HEIGHT)) if rng.random() < 0.5 else None)
+            if p.spectator and tick % 60 == 0:
+                server.handle_input(pid, {"respawn": True, "ack": 0})
+        server.simulate_tick(tick)
+        if tick % 2 == 0:
+            send_snapshot(tick, sent)
+    return bodies_of(frames)
+
+
+def measure(label, codec, bodies, plain_bytes):
+    start = time.perf_counter()
+    compressed = [codec.compress(body) for body in bodies]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for data, body in zip(compressed, bodies):
+        assert codec.decompress(data) == body
+    decompress_time = time.perf_counter() - start
+    size = sum(len(data) for data in compressed)
+    print(f"{label:24s} {size / len(bodies):8.0f} B {size / plain_bytes * 100:6.1f} % "
+          f"{compress_time / len(bodies) * 1e6:9.1f} us {decompress_time / len(bodies) * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", nargs="*", help="files written by server.py --record")
+    parser.add_argument("--players", type=int, default=30, help="players of the synthetic match")
+    parser.add_argument("--ticks", type=int, default=1200, help="ticks of the synthetic match")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dict-size", type=int, default=TRAINED_SIZE, help="bytes of the trained dictionaries")
+    parser.add_argument("--train", metavar="PATH", help="write a dictionary trained on every snapshot to PATH")
+    args = parser.parse_args()
+
+    server.log.enabled = False
+    bodies = []
+    for path in args.recordings:
+        bodies += recorded_snapshots(path)
+    if not args.recordings:
+        bodies = synthetic_snapshots(args.players, args.ticks, args.seed)
+    if len(bodies) < 2:
+        print("Not enough snapshots")
+        return
+
+    if args.train:
+        start = time.perf_counter()
+        dictionary = train_dictionary(bodies, args.dict_size)
+        with open(args.train, "wb") as f:
+            f.write(dictionary)
+        print(f"Trained a {len(dictionary)} B dictionary on {len(bodies)} snapshots "
+              f"in {time.perf_counter() - start:.1f} s, written to {args.train}")
+        return
+
+    half = len(bodies) // 2
+    training, tested = bodies[:half], bodies[half:]
+    plain_bytes = sum(len(body) for body in tested)
+    trained = train_dictionary(training, args.dict_size)
+    shipped = load_dictionary()
+    print(f"{len(tested)} snapshots, {plain_bytes / len(tested):.0f} B on average; "
+          f"dictionaries: shipped {len(shipped)} B, trained on the other {len(training)} snapshots {len(trained)} B")
+    print(f"{'':24s} {'size':>10s} {'ratio':>8s} {'compress':>12s} {'decompress':>12s}")
+    print(f"{'uncompressed':24s} {plain_bytes / len(tested):8.0f} B {100.0:6.1f} %")
+    for level in LEVELS:
+        measure(f"zlib {level}", SnapshotCodec(b"", level), tested, plain_bytes)
+    for level in LEVELS:
+        if shipped:
+            measure(f"zlib {level} + shipped dict", SnapshotCodec(shipped, level), tested, plain_bytes)
+    for level in LEVELS:
+        measure(f"zlib {level} + trained dict", SnapshotCodec(trained, level), tested, plain_bytes)
+    print(f"zlib {zlib.ZLIB_RUNTIME_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
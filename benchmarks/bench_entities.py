@@ -0,0 +1,158 @@
+"""Entity classes with __slots__ versus the plain dicts they replaced.
+
+Measures memory per entity and the cost of the per-player part of a tick
+(input lookup, movement, clamping, shooting cooldown, regeneration) on the
+same seeded inputs, once on dicts with string keys and once on entities.py
+objects, and checks both end in the same state:
+
+    python benchmarks/bench_entities.py [--players 100 1000] [--ticks 300]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from entities import Bullet, InputState, Pickup, Player  # noqa: E402
+
+MAP_SIZE = 2000
+SPEED, SPRINT = 5, 7
+COOLDOWN = 0.2
+
+
+def make_dicts(count, rng):
+    players = {pid: {"x": rng.uniform(50, 1950), "y": rng.uniform(50, 1950), "color": (255, 100, 100),
+                     "health": 100, "spectator": False, "kills": 0, "deaths": 0, "last_shot": -COOLDOWN}
+               for pid in range(1, count + 1)}
+    return players, {}
+
+
+def make_entities(count, rng):
+    players = {pid: Player(rng.uniform(50, 1950), rng.uniform(50, 1950), (255, 100, 100), last_shot=-COOLDOWN)
+               for pid in range(1, count + 1)}
+    return players, {}
+
+
+def random_inputs(count, ticks, seed):
+    rng = random.Random(seed)
+    return [[(rng.randint(-1, 1), rng.randint(-1, 1), rng.random() < 0.3, rng.random() < 0.5,
+              rng.random() < 0.05) for _ in range(count)] for _ in range(ticks)]
+
+
+def tick_dicts(players, inputs, now, regen):
+    shots = 0
+    for pid, p in players.items():
+        if p.get("spectator", False):
+            continue
+        inp = inputs.get(pid, {})
+        move = inp.get("move", [0, 0])
+        speed = SPRINT if inp.get("sprint", False) else SPEED
+        p["x"] += move[0] * speed
+        p["y"] += move[1] * speed
+        p["x"] = max(0, min(p["x"], MAP_SIZE - 40))
+        p["y"] = max(0, min(p["y"], MAP_SIZE - 40))
+        shoot = inp.get("shoot", None)
+        if shoot == "suicide":
+            p["health"] -= 10
+        elif isinstance(shoot, list) and now - p.get("last_shot", 0) > COOLDOWN:
+            p["last_shot"] = now
+            shots += 1
+        if p["health"] <= 0:
+            p["spectator"] = True
+        elif p["health"] < 100 and regen:
+            p["health"] = min(100, p["health"] + 2)
+    return shots
+
+
+def tick_entities(players, inputs, now, regen):
+    shots = 0
+    for pid, p in players.items():
+        if p.spectator:
+            continue
+        inp = inputs[pid]
+        speed = SPRINT if inp.sprint else SPEED
+        p.x = max(0, min(p.x + inp.move_x * speed, MAP_SIZE - 40))
+        p.y = max(0, min(p.y + inp.move_y * speed, MAP_SIZE - 40))
+        shoot = inp.shoot
+        if shoot == "suicide":
+            p.health -= 10
+        elif shoot is not None and now - p.last_shot > COOLDOWN:
+            p.last_shot = now
+            shots += 1
+        if p.health <= 0:
+            p.spectator = True
+        elif p.health < 100 and regen:
+            p.health = min(100, p.health + 2)
+    return shots
+
+
+def run(make, tick, to_input, count, ticks, seed):
+    """Returns (tick times, final (x, y, health) per player)"""
+    players, inputs = make(count, random.Random(seed))
+    times = []
+    for n, tick_inputs in enumerate(random_inputs(count, ticks, seed), 1):
+        # Inputs arrive between ticks, as from the network
+        for pid, record in zip(players, tick_inputs):
+            inputs[pid] = to_input(*record)
+        start = time.perf_counter()
+        tick(players, inputs, n / 60, n % 120 == 0)
+        times.append(time.perf_counter() - start)
+    state = [(round(p["x"], 6), round(p["y"], 6), p["health"]) if isinstance(p, dict)
+             else (round(p.x, 6), round(p.y, 6), p.health) for p in players.values()]
+    return times, state
+
+
+def dict_input(mx, my, sprint, shoot, suicide):
+    return {"move": [mx, my], "sprint": sprint, "shoot": "suicide" if suicide else [400, 300] if shoot else None}
+
+
+def entity_input(mx, my, sprint, shoot, suicide):
+    return InputState(move_x=mx, move_y=my, sprint=sprint,
+                      shoot="suicide" if suicide else (400, 300) if shoot else None)
+
+
+def bytes_per(factory, count=10000):
+    """Average bytes allocated per object built by factory()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    memory = [
+        ("player", lambda i: {"x": i + 0.5, "y": i + 0.5, "color": (1, 2, 3), "health": 100, "spectator": False,
+                              "kills": 0, "deaths": 0, "last_shot": 0.0},
+         lambda i: Player(i + 0.5, i + 0.5, (1, 2, 3))),
+        ("bullet", lambda i: {"x": i + 0.5, "y": i + 0.5, "dx": 0.6, "dy": 0.8, "lifetime": 0},
+         lambda i: Bullet(i + 0.5, i + 0.5, 0.6, 0.8)),
+        ("pickup", lambda i: {"x": i, "y": i, "id": i, "kind": 0}, lambda i: Pickup(i, i, i)),
+        ("input", lambda i: dict_input(1, 0, False, True, False), lambda i: entity_input(1, 0, False, True, False)),
+    ]
+    for name, as_dict, as_entity in memory:
+        print(f"{name:7s} | dict {bytes_per(as_dict):6.0f} B | slots {bytes_per(as_entity):6.0f} B")
+
+    for count in args.players:
+        dict_times, dict_state = run(make_dicts, tick_dicts, dict_input, count, args.ticks, args.seed)
+        slot_times, slot_state = run(make_entities, tick_entities, entity_input, count, args.ticks, args.seed)
+        dict_mean = statistics.mean(dict_times) * 1000
+        slot_mean = statistics.mean(slot_times) * 1000
+        print(f"{count:5d} players | dict: mean {dict_mean:7.3f} ms | slots: mean {slot_mean:7.3f} ms"
+              f" | speedup {dict_mean / slot_mean:4.2f}x | identical: {dict_state == slot_state}")
+
+
+if __name__ == "__main__":
+    main()
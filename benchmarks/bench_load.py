@@ -0,0 +1,201 @@
+"""Server scaling under load from headless bots.
+
+For each player count, starts a fresh server in a child process and
+connects that many bots (bots.py) from one or more bot processes. After a
+warm-up it measures the server's tick time percentiles per phase, its
+overruns and CPU use, and on the bots' side the bytes and snapshots each
+client gets per second and the latency from sending an input to the first
+snapshot that applied it. Prints a table and, with --output, saves
+everything as JSON for regression tracking:
+
+    python benchmarks/bench_load.py [--players 25 50 100 200] [--duration 20] [--output load.json]
+
+Server and bots share the machine, so on small machines the bots' own CPU
+use shows up in the numbers too; --bot-processes spreads them out.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bots import latency_summary  # noqa: E402
+from telemetry import Samples  # noqa: E402
+
+
+def serve(args):
+    """Child process: run the server and answer "reset" and "stats" on stdin"""
+    import server
+    server.log.enabled = False
+    server.tick_timings.keep_samples()  # Exact percentiles, not bucket bounds
+    if args.mode == "asyncio":
+        target = lambda: asyncio.run(server.async_main(args.serve, args.udp))  # noqa: E731
+    else:
+        target = lambda: server.run_threaded(args.serve, args.udp)  # noqa: E731
+    threading.Thread(target=target, daemon=True).start()
+
+    # Ready once the port accepts connections
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", args.serve), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    print("ready", flush=True)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for line in sys.stdin:
+        command = line.strip()
+        if command == "reset":
+            server.tick_timings.reset()
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+        elif command == "stats":
+            net = server.net_stats()
+            rtts = [s["rtt_ms"] for s in net.values() if s["rtt_ms"] is not None]
+            print(json.dumps({
+                "tick": server.tick_stats(),
+                "cpu": (time.process_time() - cpu_start) / (time.perf_counter() - wall_start),
+                "clients": len(net),
+                "dropped_frames": sum(s["dropped_frames"] for s in net.values()),
+                "rtt_ms": sum(rtts) / len(rtts) if rtts else None,
+            }), flush=True)
+
+
+def run(args, count, port):
+    """One player count: fresh server, bots, warm-up, measure"""
+    server_cmd = [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--mode", args.mode]
+    if args.udp:
+        server_cmd.append("--udp")
+    server_proc = subprocess.Popen(server_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    bot_procs = []
+    try:
+        server_proc.stdout.readline()  # "ready"
+
+        processes = max(1, min(args.bot_processes, count))
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(processes):
+                share = count // processes + (i < count % processes)
+                path = os.path.join(tmp, f"bots{i}.json")
+                cmd = [sys.executable, os.path.join(ROOT, "bots.py"), "--port", str(port), "--count", str(share),
+                       "--movement", args.movement, "--shooting", args.shooting,
+                       "--duration", str(args.duration), "--warmup", str(args.warmup),
+                       "--seed", str(args.seed * 1000 + i), "--json", path]
+                if args.udp:
+                    cmd.append("--udp")
+                bot_procs.append((subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True), path))
+            # Each bot process starts its warm-up once all its bots are connected
+            for proc, _ in bot_procs:
+                line = proc.stdout.readline()
+                while line and "bots connected" not in line:
+                    line = proc.stdout.readline()
+
+            time.sleep(args.warmup)
+            server_proc.stdin.write("reset\n")
+            server_proc.stdin.flush()
+            time.sleep(args.duration)
+            server_proc.stdin.write("stats\n")
+            server_proc.stdin.flush()
+            server_stats = json.loads(server_proc.stdout.readline())
+
+            bot_results = []
+            for proc, path in bot_procs:
+                proc.communicate()
+                with open(path) as f:
+                    bot_results.append(json.load(f))
+    finally:
+        for proc, _ in bot_procs:
+            if proc.poll() is None:
+                proc.kill()
+        server_proc.kill()
+        server_proc.wait()
+
+    bots = sum(r["bots"] for r in bot_results)
+    latencies = Samples()
+    for r in bot_results:
+        latencies.merge(Samples(r["latency_samples"]))
+    tick = server_stats["tick"]
+    return {
+        "players": count,
+        "bots_connected": bots,
+        "bots_disconnected": sum(r["disconnected"] for r in bot_results),
+        "ticks": tick["ticks"],
+        "overruns": tick["overruns"],
+        "catch_ups": tick["catch_ups"],
+        "skipped_ticks": tick["skipped_ticks"],
+        "tick_ms": {phase: {key: s[key] * 1000 for key in ("mean", "p50", "p95", "p99", "max")}
+                    for phase, s in tick["phases"].items()},
+        "server_cpu": server_stats["cpu"],
+        "server_dropped_frames": server_stats["dropped_frames"],
+        "server_rtt_ms": server_stats["rtt_ms"],
+        "bytes_per_client_per_s": sum(r["bytes_per_client_per_s"] * r["bots"] for r in bot_results) / max(1, bots),
+        "snapshots_per_client_per_s": sum(r["snapshots_per_client_per_s"] * r["bots"] for r in bot_results)
+                                      / max(1, bots),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=20, help="seconds measured per player count")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds played before measuring")
+    parser.add_argument("--mode", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--udp", action="store_true")
+    parser.add_argument("--movement", default="mixed")
+    parser.add_argument("--shooting", default="mixed")
+    parser.add_argument("--bot-processes", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5600, help="first port, each run uses the next one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON to PATH")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results = []
+    print("players | tick p50/p95/p99 ms | overruns | server cpu |   B/s/client | snaps/s | latency p50/p95 ms")
+    for i, count in enumerate(args.players):
+        r = run(args, count, args.port + i)
+        results.append(r)
+        t, lat = r["tick_ms"]["tick"], r["latency_ms"]
+        print(f"{count:7d} | {t['p50']:5.2f} {t['p95']:5.2f} {t['p99']:5.2f} | {r['overruns']:8d} | "
+              f"{r['server_cpu'] * 100:9.0f}% | {r['bytes_per_client_per_s']:12.0f} | "
+              f"{r['snapshots_per_client_per_s']:7.1f} | {lat['p50']:5.1f} {lat['p95']:5.1f}")
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ("output", "serve")}
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "config": config,
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Game server cost of spectators, connected directly versus through a relay.
+
+Plays a seeded match of --players players and, for each viewer count,
+either joins the viewers to the server as spectators (each holds a player
+slot and gets its own snapshot) or subscribes one relay.py Relay to the
+server and connects the viewers to the relay. Every viewer decodes its
+snapshots like client.py and checks them against the server's players.
+Prints the mean broadcast time per snapshot on the server and, with the
+relay, the relay's time to unpack and fan out each snapshot:
+
+    python benchmarks/bench_relay.py [--players 20] [--viewers 0 10 100 500] [--ticks 240]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import server  # noqa: E402
+from entities import InputState  # noqa: E402
+from protocol import FRAME_HEADER, POSITION_SCALE, decode_snapshot  # noqa: E402
+from relay import Relay, Viewer  # noqa: E402
+from stubs import RecordingOutbox  # noqa: E402
+
+ACK_DELAY = 3  # Snapshots between sending one and getting its ack back
+
+
+class Watcher:
+    """A viewer's decoding side, acking a few snapshots late as over a real link"""
+
+    def __init__(self):
+        self.outbox = RecordingOutbox()
+        self.decoded = {}  # {tick: state}
+        self.ack = 0
+
+    def take(self, players):
+        """Decode the newest frame and check it against the server's players, False if wrong"""
+        state = decode_snapshot(self.outbox.frames.pop()[FRAME_HEADER.size:], self.decoded)
+        if state is None:
+            return False
+        self.decoded[state["tick"]] = state
+        self.ack = sorted(self.decoded)[-ACK_DELAY:][0]
+        for old in [t for t in self.decoded if t < self.ack]:
+            del self.decoded[old]
+        if state["players"].keys() != players.keys():
+            return False
+        tolerance = 1 / POSITION_SCALE
+        return all(abs(p["x"] - players[pid].x) <= tolerance and abs(p["y"] - players[pid].y) <= tolerance
+                   and p["health"] == players[pid].health for pid, p in state["players"].items())
+
+
+def run(player_count, viewer_count, ticks, seed, relayed):
+    """Returns (server seconds per snapshot, relay seconds per snapshot, all decoded correctly)"""
+    rng = random.Random(seed)
+    server.rng.seed(seed)
+    server.reset_world()
+    for pid in range(1, player_count + 1):
+        server.add_player(pid)
+        server.conns[pid] = RecordingOutbox()
+    watchers = [Watcher() for _ in range(viewer_count)]
+    relay = None
+    if relayed:
+        relay_id = player_count + 1
+        server.relays[relay_id] = RecordingOutbox()
+        relay = Relay(server.TICK_RATE)
+        viewers = [Viewer(watcher.outbox) for watcher in watchers]
+        relay.viewers.update(viewers)
+    else:
+        # Today's spectators: a player slot each, kept dead
+        for i, watcher in enumerate(watchers):
+            pid = player_count + 1 + i
+            server.add_player(pid)
+            server.players[pid].spectator = True
+            server.pickups.alive_changed(-1, server.players)
+            server.conns[pid] = watcher.outbox
+
+    server_times = []
+    relay_times = []
+    correct = True
+    for tick in range(1, ticks + 1):
+        for pid in range(1, player_count + 1):
+            server.inputs[pid] = InputState(move_x=rng.randint(-1, 1), move_y=rng.randint(-1, 1),
+                                            shoot=(rng.randint(0, 800), rng.randint(0, 600)))
+            if server.players[pid].spectator and tick % 30 == 0:
+                server.handle_input(pid, {"respawn": True, "ack": server.acks.get(pid, 0)})
+        server.simulate_tick(tick)
+        if tick % 2:
+            continue
+
+        start = time.perf_counter()
+        server.broadcast_snapshot(*server.collect_snapshot(tick))
+        server_times.append(time.perf_counter() - start)
+        for pid in range(1, player_count + 1):
+            server.conns[pid].frames.clear()
+            server.acks[pid] = tick  # Players are not what is measured, keep their deltas small
+
+        if relayed:
+            start = time.perf_counter()
+            frame = server.relays[relay_id].frames.pop()
+            world = relay.receive(frame[FRAME_HEADER.size:])
+            relay.publish(world)
+            relay_times.append(time.perf_counter() - start)
+            server.acks[relay_id] = world["tick"]
+            for viewer, watcher in zip(viewers, watchers):
+                correct &= watcher.take(server.players)
+                viewer.ack = watcher.ack
+        else:
+            for i, watcher in enumerate(watchers):
+                correct &= watcher.take(server.players)
+                server.acks[player_count + 1 + i] = watcher.ack
+    return statistics.mean(server_times), statistics.mean(relay_times) if relay_times else 0.0, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=20, help="players in the match")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[0, 10, 100, 500])
+    parser.add_argument("--ticks", type=int, default=240)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server.log.enabled = False
+
+    for count in args.viewers:
+        direct, _, direct_ok = run(args.players, count, args.ticks, args.seed, False)
+        served, relayed, relay_ok = run(args.players, count, args.ticks, args.seed, True)
+        print(f"{count:4d} viewers | on the server: {direct * 1e3:7.3f} ms/snapshot  correct: {direct_ok} | "
+              f"through a relay: server {served * 1e3:7.3f} ms/snapshot, relay {relayed * 1e3:7.3f} ms/snapshot  "
+              f"correct: {relay_ok}")
+
+
+if __name__ == "__main__":
+    main()
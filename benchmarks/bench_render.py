@@ -0,0 +1,192 @@
+"""Client frame render time, immediate drawing versus the render cache.
+
+Draws the same seeded scene (players with bullets, pickups, grid, minimap,
+HUD text, spectator overlay) with a panning camera, once the way client.py
+used to draw every frame and once through render.py's caches, and prints
+the mean time per frame of each. Runs headless:
+
+    python benchmarks/bench_render.py [--players 20 100] [--frames 300]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame  # noqa: E402
+
+from render import RenderCache, TextCache  # noqa: E402
+from rules import MAP_WIDTH, MAP_HEIGHT, VIEW_WIDTH as WIDTH, VIEW_HEIGHT as HEIGHT  # noqa: E402
+
+MINIMAP = (220, 165)
+
+
+def make_scene(player_count, seed):
+    rng = random.Random(seed)
+    players = {}
+    for pid in range(1, player_count + 1):
+        x, y = rng.uniform(0, MAP_WIDTH - 40), rng.uniform(0, MAP_HEIGHT - 40)
+        players[pid] = {"x": x, "y": y, "health": rng.randint(1, 100), "spectator": False,
+                        "color": rng.choice([(255, 100, 100), (100, 255, 100), (100, 100, 255)]),
+                        "bullets": [{"x": x + rng.uniform(-300, 300), "y": y + rng.uniform(-300, 300)}
+                                    for _ in range(rng.randint(0, 10))]}
+    pickups = [{"x": rng.randint(30, MAP_WIDTH - 30), "y": rng.randint(30, MAP_HEIGHT - 30)}
+               for _ in range(player_count)]
+    return players, pickups
+
+
+def cameras(frames):
+    """A camera panning around the map"""
+    for i in range(frames):
+        t = i / 60
+        yield ((MAP_WIDTH - WIDTH) * (0.5 + 0.5 * math.sin(t)),
+               (MAP_HEIGHT - HEIGHT) * (0.5 + 0.5 * math.cos(t * 0.7)))
+
+
+def health_color(ratio):
+    return (0, 255, 0) if ratio > 0.6 else (255, 255, 0) if ratio > 0.3 else (255, 0, 0)
+
+
+def draw_immediate(win, fonts, players, pickups, cam_x, cam_y, frame):
+    """Everything drawn from scratch, as client.py did before the render cache"""
+    font_small, font_medium, font_large = fonts
+    win.fill((40, 40, 40))
+    for gx in range(0, MAP_WIDTH, 100):
+        if -100 <= gx - cam_x <= WIDTH + 100:
+            color = (60, 60, 60) if (gx // 100) % 2 == 0 else (50, 50, 50)
+            pygame.draw.line(win, color, (gx - cam_x, 0 - cam_y), (gx - cam_x, MAP_HEIGHT - cam_y))
+    for gy in range(0, MAP_HEIGHT, 100):
+        if -100 <= gy - cam_y <= HEIGHT + 100:
+            color = (60, 60, 60) if (gy // 100) % 2 == 0 else (50, 50, 50)
+            pygame.draw.line(win, color, (0 - cam_x, gy - cam_y), (MAP_WIDTH - cam_x, gy - cam_y))
+    for gx in range(0, MAP_WIDTH, 200):
+        if 0 <= gx - cam_x < WIDTH:
+            win.blit(font_small.render(str(gx), True, (150, 150, 150)), (gx - cam_x, 5))
+    for gy in range(0, MAP_HEIGHT, 200):
+        if 0 <= gy - cam_y < HEIGHT:
+            win.blit(font_small.render(str(gy), True, (150, 150, 150)), (5, gy - cam_y))
+    pulse = int(5 + 3 * math.sin(frame / 15))
+    for pickup in pickups:
+        px, py = int(pickup["x"] - cam_x), int(pickup["y"] - cam_y)
+        if -20 <= px <= WIDTH + 20 and -20 <= py <= HEIGHT + 20:
+            pygame.draw.circle(win, (255, 100, 100), (px, py), 15 + pulse // 2)
+            pygame.draw.circle(win, (200, 50, 50), (px, py), 12)
+            pygame.draw.line(win, (255, 255, 255), (px - 5, py), (px + 5, py), 2)
+            pygame.draw.line(win, (255, 255, 255), (px, py - 5), (px, py + 5), 2)
+    for pid, p in players.items():
+        if not (-50 <= p["x"] - cam_x <= WIDTH + 50 and -50 <= p["y"] - cam_y <= HEIGHT + 50):
+            continue
+        if pid == 1:
+            pygame.draw.rect(win, (255, 255, 255), (p["x"] - cam_x - 2, p["y"] - cam_y - 2, 44, 44))
+        pygame.draw.rect(win, p["color"], (p["x"] - cam_x, p["y"] - cam_y, 40, 40))
+        for b in p["bullets"]:
+            bx, by = int(b["x"] - cam_x), int(b["y"] - cam_y)
+            if -10 <= bx <= WIDTH + 10 and -10 <= by <= HEIGHT + 10:
+                pygame.draw.circle(win, (255, 255, 100), (bx, by), 4)
+                pygame.draw.circle(win, (255, 255, 255), (bx, by), 2)
+        ratio = p["health"] / 100
+        pygame.draw.rect(win, (100, 100, 100), (p["x"] - cam_x - 2, p["y"] - 15 - cam_y, 45, 6))
+        pygame.draw.rect(win, health_color(ratio), (p["x"] - cam_x, p["y"] - 13 - cam_y, int(45 * ratio) - 4, 4))
+    minimap = pygame.Surface(MINIMAP, pygame.SRCALPHA)
+    draw_minimap(minimap, players, pickups)
+    win.blit(minimap, (WIDTH - MINIMAP[0] - 10, HEIGHT - MINIMAP[1] - 10))
+    draw_hud(win, lambda font, text, color: font.render(text, True, color), fonts, players, pickups)
+    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    overlay.fill((0, 0, 0, 100))
+    win.blit(overlay, (0, 0))
+
+
+def draw_cached(win, cache, texts, players, pickups, cam_x, cam_y, frame):
+    """The same frame through the render cache, as client.py draws it now"""
+    cache.draw_map(win, cam_x, cam_y)
+    sprite = cache.pickup(int(5 + 3 * math.sin(frame / 15)))
+    half = sprite.get_width() // 2
+    for pickup in pickups:
+        px, py = int(pickup["x"] - cam_x), int(pickup["y"] - cam_y)
+        if -20 <= px <= WIDTH + 20 and -20 <= py <= HEIGHT + 20:
+            win.blit(sprite, (px - half, py - half))
+    for pid, p in players.items():
+        if not (-50 <= p["x"] - cam_x <= WIDTH + 50 and -50 <= p["y"] - cam_y <= HEIGHT + 50):
+            continue
+        if pid == 1:
+            win.blit(cache.player(p["color"], True), (p["x"] - cam_x - 2, p["y"] - cam_y - 2))
+        else:
+            win.blit(cache.player(p["color"]), (p["x"] - cam_x, p["y"] - cam_y))
+        for b in p["bullets"]:
+            bx, by = int(b["x"] - cam_x), int(b["y"] - cam_y)
+            if -10 <= bx <= WIDTH + 10 and -10 <= by <= HEIGHT + 10:
+                win.blit(cache.bullet, (bx - 4, by - 4))
+        ratio = p["health"] / 100
+        win.fill((100, 100, 100), (p["x"] - cam_x - 2, p["y"] - 15 - cam_y, 45, 6))
+        win.fill(health_color(ratio), (p["x"] - cam_x, p["y"] - 13 - cam_y, max(0, int(45 * ratio) - 4), 4))
+    cache.minimap.fill((20, 20, 20, 200))
+    draw_minimap(cache.minimap, players, pickups)
+    win.blit(cache.minimap, (WIDTH - MINIMAP[0] - 10, HEIGHT - MINIMAP[1] - 10))
+    draw_hud(win, lambda cache, text, color: cache.render(text, color), texts, players, pickups)
+    win.blit(cache.overlay, (0, 0))
+
+
+def draw_minimap(surface, players, pickups):
+    if surface.get_at((0, 0)).a == 0:
+        surface.fill((20, 20, 20, 200))
+    sx, sy = (MINIMAP[0] - 20) / MAP_WIDTH, (MINIMAP[1] - 20) / MAP_HEIGHT
+    for pickup in pickups:
+        pygame.draw.circle(surface, (255, 100, 100), (int(pickup["x"] * sx) + 10, int(pickup["y"] * sy) + 10), 3)
+    for p in players.values():
+        pygame.draw.circle(surface, p["color"], (int(p["x"] * sx) + 10, int(p["y"] * sy) + 10), 6)
+    pygame.draw.rect(surface, (200, 200, 200), (0, 0) + MINIMAP, 2)
+
+
+def draw_hud(win, render, fonts, players, pickups):
+    small, medium, large = fonts
+    lines = [(small, "FPS: 60", (200, 200, 200)),
+             (small, f"Players: {len(players)}/{len(players)}", (200, 200, 200)),
+             (small, f"Available health pickups: {len(pickups)}", (255, 100, 100)),
+             (small, "K/D: 3/1 (3.00)", (200, 200, 200)),
+             (large, "SPECTATOR MODE", (255, 255, 255)),
+             (medium, "Press R to respawn", (200, 200, 200)),
+             (small, "WASD: Move camera | Shift: Sprint", (150, 150, 150))]
+    for i, (font, text, color) in enumerate(lines):
+        win.blit(render(font, text, color), (10, 10 + i * 25))
+
+
+def measure(draw, frames):
+    times = []
+    for frame, (cam_x, cam_y) in enumerate(cameras(frames)):
+        start = time.perf_counter()
+        draw(frame, cam_x, cam_y)
+        times.append(time.perf_counter() - start)
+    return statistics.mean(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pygame.init()
+    win = pygame.display.set_mode((WIDTH, HEIGHT))
+    fonts = (pygame.font.SysFont(None, 24), pygame.font.SysFont(None, 32), pygame.font.SysFont(None, 48))
+    texts = tuple(TextCache(font) for font in fonts)
+    start = time.perf_counter()
+    cache = RenderCache(fonts[0], (WIDTH, HEIGHT), MINIMAP)
+    print(f"render cache built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for count in args.players:
+        players, pickups = make_scene(count, args.seed)
+        immediate = measure(lambda f, x, y: draw_immediate(win, fonts, players, pickups, x, y, f), args.frames)
+        cached = measure(lambda f, x, y: draw_cached(win, cache, texts, players, pickups, x, y, f), args.frames)
+        print(f"{count:4d} players | immediate: {immediate:6.3f} ms/frame | cached: {cached:6.3f} ms/frame"
+              f" | speedup {immediate / cached:4.2f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
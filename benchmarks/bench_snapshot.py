@@ -0,0 +1,95 @@
+"""Snapshot bandwidth and encode cost per client versus player count.
+
+Plays a seeded match where every player is a connected client, sends a
+snapshot every other tick, decodes each client's snapshots like client.py
+does (acking them a few snapshots late, as over a real link) and checks
+every decoded player matches the server. Prints the mean bytes per client
+per snapshot and the mean time per client to collect and broadcast a
+snapshot:
+
+    python benchmarks/bench_snapshot.py [--players 50 100 200 400] [--ticks 120]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import server  # noqa: E402
+from entities import InputState  # noqa: E402
+from protocol import FRAME_HEADER, POSITION_SCALE, decode_snapshot  # noqa: E402
+from stubs import RecordingOutbox  # noqa: E402
+
+ACK_DELAY = 3  # Snapshots between sending one and getting its ack back
+
+
+def run(player_count, ticks, seed):
+    """Returns (bytes per client per snapshot, broadcast seconds per client, all decoded correctly)"""
+    rng = random.Random(seed)
+    server.rng.seed(seed)
+    server.reset_world()
+    for pid in range(1, player_count + 1):
+        server.add_player(pid)
+        server.conns[pid] = RecordingOutbox()
+    decoded = {pid: {} for pid in server.players}  # {pid: {tick: state}}
+
+    sizes = []
+    times = []
+    correct = True
+    for tick in range(1, ticks + 1):
+        for pid in server.players:
+            server.inputs[pid] = InputState(move_x=rng.randint(-1, 1), move_y=rng.randint(-1, 1),
+                                            shoot=(rng.randint(0, 800), rng.randint(0, 600)))
+            if server.players[pid].spectator and tick % 30 == 0:
+                server.handle_input(pid, {"respawn": True, "ack": server.acks.get(pid, 0)})
+        server.simulate_tick(tick)
+        if tick % 2:
+            continue
+
+        start = time.perf_counter()
+        server.broadcast_snapshot(*server.collect_snapshot(tick))
+        times.append((time.perf_counter() - start) / player_count)
+
+        for pid, outbox in server.conns.items():
+            frame = outbox.frames.pop()
+            sizes.append(len(frame))
+            state = decode_snapshot(frame[FRAME_HEADER.size:], decoded[pid])
+            if state is None:
+                correct = False
+                continue
+            decoded[pid][tick] = state
+            for oid, p in state["players"].items():
+                o = server.players[oid]
+                if abs(p["x"] - o.x) > 1 / POSITION_SCALE or abs(p["y"] - o.y) > 1 / POSITION_SCALE \
+                        or p["health"] != o.health:
+                    correct = False
+            if {pickup_id: (q["x"], q["y"], q["kind"]) for pickup_id, q in state["pickups"].items()} != \
+                    {pickup.id: (pickup.x, pickup.y, pickup.kind) for pickup in server.pickups.pickups.values()}:
+                correct = False
+            # The ack of a snapshot arrives a few snapshots later
+            acked = sorted(decoded[pid])[-ACK_DELAY:][0]
+            server.acks[pid] = acked
+            for old in [t for t in decoded[pid] if t < acked]:
+                del decoded[pid][old]
+    return statistics.mean(sizes), statistics.mean(times), correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--ticks", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server.log.enabled = False
+
+    for count in args.players:
+        size, seconds, correct = run(count, args.ticks, args.seed)
+        print(f"{count:4d} players | {size:7.0f} B  {seconds * 1e6:6.1f} us/client  correct: {correct}")
+
+
+if __name__ == "__main__":
+    main()
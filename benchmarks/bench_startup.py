@@ -0,0 +1,87 @@
+"""Client startup time, from process launch to the first frame showing the world.
+
+Starts a server in a child process, then launches client.py again and
+again with the hidden --startup-probe flag, which quits right after the
+first frame drawn from a snapshot. For every launch it times when the
+client reports its player ID and when that first frame is on screen, and
+separately how long the interpreter takes just to import client.py:
+
+    python benchmarks/bench_startup.py [--runs 10] [--window]
+
+Without --window SDL draws to a dummy video driver, so the numbers leave
+out the window manager and work on machines without a display.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def timed_run(cmd, env, markers):
+    """Launch cmd and return the seconds until each marker first shows up in its output"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    times = {}
+    for line in proc.stdout:
+        for marker in markers:
+            if marker not in times and marker in line:
+                times[marker] = time.perf_counter() - start
+    proc.wait()
+    times["exit"] = time.perf_counter() - start
+    return times
+
+
+def summary(values):
+    return f"{min(values) * 1000:7.1f} {statistics.median(values) * 1000:7.1f} {max(values) * 1000:7.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=5590)
+    parser.add_argument("--window", action="store_true", help="open real windows instead of the dummy video driver")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    if not args.window:
+        env.update(SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+
+    server = subprocess.Popen([sys.executable, "server.py", "--port", str(args.port)], cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", args.port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        python = [sys.executable, "-u"]
+        baseline = [timed_run(python + ["-c", "pass"], env, [])["exit"] for _ in range(args.runs)]
+        imports = [timed_run(python + ["-c", "import client"], env, [])["exit"] for _ in range(args.runs)]
+        client = python + ["client.py", "--port", str(args.port), "--startup-probe"]
+        runs = [timed_run(client, env, ["Connected with ID", "First frame"]) for _ in range(args.runs)]
+    finally:
+        server.kill()
+        server.wait()
+
+    failed = [run for run in runs if "First frame" not in run]
+    if failed:
+        print(f"{len(failed)} of {len(runs)} clients never drew a frame")
+    runs = [run for run in runs if "First frame" in run]
+    if not runs:
+        return
+    print(f"{args.runs} runs, milliseconds since launch  min  median    max")
+    print(f"interpreter alone                   {summary(baseline)}")
+    print(f"import client.py                    {summary(imports)}")
+    print(f"connected (player ID received)      {summary([run['Connected with ID'] for run in runs])}")
+    print(f"first frame with the world          {summary([run['First frame'] for run in runs])}")
+
+
+if __name__ == "__main__":
+    main()
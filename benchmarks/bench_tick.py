@@ -0,0 +1,122 @@
+"""Server tick time versus player count.
+
+Runs simulate_tick on a synthetic match (everyone moving and shooting) once
+per collision implementation, checks they all end in the same world and
+prints the mean and p95 tick time of each:
+
+  numpy        NumPy bullet pool (skipped when NumPy is missing)
+  python       pure Python bullet pool and pickups, both on spatial hashes
+  brute force  pure Python, every bullet and pickup against every player
+
+    python benchmarks/bench_tick.py [--players 10 50 100 200] [--ticks 300] [--rtt 0.1]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bullets  # noqa: E402
+import server  # noqa: E402
+from spatial import SpatialHash  # noqa: E402
+from entities import InputState  # noqa: E402
+from pickups import TYPES_BY_CODE  # noqa: E402
+from protocol import pack_world  # noqa: E402
+from rules import VIEW_WIDTH, VIEW_HEIGHT  # noqa: E402
+
+
+class BruteForceBulletPool(bullets.PyBulletPool):
+    """Every bullet against every player: a single grid cell covering the map"""
+
+    backend = "brute force"
+
+    def _grid(self, players, rewind, history, tick):
+        self.grids.setdefault(rewind, SpatialHash(cell_size=10**9))
+        return super()._grid(players, rewind, history, tick)
+
+
+def brute_force_collect_pickup(pid, p):
+    manager = server.pickups
+    for pickup in list(manager.pickups.values()):
+        dist = math.hypot((p.x+20) - pickup.x, (p.y+20) - pickup.y)
+        if dist < 35:
+            p.health = min(100, p.health + TYPES_BY_CODE[pickup.kind].heal)
+            manager.remove(pickup)
+            manager.rebalance(server.players)
+            break
+
+
+def run(player_count, ticks, seed, pool, rtt=None):
+    """Play a seeded match, returning (tick times, final world)"""
+    rng = random.Random(seed)
+    server.rng.seed(seed)
+    server.reset_world()
+    server.bullet_pool = pool
+    for pid in range(1, player_count + 1):
+        server.add_player(pid)
+        if rtt is not None:
+            # Spread round trips so shooters rewind by different amounts
+            server.rtts[pid] = rtt * (pid % 4) / 3
+
+    times = []
+    for tick in range(1, ticks + 1):
+        for pid in server.players:
+            server.inputs[pid] = InputState(
+                move_x=rng.randint(-1, 1), move_y=rng.randint(-1, 1),
+                shoot=(rng.randint(0, VIEW_WIDTH), rng.randint(0, VIEW_HEIGHT)),
+                sprint=rng.random() < 0.3,
+            )
+            # Keep everyone in the match
+            if server.players[pid].spectator and tick % 30 == 0:
+                server.handle_input(pid, {"respawn": True, "ack": 0})
+        start = time.perf_counter()
+        server.simulate_tick(tick)
+        times.append(time.perf_counter() - start)
+    # Compare what the clients would see
+    world = pack_world(ticks, server.players, server.pickups.snapshot(), pool.packed_by_owner())
+    return times, world
+
+
+def report(label, times):
+    times = sorted(times)
+    mean = statistics.mean(times) * 1000
+    p95 = times[int(len(times) * 0.95)] * 1000
+    return f"{label}: mean {mean:7.3f} ms  p95 {p95:7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rtt", type=float, default=None, metavar="SECONDS",
+                        help="play with lag compensation, players' round trips spread up to this")
+    args = parser.parse_args()
+
+    # The benchmark is about the simulation, not the pickup log lines
+    server.log.enabled = False
+
+    grid_collect = server.collect_pickup
+    variants = [(bullets.PyBulletPool, grid_collect),
+                (BruteForceBulletPool, brute_force_collect_pickup)]
+    if bullets.np is not None:
+        variants.insert(0, (bullets.NumpyBulletPool, grid_collect))
+
+    for count in args.players:
+        results = []
+        for pool_class, collect in variants:
+            server.collect_pickup = collect
+            pool = pool_class()
+            times, world = run(count, args.ticks, args.seed, pool, args.rtt)
+            results.append((pool.backend, times, world))
+        same = all(world == results[0][2] for _, _, world in results)
+        print(f"{count:4d} players | " + " | ".join(report(name, times) for name, times, _ in results)
+              + f" | identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Stand-ins shared by the benchmarks that drive server.py in process."""
+
+
+class RecordingOutbox:
+    """Stands in for a connection, keeps the frames instead of sending them.
+
+    Pass the same frames list to several outboxes to collect every client's
+    frames in one place.
+    """
+
+    def __init__(self, frames=None):
+        self.frames = [] if frames is None else frames
+        self.bytes_sent = 0
+
+    def send(self, parts):
+        frame = b"".join(parts)
+        self.bytes_sent += len(frame)
+        self.frames.append(frame)
@@ -0,0 +1,381 @@
+import argparse
+import heapq
+import json
+import math
+import random
+import selectors
+import socket
+import statistics
+import time
+from collections import OrderedDict, deque
+
+from telemetry import Samples
+from rules import MAP_WIDTH, MAP_HEIGHT, PLAYER_SIZE, camera
+from compression import SnapshotCodec, load_dictionary
+from protocol import (DEFAULT_PORT, FrameDecoder, MSG_WELCOME, MSG_SNAPSHOT, MSG_SNAPSHOT_Z, SNAPSHOT_HISTORY,
+                      INPUT_REDUNDANCY, decode_welcome, decode_datagram, encode_codec, encode_input, pack_input,
+                      encode_inputs, decode_snapshot, snapshot_tick)
+
+# Headless bot clients for load testing
+#
+# A BotSwarm runs any number of bots from one thread: every socket sits in
+# one selector and inputs go out from a heap of due times, each bot at the
+# server's tick rate with the bots spread evenly over the interval. A bot
+# speaks the same protocol as client.py (same input fields, delta snapshot
+# acks, optional UDP) and plays by a scripted movement and shooting pattern,
+# seeded, so two runs with the same seed behave the same way.
+#
+# Each bot counts the bytes and snapshots it receives and the latency from
+# sending an input to the first snapshot that applied it, which is what a
+# player feels as lag. Only what happens after the warm-up counts.
+
+MOVEMENTS = ("wander", "circle", "strafe", "idle")
+SHOOTING = ("nearest", "random", "burst", "none")
+SHOT_INTERVAL = 0.2  # Seconds, the server's shot cooldown
+RESPAWN_DELAY = 1.0  # Seconds a dead bot waits before asking to respawn
+
+
+def connect_bot(host, port, timeout=10):
+    """Open a TCP connection and wait for the welcome, returns (sock, decoder, welcome fields)"""
+    sock = socket.create_connection((host, port), timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Inputs are tiny and must not wait
+    decoder = FrameDecoder()
+    while True:
+        data = sock.recv(1024)
+        if not data:
+            sock.close()
+            raise ConnectionError("server closed connection")
+        for msg_type, payload in decoder.feed(data):
+            if msg_type == MSG_WELCOME:
+                sock.setblocking(False)
+                return sock, decoder, decode_welcome(payload)
+
+
+class Bot:
+    """One scripted player connected to the server"""
+
+    def __init__(self, sock, decoder, welcome, movement, shooting, rng, latencies, udp=None, server_addr=None,
+                 codec=None):
+        self.sock = sock
+        self.decoder = decoder
+        self.player_id, self.udp_token, _, self.tick_rate, _ = welcome
+        self.codec = codec  # SnapshotCodec if we asked for compressed snapshots
+        self.udp = udp
+        self.server_addr = server_addr
+        self.movement = movement
+        self.shooting = shooting
+        self.rng = rng
+
+        self.outbuf = bytearray()  # TCP bytes the socket did not take yet
+        self.recent_inputs = deque(maxlen=INPUT_REDUNDANCY)
+        self.snapshots = OrderedDict()  # {tick: state}, delta baselines
+        self.acked_tick = 0
+        self.input_seq = 0
+        self.sent_times = {}  # {input seq: time sent}, until a snapshot applies it
+        self.state = None  # Newest decoded snapshot
+        self.closed = False
+
+        # Script state
+        self.phase = rng.uniform(0, 2 * math.pi)
+        self.waypoint = None
+        self.sprint = False
+        self.next_shot = 0.0
+        self.burst_left = 0
+        self.dead_since = None
+
+        # Counters, only while measuring
+        self.bytes_received = 0
+        self.snapshots_received = 0
+        self.throttled_snapshots = 0  # Snapshots saying the server's rate limit dropped our inputs
+        self.latencies = latencies  # Samples of seconds from sending an input to the snapshot applying it
+
+    def position(self):
+        me = self.state["players"].get(self.player_id) if self.state else None
+        return (me["x"], me["y"]) if me else None
+
+    def next_input(self, now):
+        """Input for this step of the bot's script"""
+        move_x = move_y = 0
+        sprint = respawn = False
+        shoot = None
+        pos = self.position()
+        spectator = self.state is not None and self.state["spectator"]
+
+        if spectator:
+            if self.dead_since is None:
+                self.dead_since = now
+            respawn = now - self.dead_since >= RESPAWN_DELAY
+        elif pos is not None:
+            self.dead_since = None
+            move_x, move_y, sprint = self.move(now, *pos)
+            shoot = self.shoot(now, *pos)
+
+        self.input_seq += 1
+        self.sent_times[self.input_seq] = now
+        return {"seq": self.input_seq, "move": [move_x, move_y], "shoot": shoot, "sprint": sprint,
+                "respawn": respawn, "ack": self.acked_tick}
+
+    def move(self, now, x, y):
+        if self.movement == "wander":
+            if self.waypoint is None or abs(self.waypoint[0] - x) + abs(self.waypoint[1] - y) < 40:
+                self.waypoint = (self.rng.uniform(0, MAP_WIDTH - PLAYER_SIZE),
+                                 self.rng.uniform(0, MAP_HEIGHT - PLAYER_SIZE))
+                self.sprint = self.rng.random() < 0.3
+            wx, wy = self.waypoint
+            return ((wx > x + 10) - (wx < x - 10), (wy > y + 10) - (wy < y - 10), self.sprint)
+        if self.movement == "circle":
+            angle = now * 2 + self.phase
+            return round(math.cos(angle)), round(math.sin(angle)), False
+        if self.movement == "strafe":
+            return (1 if math.sin(now * 3 + self.phase) > 0 else -1), 0, False
+        return 0, 0, False
+
+    def shoot(self, now, x, y):
+        if self.shooting == "none" or now < self.next_shot:
+            return None
+        cam_x, cam_y = camera(x, y)
+        if self.shooting == "burst":
+            if self.burst_left == 0:
+                self.burst_left = 5
+            self.burst_left -= 1
+            self.next_shot = now + (SHOT_INTERVAL if self.burst_left else 2.0)
+        else:
+            self.next_shot = now + SHOT_INTERVAL * (1 if self.shooting == "nearest" else self.rng.uniform(1, 5))
+        if self.shooting in ("nearest", "burst"):
+            target = self.nearest(x, y)
+            if target is not None:
+                return [int(target[0] + PLAYER_SIZE / 2 - cam_x), int(target[1] + PLAYER_SIZE / 2 - cam_y)]
+        return [self.rng.randint(0, 799), self.rng.randint(0, 599)]
+
+    def nearest(self, x, y):
+        best = None
+        best_distance = math.inf
+        for pid, p in self.state["players"].items():
+            if pid == self.player_id or p["spectator"]:
+                continue
+            distance = abs(p["x"] - x) + abs(p["y"] - y)
+            if distance < best_distance:
+                best, best_distance = (p["x"], p["y"]), distance
+        return best
+
+    def send(self, input_data):
+        if self.udp is not None:
+            self.recent_inputs.append(pack_input(input_data))
+            try:
+                self.udp.sendto(encode_inputs(self.player_id, self.udp_token, list(reversed(self.recent_inputs))),
+                                self.server_addr)
+            except OSError:
+                pass  # Lost, like any other datagram
+            return
+        self.outbuf += encode_input(input_data)
+        try:
+            sent = self.sock.send(self.outbuf)
+        except BlockingIOError:
+            return
+        del self.outbuf[:sent]
+
+    def collect(self, msg_type, payload, received):
+        if msg_type == MSG_SNAPSHOT:
+            received.append(payload)
+        elif msg_type == MSG_SNAPSHOT_Z and self.codec is not None:
+            received.append(self.codec.expand(payload))
+
+    def receive(self, sock, now, measuring):
+        """Read what arrived on sock and apply the newest snapshot"""
+        received = []
+        if sock is self.sock:
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                return
+            if not data:
+                self.closed = True
+                return
+            size = len(data)
+            for msg_type, payload in self.decoder.feed(data):
+                self.collect(msg_type, payload, received)
+        else:
+            size = 0
+            while True:
+                try:
+                    datagram = sock.recv(65536)
+                except BlockingIOError:
+                    break
+                size += len(datagram)
+                self.collect(*decode_datagram(datagram), received)
+        if measuring:
+            self.bytes_received += size
+
+        snapshot = max(received, key=snapshot_tick, default=None)
+        if snapshot is None or snapshot_tick(snapshot) <= self.acked_tick:
+            return
+        state = decode_snapshot(snapshot, self.snapshots)
+        if state is None:
+            return
+        self.snapshots[state["tick"]] = state
+        while len(self.snapshots) > SNAPSHOT_HISTORY * 2:
+            self.snapshots.popitem(last=False)
+        self.acked_tick = state["tick"]
+        self.state = state
+
+        sent = self.sent_times.pop(state["input_seq"], None)
+        for seq in [seq for seq in self.sent_times if seq < state["input_seq"]]:
+            del self.sent_times[seq]
+        if measuring:
+            self.snapshots_received += 1
+            self.throttled_snapshots += state["input_throttled"]
+            if sent is not None:
+                self.latencies.observe(now - sent)
+
+    def close(self):
+        self.sock.close()
+        if self.udp is not None:
+            self.udp.close()
+
+
+class BotSwarm:
+    """Many bots on one selector, each sending inputs at the server's tick rate"""
+
+    def __init__(self, host, port, count, movement="wander", shooting="nearest", udp=False, seed=0,
+                 input_rate=None, compress=True):
+        self.host = host
+        self.port = port
+        self.count = count
+        self.movement = movement
+        self.shooting = shooting
+        self.use_udp = udp
+        self.rng = random.Random(seed)
+        self.input_rate = input_rate
+        self.codec = SnapshotCodec(load_dictionary()) if compress else None  # Shared, decompressing keeps no state
+        self.bots = []
+        self.latencies = Samples()  # Shared by every bot, kept whole for exact percentiles
+        self.selector = selectors.DefaultSelector()
+        self.failed = 0
+
+    def connect(self):
+        """Connect every bot, one after the other"""
+        for i in range(self.count):
+            movement = self.rng.choice(MOVEMENTS) if self.movement == "mixed" else self.movement
+            shooting = self.rng.choice(SHOOTING) if self.shooting == "mixed" else self.shooting
+            try:
+                sock, decoder, welcome = connect_bot(self.host, self.port)
+            except OSError as e:
+                print(f"[BOTS] Bot {i} could not connect: {e}")
+                self.failed += 1
+                continue
+            udp = None
+            if self.use_udp and welcome[2]:
+                udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                udp.setblocking(False)
+            codec = None
+            if self.codec is not None and welcome[4] == self.codec.id:
+                sock.sendall(encode_codec(self.codec.id))
+                codec = self.codec
+            bot = Bot(sock, decoder, welcome, movement, shooting, random.Random(self.rng.random()),
+                      self.latencies, udp, (self.host, welcome[2]), codec)
+            self.bots.append(bot)
+            self.selector.register(sock, selectors.EVENT_READ, bot)
+            if bot.udp is not None:
+                self.selector.register(bot.udp, selectors.EVENT_READ, bot)
+        print(f"[BOTS] {len(self.bots)} bots connected" + (f", {self.failed} failed" if self.failed else ""))
+
+    def run(self, duration, warmup=0.0):
+        """Play for warmup + duration seconds, counting only the last duration"""
+        if not self.bots:
+            return
+        interval = 1 / (self.input_rate or self.bots[0].tick_rate)
+        start = time.perf_counter()
+        measure_from = start + warmup
+        end = measure_from + duration
+        # (due time, bot index), spread over one input interval
+        due = [(start + interval * i / len(self.bots), i) for i in range(len(self.bots))]
+        heapq.heapify(due)
+
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            while due[0][0] <= now:
+                when, i = due[0]
+                bot = self.bots[i]
+                if not bot.closed:
+                    bot.send(bot.next_input(now))
+                heapq.heapreplace(due, (max(when + interval, now), i))
+            measuring = now >= measure_from
+            for key, _ in self.selector.select(max(0.0, min(due[0][0], end) - time.perf_counter())):
+                bot = key.data
+                bot.receive(key.fileobj, time.perf_counter(), measuring)
+                if bot.closed:
+                    self.selector.unregister(bot.sock)
+                    if bot.udp is not None:
+                        self.selector.unregister(bot.udp)
+                    print(f"[BOTS] Server closed bot {bot.player_id}")
+
+    def close(self):
+        for bot in self.bots:
+            bot.close()
+        self.selector.close()
+
+    def results(self, duration):
+        """Per client averages and every latency sample over the measured window"""
+        bots = self.bots
+        return {
+            "bots": len(bots),
+            "failed": self.failed,
+            "disconnected": sum(bot.closed for bot in bots),
+            "bytes_per_client_per_s": statistics.mean(bot.bytes_received for bot in bots) / duration if bots else 0,
+            "snapshots_per_client_per_s": statistics.mean(bot.snapshots_received for bot in bots) / duration
+                                          if bots else 0,
+            "throttled_snapshots": sum(bot.throttled_snapshots for bot in bots),
+            "latency_ms": latency_summary(self.latencies),
+            "latency_samples": self.latencies.values,
+        }
+
+
+def latency_summary(samples):
+    """Input to snapshot latency percentiles in milliseconds"""
+    summary = samples.summary()
+    return {"samples": summary["count"], **{key: summary[key] * 1000 for key in ("mean", "p50", "p95", "p99", "max")}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shooter LAN - Arena headless bots")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--count", type=int, default=10, help="bots to connect")
+    parser.add_argument("--movement", choices=MOVEMENTS + ("mixed",), default="wander")
+    parser.add_argument("--shooting", choices=SHOOTING + ("mixed",), default="nearest")
+    parser.add_argument("--udp", action="store_true", help="use the UDP transport if the server allows it")
+    parser.add_argument("--input-rate", type=int, default=None,
+                        help="inputs per bot per second (default: the server's tick rate)")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="ask for plain snapshots even if the server offers compressed ones")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=0, help="seconds played before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH as JSON")
+    args = parser.parse_args()
+
+    swarm = BotSwarm(args.host, args.port, args.count, args.movement, args.shooting, args.udp, args.seed,
+                     args.input_rate, not args.no_compress)
+    swarm.connect()
+    try:
+        swarm.run(args.duration, args.warmup)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        swarm.close()
+    results = swarm.results(args.duration)
+    latency = results["latency_ms"]
+    print(f"[BOTS] {results['bots']} bots: {results['bytes_per_client_per_s']:.0f} B/s and "
+          f"{results['snapshots_per_client_per_s']:.1f} snapshots/s per bot, input to snapshot latency "
+          f"p50={latency['p50']:.0f} p95={latency['p95']:.0f} max={latency['max']:.1f} ms")
+    if results["throttled_snapshots"]:
+        print(f"[BOTS] The server rate limited inputs in {results['throttled_snapshots']} snapshots")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
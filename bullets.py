@@ -0,0 +1,295 @@
+from entities import Bullet
+from protocol import BULLET, POSITION_SCALE
+from rules import BULLET_SPEED, BULLET_LIFETIME, PLAYER_SIZE, MAP_WIDTH, MAP_HEIGHT
+from spatial import SpatialHash
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, PyBulletPool works everywhere
+    np = None
+
+# Bullet storage and simulation
+#
+# All bullets live in one pool instead of lists inside each player. Each tick
+# step() moves the bullets of alive owners, culls them by bounds and lifetime,
+# tests them against alive players' boxes and returns the hits. Hits come back
+# in the order the old per-player loops produced them: by owner in players
+# order, then by firing order. Damage and kill counting depend on that order.
+#
+# Bullets of dead owners stay frozen (still visible) until the owner respawns
+# or leaves and clear_owner() is called.
+#
+# With lag compensation, step() gets a PositionHistory and the rewind of each
+# owner in ticks: an owner's bullets hit targets where they were that many
+# ticks ago, if they were alive then and still are.
+
+
+def make_bullet_pool(backend="auto"):
+    """NumPy pool when available (or asked for), pure Python pool otherwise"""
+    if backend == "numpy" or (backend == "auto" and np is not None):
+        if np is None:
+            raise RuntimeError("the numpy bullet backend needs NumPy installed")
+        return NumpyBulletPool()
+    return PyBulletPool()
+
+
+class PyBulletPool:
+    """Pure Python bullet pool, Bullet objects (entities.py) grouped by owner"""
+
+    backend = "python"
+
+    def __init__(self):
+        self.owners = {}  # {owner: [Bullet, ...]} in firing order
+        self.grids = {}   # {rewind ticks: SpatialHash of {id: (order, id, x, y)}} for the hit test
+
+    def __len__(self):
+        return sum(len(bullets) for bullets in self.owners.values())
+
+    def spawn(self, owner, x, y, dx, dy):
+        self.owners.setdefault(owner, []).append(Bullet(x, y, dx, dy))
+
+    def clear_owner(self, owner):
+        self.owners.pop(owner, None)
+
+    def find_target(self, owner, x, y, grid):
+        """First alive player, in players order, whose box in grid contains the bullet, or None"""
+        best_order = None
+        target = None
+        for order, oid, ox, oy in grid.query_point(x, y).values():
+            if oid == owner or (best_order is not None and order > best_order):
+                continue
+            if ox <= x <= ox+PLAYER_SIZE and oy <= y <= oy+PLAYER_SIZE:
+                best_order = order
+                target = oid
+        return target
+
+    def _grid(self, players, rewind, history, tick):
+        """Alive players indexed by their position rewind ticks ago (their final one if 0)"""
+        grid = self.grids.get(rewind)
+        if grid is None:
+            grid = self.grids[rewind] = SpatialHash()
+        grid.clear()
+        for order, (pid, p) in enumerate(players.items()):
+            if p.spectator:
+                continue
+            pos = (p.x, p.y) if not rewind else history.get(pid, tick - rewind)
+            if pos is not None:
+                grid.insert(pid, (order, pid) + pos, pos[0], pos[1], PLAYER_SIZE, PLAYER_SIZE)
+        return grid
+
+    def step(self, players, tick_rate, history=None, tick=0, rewinds=None):
+        """Advance one tick and return [(owner, target), ...] hits in processing order.
+
+        rewinds maps owner -> ticks its bullets are rewound, looked up in history.
+        """
+        speed = BULLET_SPEED / tick_rate
+        max_lifetime = round(BULLET_LIFETIME * tick_rate)
+        if history is None:
+            rewinds = None
+
+        grids = {}  # Built on first use this tick
+        hits = []
+        for pid, p in players.items():
+            bullets = self.owners.get(pid)
+            if not bullets or p.spectator:
+                continue
+            rewind = rewinds.get(pid, 0) if rewinds else 0
+            grid = grids.get(rewind)
+            if grid is None:
+                grid = grids[rewind] = self._grid(players, rewind, history, tick)
+            new_bullets = []
+            for bullet in bullets:
+                bullet.x += bullet.dx * speed
+                bullet.y += bullet.dy * speed
+                bullet.lifetime += 1
+
+                # Delete bullets that go out of bounds or are too old
+                if (0 < bullet.x < MAP_WIDTH and 0 < bullet.y < MAP_HEIGHT
+                        and bullet.lifetime < max_lifetime):
+                    target = self.find_target(pid, bullet.x, bullet.y, grid)
+                    if target is not None:
+                        hits.append((pid, target))
+                    else:
+                        new_bullets.append(bullet)
+            self.owners[pid] = new_bullets
+        return hits
+
+    def packed_by_owner(self):
+        """{owner: packed BULLET records} for the snapshot"""
+        return {owner: b"".join([b.pack() for b in bullets])
+                for owner, bullets in self.owners.items() if bullets}
+
+
+class NumpyBulletPool:
+    """Struct-of-arrays bullet pool, every per-tick operation is a batched array op"""
+
+    backend = "numpy"
+
+    def __init__(self):
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.dx = np.empty(0)
+        self.dy = np.empty(0)
+        self.owner = np.empty(0, dtype=np.int64)
+        self.lifetime = np.empty(0, dtype=np.int32)
+        # Bullets are spawned in batches at the start of step(), in firing order
+        self.pending = []
+
+    def __len__(self):
+        return len(self.x) + len(self.pending)
+
+    def spawn(self, owner, x, y, dx, dy):
+        self.pending.append((x, y, dx, dy, owner))
+
+    def clear_owner(self, owner):
+        self.pending = [b for b in self.pending if b[4] != owner]
+        self._keep(self.owner != owner)
+
+    def _keep(self, mask):
+        self.x = self.x[mask]
+        self.y = self.y[mask]
+        self.dx = self.dx[mask]
+        self.dy = self.dy[mask]
+        self.owner = self.owner[mask]
+        self.lifetime = self.lifetime[mask]
+
+    def _flush_pending(self):
+        if not self.pending:
+            return
+        x, y, dx, dy, owner = zip(*self.pending)
+        self.pending = []
+        self.x = np.concatenate((self.x, x))
+        self.y = np.concatenate((self.y, y))
+        self.dx = np.concatenate((self.dx, dx))
+        self.dy = np.concatenate((self.dy, dy))
+        self.owner = np.concatenate((self.owner, np.array(owner, dtype=np.int64)))
+        self.lifetime = np.concatenate((self.lifetime, np.zeros(len(owner), dtype=np.int32)))
+
+    def step(self, players, tick_rate, history=None, tick=0, rewinds=None):
+        """Advance one tick and return [(owner, target), ...] hits in processing order.
+
+        rewinds maps owner -> ticks its bullets are rewound, looked up in history.
+        """
+        speed = BULLET_SPEED / tick_rate
+        max_lifetime = round(BULLET_LIFETIME * tick_rate)
+        if history is None:
+            rewinds = None
+        self._flush_pending()
+        n = len(self.x)
+        if not n:
+            return []
+
+        ids = np.fromiter(players.keys(), dtype=np.int64, count=len(players))
+        alive = np.fromiter((not p.spectator for p in players.values()),
+                            dtype=bool, count=len(players))
+        # Owner id -> position in players order
+        id_sort = np.argsort(ids)
+        owner_pos = np.searchsorted(ids[id_sort], self.owner).clip(0, max(len(ids) - 1, 0))
+        owner_order = id_sort[owner_pos] if len(ids) else owner_pos
+        active = alive[owner_order] & (ids[owner_order] == self.owner) if len(ids) else np.zeros(n, bool)
+
+        # Move bullets of alive owners
+        self.x[active] += self.dx[active] * speed
+        self.y[active] += self.dy[active] * speed
+        self.lifetime[active] += 1
+
+        # Delete bullets that go out of bounds or are too old
+        expired = active & ~((0 < self.x) & (self.x < MAP_WIDTH) & (0 < self.y) & (self.y < MAP_HEIGHT)
+                             & (self.lifetime < max_lifetime))
+
+        # Hit test, once per distinct rewind among the owners of live bullets
+        candidates = np.nonzero(active & ~expired)[0]
+        target_of = np.full(n, -1, dtype=np.int64)
+        if len(candidates) and alive.any():
+            if rewinds:
+                owner_rewind = np.fromiter((rewinds.get(pid, 0) for pid in players), dtype=np.int64,
+                                           count=len(players))[owner_order[candidates]]
+            else:
+                owner_rewind = np.zeros(len(candidates), dtype=np.int64)
+            for rewind in np.unique(owner_rewind).tolist():
+                group = candidates[owner_rewind == rewind]
+                tid, tx, ty = self._targets(players, ids, alive, rewind, history, tick)
+                if len(tid):
+                    target_of[group] = self._hit_test(self.x[group], self.y[group], self.owner[group],
+                                                      tid, tx, ty)
+
+        hit_mask = target_of >= 0
+        hits = []
+        if hit_mask.any():
+            hit_idx = np.nonzero(hit_mask)[0]
+            # Owner in players order, then firing order (array order)
+            hit_idx = hit_idx[np.argsort(owner_order[hit_idx], kind="stable")]
+            hits = list(zip(self.owner[hit_idx].tolist(), target_of[hit_idx].tolist()))
+
+        if expired.any() or hit_mask.any():
+            self._keep(~(expired | hit_mask))
+        return hits
+
+    @staticmethod
+    def _targets(players, ids, alive, rewind, history, tick):
+        """(ids, x, y) of alive players, in players order, at their position rewind ticks ago"""
+        if not rewind:
+            alive_players = [p for p in players.values() if not p.spectator]
+            tx = np.fromiter((p.x for p in alive_players), dtype=float, count=len(alive_players))
+            ty = np.fromiter((p.y for p in alive_players), dtype=float, count=len(alive_players))
+            return ids[alive], tx, ty
+        found = [(pid, pos) for pid, pos in ((pid, history.get(pid, tick - rewind))
+                                              for pid, p in players.items() if not p.spectator)
+                 if pos is not None]
+        tid = np.fromiter((pid for pid, _ in found), dtype=np.int64, count=len(found))
+        tx = np.fromiter((pos[0] for _, pos in found), dtype=float, count=len(found))
+        ty = np.fromiter((pos[1] for _, pos in found), dtype=float, count=len(found))
+        return tid, tx, ty
+
+    @staticmethod
+    def _hit_test(bx, by, owner, tid, tx, ty):
+        """Target id hit by each bullet, -1 for none. Targets are in players order.
+
+        Sweeps the targets sorted by x so each bullet only sees the few whose
+        x range can contain it, then checks those pairs exactly.
+        """
+        target_of = np.full(len(bx), -1, dtype=np.int64)
+        x_sort = np.argsort(tx, kind="stable")
+        sorted_tx = tx[x_sort]
+        # One pixel of slack, the exact comparison below decides
+        lo = np.searchsorted(sorted_tx, bx - (PLAYER_SIZE + 1), side="left")
+        hi = np.searchsorted(sorted_tx, bx, side="right")
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            return target_of
+        pair_b = np.repeat(np.arange(len(bx)), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        pair_t = x_sort[starts + np.arange(total)]
+        px = tx[pair_t]
+        py = ty[pair_t]
+        pbx = bx[pair_b]
+        pby = by[pair_b]
+        ok = ((px <= pbx) & (pbx <= px + PLAYER_SIZE) & (py <= pby) & (pby <= py + PLAYER_SIZE)
+              & (tid[pair_t] != owner[pair_b]))
+        pair_b = pair_b[ok]
+        pair_t = pair_t[ok]
+        if len(pair_b):
+            # First target in players order wins
+            first = np.full(len(bx), len(tid), dtype=np.int64)
+            np.minimum.at(first, pair_b, pair_t)
+            hit = first < len(tid)
+            target_of[hit] = tid[first[hit]]
+        return target_of
+
+    def packed_by_owner(self):
+        """{owner: packed BULLET records} for the snapshot"""
+        self._flush_pending()
+        if not len(self.x):
+            return {}
+        order = np.argsort(self.owner, kind="stable")
+        # Fixed point like protocol.quantize: the same float64 math, then truncation
+        records = np.empty((len(order), 2), dtype=">u2")
+        records[:, 0] = (self.x[order] * POSITION_SCALE + 0.5).astype(np.int64)
+        records[:, 1] = (self.y[order] * POSITION_SCALE + 0.5).astype(np.int64)
+        data = records.tobytes()
+        owners, starts = np.unique(self.owner[order], return_index=True)
+        ends = list(starts[1:]) + [len(order)]
+        size = BULLET.size
+        return {owner: data[start*size:end*size]
+                for owner, start, end in zip(owners.tolist(), starts.tolist(), ends)}
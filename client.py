@@ -1,22 +1,28 @@
 import pygame
+import argparse
 import socket
-import pickle
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from server import players
+from netclient import NetworkThread
+from netsim import NetSim
+from pickups import HEALTH, TYPES_BY_CODE
+from render import TextCache, RenderCache, FrameTimer
+from smoothing import INTERP_DELAY, SnapshotBuffer, Predictor
+from compression import SnapshotCodec, dictionary_id, load_dictionary
+from protocol import DEFAULT_PORT, VIEWER_ID, FrameDecoder, MSG_WELCOME, decode_welcome, encode_codec, encode_interp
+from rules import MAP_WIDTH, MAP_HEIGHT, VIEW_WIDTH as WIDTH, VIEW_HEIGHT as HEIGHT
 
 # Client config
-WIDTH, HEIGHT = 800, 600          # Window
-MAP_WIDTH, MAP_HEIGHT = 2000, 2000  # Map
 FPS = 60
 
-def connect():
+def connect(host, port):
     client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client.settimeout(10)  # Timeout for connection attempt
     try:
-        client.connect(("127.0.0.1", 5555))
-#        client.connect(("192.168.184.20", 5555))
+        client.connect((host, port))
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Small inputs go out at once
         client.settimeout(None)  # Remove timeout after connection
         return client
     except socket.timeout:
@@ -26,39 +32,133 @@ def connect():
         print(f"[CLIENT] Error connecting: {e}")
         return None
 
-def main():
-    pygame.init()
-    win = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Shooter LAN - Arena")
-    clock = pygame.time.Clock()
-
-    # Fonts
-    font_small = pygame.font.SysFont(None, 24)
-    font_medium = pygame.font.SysFont(None, 32)
-    font_large = pygame.font.SysFont(None, 48)
-
-    client = connect()
+def handshake(host, port):
+    """Connect and wait for the welcome, returns (socket, decoder, welcome fields) or None"""
+    client = connect(host, port)
     if not client:
         print("[CLIENT] Cannot connect to server")
-        return
+        return None
 
     # Receive player ID from server
+    decoder = FrameDecoder()
     try:
         client.settimeout(5)
-        player_id = pickle.loads(client.recv(1024))
+        welcome = None
+        while welcome is None:
+            data = client.recv(1024)
+            if not data:
+                raise ConnectionError("server closed connection")
+            for msg_type, payload in decoder.feed(data):
+                if msg_type == MSG_WELCOME:
+                    welcome = decode_welcome(payload)
+        # The network thread only reads once select() says there is data
         client.settimeout(None)
-        print(f"[CLIENT] Connected with ID {player_id}")
+        return client, decoder, welcome
     except Exception as e:
         print(f"[CLIENT] Error receiving ID from server: {e}")
+        client.close()
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Shooter LAN - Arena client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--interp-delay", type=float, default=INTERP_DELAY,
+                        help="seconds other players are drawn behind the newest snapshot "
+                             "(the server rewinds your shots by it too)")
+    parser.add_argument("--input-rate", type=int, default=None,
+                        help="inputs sent per second (default: the server's tick rate)")
+    parser.add_argument("--frame-times", action="store_true",
+                        help="show the per phase frame time overlay from the start (F3 toggles it)")
+    parser.add_argument("--udp", action="store_true",
+                        help="receive snapshots and send inputs over UDP if the server allows it")
+    parser.add_argument("--sim-loss", type=float, default=0.0,
+                        help="drop this fraction of outgoing UDP datagrams (testing only)")
+    parser.add_argument("--sim-latency", type=float, default=0.0,
+                        help="delay outgoing UDP datagrams by this many seconds (testing only)")
+    parser.add_argument("--sim-jitter", type=float, default=0.0,
+                        help="add up to this many seconds of random delay (testing only)")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="ask for plain snapshots even if the server offers compressed ones")
+    # Used by benchmarks/bench_startup.py: quit once the first frame showing the world is on screen
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Connect while the window and fonts are set up
+    pool = ThreadPoolExecutor(max_workers=1)
+    connecting = pool.submit(handshake, args.host, args.port)
+    pool.shutdown(wait=False)
+
+    # Only the subsystems the client uses, pygame.init() would also open audio and joysticks
+    pygame.display.init()
+    pygame.font.init()
+    win = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Shooter LAN - Arena")
+    clock = pygame.time.Clock()
+
+    # Fonts, with their rendered text cached. The default font needs no system font scan
+    font_small = pygame.font.Font(None, 24)
+    text_small = TextCache(font_small)
+    text_medium = TextCache(pygame.font.Font(None, 32))
+    text_large = TextCache(pygame.font.Font(None, 48))
+
+    # Map, sprites and reusable surfaces, drawn once
+    minimap_w, minimap_h = 220, 165
+    cache = RenderCache(font_small, (WIDTH, HEIGHT), (minimap_w, minimap_h))
+    timer = FrameTimer()
+    show_frame_times = args.frame_times
+
+    connection = connecting.result()
+    if connection is None:
+        pygame.quit()
         return
+    client, decoder, (player_id, udp_token, udp_port, tick_rate, offered_dictionary) = connection
+    viewer = player_id == VIEWER_ID  # Watching through a relay (relay.py), there is no player to respawn
+    print("[CLIENT] Connected to a spectator relay" if viewer else f"[CLIENT] Connected with ID {player_id}")
+
+    # Compressed snapshots, if the server offers them with the dictionary we have
+    codec = None
+    if offered_dictionary and not args.no_compress:
+        dictionary = load_dictionary()
+        if dictionary_id(dictionary) == offered_dictionary:
+            codec = SnapshotCodec(dictionary)
+            client.sendall(encode_codec(codec.id))
+            print("[CLIENT] Using compressed snapshots")
+        else:
+            print("[CLIENT] Server compresses with another dictionary, staying on plain snapshots")
+
+    # Lag compensation tests our shots against where we drew the others, so the server needs our delay
+    if not viewer:
+        client.sendall(encode_interp(args.interp_delay))
+
+    # Optional UDP transport, the TCP connection then only tells us when the server goes away
+    udp = None
+    if args.udp:
+        if udp_port:
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.setblocking(False)  # Drained until empty on every wakeup
+            if args.sim_loss or args.sim_latency or args.sim_jitter:
+                udp = NetSim(udp, args.sim_loss, args.sim_latency, args.sim_jitter)
+            print("[CLIENT] Using UDP transport")
+        else:
+            print("[CLIENT] Server has no UDP transport, staying on TCP")
+
+    # Sockets are only touched by the network thread from here on
+    net = NetworkThread(client, decoder, player_id, udp, udp_token, (args.host, udp_port),
+                        args.input_rate or tick_rate, tick_rate, codec)
+    net.start()
 
     # Initial states
     spectator = False
     cam_x, cam_y = 0, 0
-    players = {}
-    health_pickups = []  # Initialize health pickups list
-    last_network_time = time.time()
-    connection_lost = False
+    players = {}  # Newest snapshot
+    pickups = {}  # {id: pickup}, as of the newest snapshot
+    buffer = SnapshotBuffer(tick_rate, args.interp_delay)  # Other players are drawn from here
+    predictor = Predictor()  # Our own player is drawn from here
+    seen = None  # Newest (state, receive time) taken from the network thread
 
     # Performance metrics
     fps_counter = 0
@@ -67,7 +167,8 @@ def main():
 
     run = True
     while run:
-        clock.tick(FPS)
+        clock.tick(FPS)  # Frame pacing only, the network runs on its own thread
+        timer.start()
         fps_counter += 1
 
         # Calculate FPS every second
@@ -77,25 +178,25 @@ def main():
             fps_time = time.time()
 
         move = [0, 0]
-        shoot = None
         sprint = False
-        respawn = False
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_frame_times = not show_frame_times
             if not spectator:
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     mx, my = pygame.mouse.get_pos()
-                    shoot = [mx, my]
+                    net.shoot([mx, my])
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_DELETE:
-                        shoot = "suicide"
+                        net.shoot("suicide")
             else:
                 # In spectator mode, listen for respawn key
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_r:
-                        respawn = True
+                        net.request_respawn()
 
         keys = pygame.key.get_pressed()
         if not spectator:
@@ -114,86 +215,66 @@ def main():
             cam_x = max(0, min(cam_x, MAP_WIDTH - WIDTH))
             cam_y = max(0, min(cam_y, MAP_HEIGHT - HEIGHT))
 
-        # Send input to server
-        try:
-            input_data = {"move": move, "shoot": shoot, "sprint": sprint, "respawn": respawn}
-            client.sendall(pickle.dumps(input_data))
-            connection_lost = False
-        except Exception as e:
-            if not connection_lost:
-                print(f"[CLIENT] Error sending data: {e}")
-                connection_lost = True
-
-        # Receive game state from server
-        try:
-            client.settimeout(0.1)  # Short timeout for receiving
-            data = client.recv(16384)
-            client.settimeout(None)
+        # The network thread sends the held keys on its own cadence
+        net.set_input(move[0], move[1], sprint)
 
-            if not data:
-                print("[CLIENT] Server closed connection")
-                break
+        timer.mark("input")
 
-            state = pickle.loads(data)
+        if net.closed is not None:
+            print(f"[CLIENT] {net.closed}")
+            break
+
+        # Take the newest decoded snapshot, if there is one we have not seen
+        latest = net.latest
+        state = None
+        if latest is not seen:
+            seen = latest
+            state, received_at = latest
             players = state["players"]
             spectator = state.get("spectator", False)
-            health_pickups = state.get("health_pickups", [])  # Receive health pickups
-            last_network_time = time.time()
-
-            # Update camera to follow player if not spectator
-            if not spectator and player_id in players:
-                x = players[player_id]["x"]
-                y = players[player_id]["y"]
-                cam_x = max(0, min(x - WIDTH//2, MAP_WIDTH - WIDTH))
-                cam_y = max(0, min(y - HEIGHT//2, MAP_HEIGHT - HEIGHT))
-
-        except socket.timeout:
-            pass  # Continue if no data received
-        except Exception as e:
-            if time.time() - last_network_time > 5:  # 5 segundos sin datos
-                print(f"[CLIENT] Connection lost: {e}")
-                break
-
-        # Drawing
-        win.fill((40, 40, 40))
-
-        # Draw grid optimized
-        for gx in range(0, MAP_WIDTH, 100):
-            if -100 <= gx - cam_x <= WIDTH + 100:
-                color = (60,60,60) if (gx // 100) % 2 == 0 else (50,50,50)
-                pygame.draw.line(win, color, (gx - cam_x, 0 - cam_y), (gx - cam_x, MAP_HEIGHT - cam_y))
-        for gy in range(0, MAP_HEIGHT, 100):
-            if -100 <= gy - cam_y <= HEIGHT + 100:
-                color = (60,60,60) if (gy // 100) % 2 == 0 else (50,50,50)
-                pygame.draw.line(win, color, (0 - cam_x, gy - cam_y), (MAP_WIDTH - cam_x, gy - cam_y))
-
-        # Draw grid coordinates less frequently
-        for gx in range(0, MAP_WIDTH, 200):  # Less frequent
-            if 0 <= gx - cam_x < WIDTH:
-                text = font_small.render(str(gx), True, (150,150,150))
-                win.blit(text, (gx - cam_x, 5))
-        for gy in range(0, MAP_HEIGHT, 200):
-            if 0 <= gy - cam_y < HEIGHT:
-                text = font_small.render(str(gy), True, (150,150,150))
-                win.blit(text, (5, gy - cam_y))
-
-        # Draw health pickups with pulsating effect and better visibility
-        for pickup in health_pickups:
+            pickups = state["pickups"]
+            buffer.push(state, received_at)
+
+        # Inputs sent so far, taken after the snapshot so every input it applied is in there
+        while net.sent:
+            sent_input = net.sent.popleft()
+            if not spectator:
+                predictor.add_input(*sent_input)
+        if state is not None:
+            if spectator or player_id not in players:
+                predictor.reset()
+            else:
+                predictor.reconcile(players[player_id]["x"], players[player_id]["y"], state["input_seq"])
+
+        # Other players where they were INTERP_DELAY ago, ourselves where we predict to be now
+        drawn = buffer_players = buffer.sample(time.perf_counter())
+        if predictor.x is not None and player_id in players:
+            x, y = predictor.position()
+            drawn = dict(drawn)
+            me = drawn[player_id] = dict(players[player_id], x=x, y=y)
+            if player_id in buffer_players:
+                me["bullets"] = buffer_players[player_id]["bullets"]
+            # Camera follows the player if not spectator
+            cam_x = max(0, min(x - WIDTH//2, MAP_WIDTH - WIDTH))
+            cam_y = max(0, min(y - HEIGHT//2, MAP_HEIGHT - HEIGHT))
+
+        timer.mark("network")
+
+        # Drawing: background, grid and coordinates all come from the cached map
+        cache.draw_map(win, cam_x, cam_y)
+
+        # Draw pickups with pulsating effect and better visibility
+        pulse = int(5 + 3 * math.sin(time.time() * 4))  # Pulsating effect
+        for pickup in pickups.values():
             px, py = int(pickup["x"] - cam_x), int(pickup["y"] - cam_y)
             # Only draw if within view
             if -20 <= px <= WIDTH + 20 and -20 <= py <= HEIGHT + 20:
-                # Red circle with white cross
-                pulse = int(5 + 3 * math.sin(time.time() * 4))  # Pulsating effect
-                # Exterior glow
-                pygame.draw.circle(win, (255, 100, 100), (px, py), 15 + pulse // 2)
-                # Interior circle
-                pygame.draw.circle(win, (200, 50, 50), (px, py), 12)
-                # Small white cross
-                pygame.draw.line(win, (255, 255, 255), (px - 5, py), (px + 5, py), 2)
-                pygame.draw.line(win, (255, 255, 255), (px, py - 5), (px, py + 5), 2)
+                pickup_sprite = cache.pickup(pulse, pickup["kind"])
+                half = pickup_sprite.get_width() // 2
+                win.blit(pickup_sprite, (px - half, py - half))
 
         # Draw players
-        for pid, p in players.items():
+        for pid, p in drawn.items():
             # Culling: only draw if within or near view
             if (p["x"] - cam_x < -50 or p["x"] - cam_x > WIDTH + 50 or
                 p["y"] - cam_y < -50 or p["y"] - cam_y > HEIGHT + 50):
@@ -205,15 +286,15 @@ def main():
 
             # Draw player with outline if local player
             if pid == player_id and not spectator:
-                pygame.draw.rect(win, (255,255,255), (p["x"] - cam_x - 2, p["y"] - cam_y - 2, 44, 44))
-            pygame.draw.rect(win, p["color"], (p["x"] - cam_x, p["y"] - cam_y, 40, 40))
+                win.blit(cache.player(p["color"], True), (p["x"] - cam_x - 2, p["y"] - cam_y - 2))
+            else:
+                win.blit(cache.player(p["color"]), (p["x"] - cam_x, p["y"] - cam_y))
 
             # Bullets with culling
             for b in p["bullets"]:
                 bx, by = int(b["x"] - cam_x), int(b["y"] - cam_y)
                 if -10 <= bx <= WIDTH + 10 and -10 <= by <= HEIGHT + 10:
-                    pygame.draw.circle(win, (255,255,100), (bx, by), 4)
-                    pygame.draw.circle(win, (255,255,255), (bx, by), 2)
+                    win.blit(cache.bullet, (bx - 4, by - 4))
 
             # Health bar with gradient color
             bar_width = 45
@@ -221,7 +302,7 @@ def main():
             health_ratio = max(0, p["health"] / 100)
 
             # Health bar background
-            pygame.draw.rect(win, (100,100,100), (p["x"]-cam_x-2, p["y"]-15-cam_y, bar_width, bar_height))
+            win.fill((100,100,100), (p["x"]-cam_x-2, p["y"]-15-cam_y, bar_width, bar_height))
             # Health bar foreground with gradient
             if health_ratio > 0.6:
                 color = (0, 255, 0)
@@ -229,21 +310,23 @@ def main():
                 color = (255, 255, 0)
             else:
                 color = (255, 0, 0)
-            pygame.draw.rect(win, color, (p["x"]-cam_x, p["y"]-13-cam_y, int(bar_width * health_ratio)-4, bar_height-2))
+            win.fill(color, (p["x"]-cam_x, p["y"]-13-cam_y, max(0, int(bar_width * health_ratio)-4), bar_height-2))
+
+        timer.mark("world")
 
-        # Minimap
-        minimap_w, minimap_h = 220, 165
-        minimap_surface = pygame.Surface((minimap_w, minimap_h), pygame.SRCALPHA)
+        # Minimap, drawn on the same surface every frame
+        minimap_surface = cache.minimap
         minimap_surface.fill((20, 20, 20, 200))
 
         scale_x = (minimap_w - 20) / MAP_WIDTH
         scale_y = (minimap_h - 20) / MAP_HEIGHT
 
-        # Draw health pickups on minimap
-        for pickup in health_pickups:
+        # Draw pickups on minimap
+        for pickup in pickups.values():
             px = int(pickup["x"] * scale_x) + 10
             py = int(pickup["y"] * scale_y) + 10
-            pygame.draw.circle(minimap_surface, (255, 100, 100), (px, py), 3)
+            kind = TYPES_BY_CODE.get(pickup["kind"], HEALTH)
+            pygame.draw.circle(minimap_surface, kind.color, (px, py), 3)
 
         # Draw camera view rectangle
         view_x = int(cam_x * scale_x) + 10
@@ -253,7 +336,7 @@ def main():
         pygame.draw.rect(minimap_surface, (100,100,100,100), (view_x, view_y, view_w, view_h), 2)
 
         # Players on minimap
-        for pid, p in players.items():
+        for pid, p in drawn.items():
             px = int(p["x"] * scale_x) + 10
             py = int(p["y"] * scale_y) + 10
             color = (0,255,255) if pid == player_id else p["color"]
@@ -269,28 +352,28 @@ def main():
         ui_y = 10
 
         # FPS counter
-        fps_text = font_small.render(f"FPS: {current_fps}", True, (200,200,200))
+        fps_text = text_small.render(f"FPS: {current_fps}", (200,200,200))
         win.blit(fps_text, (10, ui_y))
         ui_y += 25
 
         # Player count
         total_players = len(players)
         alive_players = sum(1 for j in players.values() if not j.get("spectator", False))
-        players_text = font_small.render(f"Players: {alive_players}/{total_players}", True, (200,200,200))
+        players_text = text_small.render(f"Players: {alive_players}/{total_players}", (200,200,200))
         win.blit(players_text, (10, ui_y))
         ui_y += 25
 
-        # Available health pickups
-        health_count_text = font_small.render(f"Available health pickups: {len(health_pickups)}", True, (255,100,100))
+        # Available pickups
+        health_count_text = text_small.render(f"Available pickups: {len(pickups)}", (255,100,100))
         win.blit(health_count_text, (10, ui_y))
         ui_y += 25
 
         # State of connection
-        if connection_lost:
-            conn_text = font_small.render("Lost connection...", True, (255,100,100))
+        if net.send_error is not None:
+            conn_text = text_small.render("Lost connection...", (255,100,100))
             win.blit(conn_text, (10, ui_y))
-        elif time.time() - last_network_time > 2:
-            conn_text = font_small.render("Lag detected", True, (255,255,100))
+        elif time.time() - net.last_receive > 2:
+            conn_text = text_small.render("Lag detected", (255,255,100))
             win.blit(conn_text, (10, ui_y))
 
         # Player stats
@@ -299,24 +382,27 @@ def main():
             kills = p.get("kills", 0)
             deaths = p.get("deaths", 0)
             kd_ratio = kills / max(deaths, 1)
-            stats_text = font_small.render(f"K/D: {kills}/{deaths} ({kd_ratio:.2f})", True, (200,200,200))
+            stats_text = text_small.render(f"K/D: {kills}/{deaths} ({kd_ratio:.2f})", (200,200,200))
             win.blit(stats_text, (WIDTH - 180, 10))
 
+        # Watching through a relay: keep the view clear, only a hint
+        if viewer:
+            text = text_small.render("Watching | WASD: Move camera | Shift: Faster", (120,120,120))
+            win.blit(text, (10, HEIGHT - 30))
+
         # Spectator mode overlay
-        if spectator:
+        elif spectator:
             # Semi-transparent overlay
-            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0,0,0,100))
-            win.blit(overlay, (0,0))
+            win.blit(cache.overlay, (0,0))
 
             # Messages
-            spectator_text = font_large.render("SPECTATOR MODE", True, (255,255,255))
+            spectator_text = text_large.render("SPECTATOR MODE", (255,255,255))
             win.blit(spectator_text, (WIDTH//2 - spectator_text.get_width()//2, HEIGHT//2 - 60))
 
-            respawn_text = font_medium.render("Press R to respawn", True, (200,200,200))
+            respawn_text = text_medium.render("Press R to respawn", (200,200,200))
             win.blit(respawn_text, (WIDTH//2 - respawn_text.get_width()//2, HEIGHT//2 - 20))
 
-            controls_text = font_small.render("WASD: Move camera | Shift: Sprint", True, (150,150,150))
+            controls_text = text_small.render("WASD: Move camera | Shift: Sprint", (150,150,150))
             win.blit(controls_text, (WIDTH//2 - controls_text.get_width()//2, HEIGHT//2 + 20))
 
         # Control hints
@@ -326,14 +412,29 @@ def main():
                 "Click: Shoot | Delete: Suicide"
             ]
             for i, control in enumerate(controls):
-                text = font_small.render(control, True, (120,120,120))
+                text = text_small.render(control, (120,120,120))
                 win.blit(text, (10, HEIGHT - 50 + i * 20))
 
+        timer.mark("hud")
+
+        # Frame time breakdown, averaged over the last second or so (F3)
+        if show_frame_times:
+            for i, line in enumerate(timer.lines()):
+                win.blit(text_small.render(line, (255,255,255)), (WIDTH - 180, 40 + i * 20))
+
         pygame.display.update()
+        timer.mark("display")
+
+        if args.startup_probe and seen is not None:
+            print("[CLIENT] First frame")
+            break
 
+    net.stop()
     pygame.quit()
     if client:
         client.close()
+    if udp is not None:
+        udp.close()
 
 if __name__ == "__main__":
     main()
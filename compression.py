@@ -0,0 +1,94 @@
+import os
+import zlib
+from collections import Counter
+
+from protocol import MAX_FRAME_SIZE, PLAYER_DELTA, SNAPSHOT_CLIENT
+
+# Snapshot compression with a shared dictionary
+#
+# Snapshots are small and each one is compressed on its own, too little
+# data for zlib to find much to reuse. A preset dictionary fixes that: the
+# byte patterns snapshots keep repeating (record headers, field masks,
+# player colors, full health, empty bullet lists) are fed to zlib before
+# every snapshot, so even the first bytes of a frame can refer back to them.
+#
+# The dictionary is trained offline from the delta snapshots of recorded
+# matches (benchmarks/bench_compression.py --train) and shipped as
+# snapshot.zdict. Most of a delta is player records that start with the
+# same id and field mask tick after tick, so it is built from strings of
+# exactly that length.
+# Server and client must hold the same one: the welcome message carries the
+# server's dictionary id and a client only asks for compressed snapshots
+# when its own copy has that id. Frames use raw deflate, without zlib's
+# header and checksum, which TCP and the UDP checksum already cover.
+
+DICTIONARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.zdict")
+MAX_DICTIONARY_SIZE = 32768  # zlib cannot refer further back than its 32 KB window
+TRAINED_SIZE = 1024  # Bytes of a trained dictionary, more barely helps and primes slower
+DEFAULT_LEVEL = 6
+WBITS = -15  # Raw deflate, 32 KB window
+
+
+def dictionary_id(dictionary):
+    """Id the welcome message announces a dictionary by, never 0 (0 means no compression)"""
+    return zlib.crc32(dictionary) or 1
+
+
+def load_dictionary(path=DICTIONARY_PATH):
+    """The shipped dictionary, b"" when it is missing"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(MAX_DICTIONARY_SIZE)
+    except OSError:
+        return b""
+
+
+class SnapshotCodec:
+    """Compresses snapshot bodies on the server and decompresses them on the client"""
+
+    def __init__(self, dictionary=b"", level=DEFAULT_LEVEL):
+        self.dictionary = dictionary
+        self.id = dictionary_id(dictionary)
+        self.level = level
+        self.primed = None  # Compressor fed the dictionary, made on first use: clients never need it
+
+    def compress(self, body):
+        if self.primed is None:
+            if self.dictionary:
+                self.primed = zlib.compressobj(self.level, zlib.DEFLATED, WBITS, zdict=self.dictionary)
+            else:
+                self.primed = zlib.compressobj(self.level, zlib.DEFLATED, WBITS)
+        # Copying a primed compressor is cheaper than feeding a new one the dictionary
+        compressor = self.primed.copy()
+        return compressor.compress(body) + compressor.flush()
+
+    def decompress(self, data):
+        if self.dictionary:
+            decompressor = zlib.decompressobj(WBITS, zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj(WBITS)
+        body = decompressor.decompress(data, MAX_FRAME_SIZE)
+        if not decompressor.eof:
+            raise zlib.error("truncated or oversized snapshot")
+        return body
+
+    def expand(self, payload):
+        """A MSG_SNAPSHOT_Z payload as the plain MSG_SNAPSHOT payload decode_snapshot takes"""
+        return payload[:SNAPSHOT_CLIENT.size] + self.decompress(payload[SNAPSHOT_CLIENT.size:])
+
+
+def train_dictionary(samples, size=TRAINED_SIZE, k=PLAYER_DELTA.size):
+    """A dictionary of the k byte strings found in the most samples, most common last.
+
+    zlib codes nearer matches in fewer bits, so the most common strings go
+    at the end, right before the data.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+    picked = []
+    for gram, count in counts.most_common(size // k):
+        if count < 2:
+            break
+        picked.append(gram)
+    return b"".join(reversed(picked))
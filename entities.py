@@ -0,0 +1,108 @@
+from protocol import BULLET, COLOR, COUNT, HEALTH, PICKUP, POSITION, SPECTATOR, STATS, quantize
+
+# Server side game entities
+#
+# Every entity is a small class with __slots__: no per-instance __dict__, so
+# each one takes a fixed, small amount of memory and attribute reads in the
+# tick loop are plain slot lookups instead of string keyed dict lookups.
+# Serialization is explicit: each entity packs itself into the records of
+# protocol.py and nothing else about it goes on the wire.
+
+MAX_HEALTH = 100
+NO_BULLETS = COUNT.pack(0)  # Empty bullet list, shared by every player without bullets
+
+
+class Player:
+    """One connected player, alive or spectating"""
+
+    __slots__ = ("x", "y", "color", "health", "spectator", "kills", "deaths", "last_shot", "death_time")
+
+    def __init__(self, x, y, color, health=MAX_HEALTH, last_shot=0.0):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.health = health
+        self.spectator = False
+        self.kills = 0
+        self.deaths = 0
+        self.last_shot = last_shot  # Simulation time of the last shot
+        self.death_time = None
+
+    def respawn(self, x, y):
+        self.x = x
+        self.y = y
+        self.health = MAX_HEALTH
+        self.spectator = False
+
+    def pack(self, bullets=None):
+        """Packed field groups in wire order; bullets are the player's packed BULLET records"""
+        return (
+            POSITION.pack(quantize(self.x), quantize(self.y)),
+            COLOR.pack(*self.color),
+            HEALTH.pack(self.health),
+            SPECTATOR.pack(self.spectator),
+            STATS.pack(self.kills, self.deaths),
+            COUNT.pack(len(bullets) // BULLET.size) + bullets if bullets else NO_BULLETS,
+        )
+
+
+class Bullet:
+    """A bullet in flight, dx/dy is its unit direction"""
+
+    __slots__ = ("x", "y", "dx", "dy", "lifetime")
+
+    def __init__(self, x, y, dx, dy):
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+        self.lifetime = 0  # Ticks since it was fired
+
+    def pack(self):
+        return BULLET.pack(quantize(self.x), quantize(self.y))
+
+
+class Pickup:
+    """A pickup lying on the map, kind is its pickups.py type code"""
+
+    __slots__ = ("id", "x", "y", "kind")
+
+    def __init__(self, pickup_id, x, y, kind=0):
+        self.id = pickup_id
+        self.x = x
+        self.y = y
+        self.kind = kind
+
+    def pack(self):
+        return PICKUP.pack(self.id, self.x, self.y, self.kind)
+
+
+class InputState:
+    """The latest input of a player, as applied by the tick"""
+
+    __slots__ = ("seq", "move_x", "move_y", "sprint", "respawn", "shoot", "ack")
+
+    def __init__(self, seq=0, move_x=0, move_y=0, sprint=False, respawn=False, shoot=None, ack=0):
+        self.seq = seq
+        self.move_x = move_x
+        self.move_y = move_y
+        self.sprint = sprint
+        self.respawn = respawn
+        self.shoot = shoot  # None, "suicide" or the mouse position (mx, my) to shoot at
+        self.ack = ack
+
+    @classmethod
+    def from_dict(cls, input_data):
+        """Build from the input dict decoded by protocol.unpack_input"""
+        move = input_data.get("move", (0, 0))
+        shoot = input_data.get("shoot")
+        return cls(input_data.get("seq", 0), move[0], move[1], input_data.get("sprint", False),
+                   input_data.get("respawn", False), tuple(shoot) if isinstance(shoot, list) else shoot,
+                   input_data.get("ack", 0))
+
+    def held(self):
+        """The same input without its shot and respawn, what carries over once the tick applied it"""
+        return InputState(self.seq, self.move_x, self.move_y, self.sprint, ack=self.ack)
+
+
+IDLE_INPUT = InputState()  # Used for players who have not sent anything yet
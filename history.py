@@ -0,0 +1,51 @@
+from array import array
+
+# Recent player positions for lag compensation
+#
+# A client draws other players some time in the past (its round trip plus
+# its interpolation delay), so bullets are tested against where the targets
+# were on the shooter's screen instead of where they are now. Each player
+# gets a fixed size ring of positions indexed by tick % capacity, so memory
+# depends on the rewind cap and the player count, never on match length.
+# A slot only counts if it was written at the tick asked for: players who
+# were dead, not yet joined or respawned since simply have no position there.
+
+
+class PositionHistory:
+    """Per player ring buffers of positions over the last capacity ticks"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.xy = {}     # {pid: array of x, y per slot}
+        self.ticks = {}  # {pid: array of the tick each slot was written at, -1 if never}
+
+    def record(self, tick, players):
+        """Store the position of every alive player at tick"""
+        slot = tick % self.capacity
+        for pid, p in players.items():
+            if p.spectator:
+                continue
+            xy = self.xy.get(pid)
+            if xy is None:
+                xy = self.xy[pid] = array("d", bytes(16 * self.capacity))
+                self.ticks[pid] = array("q", [-1]) * self.capacity
+            xy[2*slot] = p.x
+            xy[2*slot + 1] = p.y
+            self.ticks[pid][slot] = tick
+
+    def get(self, pid, tick):
+        """(x, y) of pid at tick, or None if it was not alive then or that tick is gone"""
+        ticks = self.ticks.get(pid)
+        slot = tick % self.capacity
+        if ticks is None or ticks[slot] != tick:
+            return None
+        xy = self.xy[pid]
+        return xy[2*slot], xy[2*slot + 1]
+
+    def remove(self, pid):
+        self.xy.pop(pid, None)
+        self.ticks.pop(pid, None)
+
+    def clear(self):
+        self.xy.clear()
+        self.ticks.clear()
@@ -0,0 +1,70 @@
+import queue
+import threading
+import time
+
+# Asynchronous, rate limited logging
+#
+# Callers only put the message on a queue; a background thread prints it,
+# so a slow terminal never stalls the tick or whoever holds the world lock.
+# Messages logged with a key (say every pickup) share a token bucket per
+# key: beyond `rate` per second, after an initial burst, they are counted
+# instead of printed, and the next one that gets through says how many
+# were dropped.
+
+
+class AsyncLog:
+    """Prints messages from a background thread, rate limiting keyed ones"""
+
+    def __init__(self, rate=5, burst=20, output=print):
+        self.rate = rate
+        self.burst = burst
+        self.output = output
+        self.enabled = True
+        self.queue = queue.SimpleQueue()
+        self.buckets = {}  # {key: [tokens, last refill time, suppressed count]}, writer thread only
+        self.thread = None
+        self._start_lock = threading.Lock()
+
+    def __call__(self, message, key=None):
+        if not self.enabled:
+            return
+        if self.thread is None:
+            self._start()
+        self.queue.put((time.monotonic(), key, message))
+
+    def _start(self):
+        with self._start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="log", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            when, key, message = item
+            if key is not None:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = [self.burst, when, 0]
+                bucket[0] = min(self.burst, bucket[0] + (when - bucket[1]) * self.rate)
+                bucket[1] = when
+                if bucket[0] < 1:
+                    bucket[2] += 1
+                    continue
+                bucket[0] -= 1
+                if bucket[2]:
+                    message = f"{message} ({bucket[2]} similar messages suppressed)"
+                    bucket[2] = 0
+            try:
+                self.output(message)
+            except Exception:
+                pass  # Never let logging take a thread down
+
+    def close(self, timeout=1):
+        """Print what is still queued and stop the writer thread"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
@@ -0,0 +1,105 @@
+import time
+from collections import deque
+
+# Per-client input command queues
+#
+# Reader threads (or tasks) never touch the world. Each client has a
+# Mailbox its reader posts decoded inputs to, and the game loop drains
+# every mailbox at the start of a tick, applying the inputs on its own
+# thread, so the world needs no lock. Both sides only append to and pop
+# from a deque, single operations under the GIL, so neither ever waits for
+# the other.
+#
+# Inputs are commands, queued in seq order and applied one per tick, so a
+# shot or respawn is never overwritten by the next input. The reader
+# refills a token bucket at a little over the tick rate and drops movement
+# only inputs that arrive faster than that, or that find the queue full: a
+# client sending 240 inputs a second queues no more than one sending 60.
+# Shots and respawns are discrete actions the client does not send again,
+# so they are always queued: they still use up a token, which holds back
+# the movement after them, and only a client past EVENT_QUEUE_DEPTH of
+# them queued, far beyond anything a stall piles up, loses any. When the
+# queue runs more than MAX_BACKLOG commands ahead of the ticks (a burst
+# after a network stall), the game loop folds the older movement only
+# commands into the next one. Snapshots tell each client its backlog and
+# whether its inputs were dropped, see netclient.py.
+
+COMMAND_QUEUE_DEPTH = 32  # Commands queued per client, newer movement only inputs are dropped beyond that
+EVENT_QUEUE_DEPTH = 64  # Shots and respawns queued per client, newer ones are dropped beyond that
+INPUT_BURST = 8  # Inputs a client may send back to back before the rate limit applies
+MAX_BACKLOG = 3  # Commands left queued after a tick, older movement is folded beyond that (above netclient.py's limit)
+
+
+def has_event(input_data):
+    """Whether an input carries a shot or respawn, which must not be folded away or rate limited"""
+    return input_data.get("respawn") or input_data.get("shoot") is not None
+
+
+class Mailbox:
+    """What one client sent since the last tick, shared lock-free with the game loop"""
+
+    def __init__(self, outbox, token, rate, relay=False):
+        self.outbox = outbox  # Where snapshots go until the client switches to UDP
+        self.token = token  # UDP token the client must present
+        self.relay = relay  # A spectator relay: gets every snapshot, has no player, its inputs only ack
+        self.commands = deque()  # (input dict, arrival time), oldest first
+        self.closed = False  # Set by the reader once the connection is gone
+        self.compressed = False  # Set by the reader once the client asked for compressed snapshots
+        self.interp_delay = None  # Seconds, set by the reader once the client sent its interpolation delay
+        # Written by the reader posting inputs (TCP or UDP) only
+        self.rate = rate  # Inputs per second refilled in the bucket
+        self.tokens = float(INPUT_BURST)
+        self.refilled = time.perf_counter()
+        self.throttled = 0  # Inputs dropped by the rate limit or a full queue so far
+        self.events_posted = 0  # Commands with a shot or respawn queued so far
+        # Written by the UDP receiver only
+        self.udp_addr = None  # Address of the last valid datagram
+        self.last_seq = 0  # Seq of the newest input posted over UDP
+        self.last_seen = 0.0  # time.time() of the last datagram
+        # Written by the game loop only
+        self.throttle_reported = 0  # self.throttled as of the last take_throttled()
+        self.events_taken = 0  # Commands with a shot or respawn drained so far
+
+    def post(self, input_data):
+        """Queue an input for a coming tick, False if it was dropped (see above). Never blocks"""
+        now = time.perf_counter()
+        self.tokens = min(INPUT_BURST, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if has_event(input_data):
+            # Each counter has a single writer, their difference is what is queued
+            if self.events_posted - self.events_taken >= EVENT_QUEUE_DEPTH:
+                self.throttled += 1
+                return False
+            self.events_posted += 1
+            self.tokens = max(-INPUT_BURST, self.tokens - 1)
+        elif self.tokens < 1 or len(self.commands) >= COMMAND_QUEUE_DEPTH:
+            self.throttled += 1
+            return False
+        else:
+            self.tokens -= 1
+        self.commands.append((input_data, now))
+        return True
+
+    def drain(self):
+        """(input to apply this tick, arrival time) or (None, None) if nothing came. Game loop only"""
+        commands = self.commands
+        try:
+            input_data, arrived = commands.popleft()
+        except IndexError:
+            return None, None
+        # Catch up past MAX_BACKLOG: fold movement only commands into the next one
+        while len(commands) > MAX_BACKLOG and not has_event(input_data):
+            input_data, arrived = commands.popleft()
+        if has_event(input_data):
+            self.events_taken += 1
+        return input_data, arrived
+
+    def backlog(self):
+        return len(self.commands)
+
+    def take_throttled(self):
+        """Inputs the rate limit or a full queue dropped since the last call. Game loop only"""
+        throttled = self.throttled
+        dropped = throttled - self.throttle_reported
+        self.throttle_reported = throttled
+        return dropped
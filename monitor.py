@@ -0,0 +1,105 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stats endpoint
+#
+# A small HTTP server on its own thread, on localhost unless told otherwise:
+#
+#   /metrics                 the server's metrics in the Prometheus text format
+#   /profile?seconds=10      run the sampling profiler that long and return the
+#                            folded stacks ("thread;outer;inner count" lines) for
+#                            flamegraph.pl or speedscope. &thread=game-loop keeps
+#                            one thread, &interval=0.001 changes the sample period
+#
+# The profiler is a thread that reads every other thread's current stack
+# (sys._current_frames) at a fixed interval. It only runs while a /profile
+# request is being answered, so it costs nothing the rest of the time.
+
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+MAX_PROFILE_SECONDS = 300
+
+
+class StackSampler:
+    """Samples the stacks of the other threads of the process"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()  # One profile at a time
+
+    def sample(self, seconds, thread=None):
+        """Counter of folded stacks seen over seconds, optionally only of the thread named thread"""
+        counts = Counter()
+        me = threading.get_ident()
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == me or (thread is not None and name != thread):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(name)
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return counts
+
+
+def folded(counts):
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def start_monitor(port, metrics, host="127.0.0.1"):
+    """Serve /metrics (the text the metrics callable returns) and /profile from a daemon thread"""
+    sampler = StackSampler()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                self.reply(200, metrics(), "text/plain; version=0.0.4")
+            elif url.path == "/profile":
+                self.profile(parse_qs(url.query))
+            else:
+                self.reply(404, "Try /metrics or /profile?seconds=10\n")
+
+        def profile(self, query):
+            try:
+                seconds = min(MAX_PROFILE_SECONDS, float(query.get("seconds", ["10"])[0]))
+                interval = float(query.get("interval", [PROFILE_INTERVAL])[0])
+            except ValueError:
+                self.reply(400, "seconds and interval must be numbers\n")
+                return
+            if not sampler.lock.acquire(blocking=False):
+                self.reply(409, "A profile is already running\n")
+                return
+            try:
+                sampler.interval = max(0.0005, interval)
+                counts = sampler.sample(seconds, query.get("thread", [None])[0])
+            finally:
+                sampler.lock.release()
+            self.reply(200, folded(counts))
+
+        def reply(self, status, text, content_type="text/plain; charset=utf-8"):
+            body = text.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # No line per scrape
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="monitor", daemon=True).start()
+    return httpd
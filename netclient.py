@@ -0,0 +1,171 @@
+import select
+import threading
+import time
+from collections import OrderedDict, deque
+
+from protocol import (MSG_SNAPSHOT, MSG_SNAPSHOT_Z, SNAPSHOT_HISTORY, INPUT_REDUNDANCY, decode_datagram, encode_input,
+                      pack_input, encode_inputs, decode_snapshot, snapshot_tick)
+
+# Client network thread
+#
+# All socket work happens here, so the render loop never waits on the
+# network. The thread sleeps in select() until a socket is readable or the
+# next input is due, decodes the newest snapshot and publishes it in
+# `latest` as a (state, receive time) tuple. Publishing is a single
+# reference swap: the render loop reads whichever tuple is there, the thread
+# never touches a published state again, so no lock is needed.
+#
+# Inputs go out on their own fixed cadence (the server's tick rate by
+# default), not once per rendered frame. The render loop only sets the held
+# movement keys and queues one shot events (shots, suicide, respawn); each
+# input the thread sends is appended to `sent` for the client's prediction.
+#
+# Snapshots carry back-pressure from the server: if its rate limit dropped
+# inputs, the thread falls back to the tick rate, and while inputs queue up
+# on the server it skips a send that carries no shot or respawn.
+#
+# Compressed snapshots (MSG_SNAPSHOT_Z) are expanded as they arrive, before
+# the newest is picked, since their tick is inside the compressed body.
+
+NETWORK_TIMEOUT = 5  # Seconds without a snapshot before a receive error counts as a lost connection
+INPUT_BACKLOG_LIMIT = 2  # Inputs queued on the server past which the next movement only input is skipped
+
+
+class NetworkThread(threading.Thread):
+    """Receives snapshots and sends inputs for one connected client"""
+
+    def __init__(self, tcp, decoder, player_id, udp=None, udp_token=0, server_addr=None, input_rate=60,
+                 tick_rate=60, codec=None):
+        super().__init__(daemon=True)
+        self.tcp = tcp
+        self.decoder = decoder
+        self.player_id = player_id
+        self.udp = udp
+        self.udp_token = udp_token
+        self.server_addr = server_addr
+        self.interval = 1 / input_rate
+        self.tick_interval = 1 / tick_rate  # Slowest the server's rate limit lets through unthrottled
+        self.skip_send = False  # Set when the server reports a backlog of our inputs
+        self.codec = codec  # SnapshotCodec once the server agreed to compress snapshots
+
+        self.latest = None  # (state, perf_counter when received) of the newest snapshot
+        self.sent = deque()  # (seq, move_x, move_y, sprint, dt) of every input sent, for prediction
+        self.last_receive = time.time()
+        self.send_error = None  # Last send error, None once sending works again
+        self.closed = None  # Why the connection ended, the thread has stopped once set
+
+        self.held = (0, 0, False)  # move_x, move_y, sprint, set by the render loop
+        self.shots = deque()  # Pending [mouse x, mouse y] targets or "suicide"
+        self.respawns = deque()  # Pending respawn requests
+        self.input_seq = 0
+        self.recent_inputs = deque(maxlen=INPUT_REDUNDANCY)  # Packed inputs repeated in every datagram
+        self.snapshots = OrderedDict()  # {tick: state}, baselines the server may send deltas against
+        self.acked_tick = 0
+        self.stopping = threading.Event()
+
+    def set_input(self, move_x, move_y, sprint):
+        self.held = (move_x, move_y, sprint)
+
+    def shoot(self, target):
+        """Queue a shot at [mouse x, mouse y], or "suicide" to kill our own player"""
+        self.shots.append(target)
+
+    def request_respawn(self):
+        self.respawns.append(True)
+
+    def stop(self):
+        self.stopping.set()
+        self.join(timeout=1)
+
+    def run(self):
+        sockets = [self.tcp] if self.udp is None else [self.tcp, self.udp]
+        next_send = time.perf_counter()
+        while not self.stopping.is_set() and self.closed is None:
+            now = time.perf_counter()
+            if now >= next_send:
+                self.send_input()
+                next_send += self.interval
+                if next_send < now:
+                    next_send = now + self.interval  # Fell behind, do not send a burst
+            try:
+                readable, _, _ = select.select(sockets, [], [], max(0.0, next_send - time.perf_counter()))
+            except (OSError, ValueError) as e:
+                self.closed = f"Connection lost: {e}"
+                break
+            if readable:
+                self.receive(readable)
+
+    def send_input(self):
+        if self.skip_send and not self.shots and not self.respawns:
+            self.skip_send = False
+            return
+        self.input_seq += 1
+        move_x, move_y, sprint = self.held
+        shoot = self.shots.popleft() if self.shots else None
+        respawn = False
+        while self.respawns:
+            self.respawns.popleft()
+            respawn = True
+        input_data = {"seq": self.input_seq, "move": [move_x, move_y], "shoot": shoot, "sprint": sprint,
+                      "respawn": respawn, "ack": self.acked_tick}
+        try:
+            if self.udp is not None:
+                self.recent_inputs.append(pack_input(input_data))
+                self.udp.sendto(encode_inputs(self.player_id, self.udp_token, list(reversed(self.recent_inputs))),
+                                self.server_addr)
+            else:
+                self.tcp.sendall(encode_input(input_data))
+            self.send_error = None
+        except Exception as e:
+            if self.send_error is None:
+                print(f"[CLIENT] Error sending data: {e}")
+            self.send_error = e
+        self.sent.append((self.input_seq, move_x, move_y, sprint, self.interval))
+
+    def collect(self, msg_type, payload, received):
+        """Add a snapshot payload to received, decompressed so its tick can be read"""
+        if msg_type == MSG_SNAPSHOT:
+            received.append(payload)
+        elif msg_type == MSG_SNAPSHOT_Z and self.codec is not None:
+            received.append(self.codec.expand(payload))
+
+    def receive(self, readable):
+        received = []
+        try:
+            if self.tcp in readable:
+                data = self.tcp.recv(65536)
+                if not data:
+                    self.closed = "Server closed connection"
+                    return
+                for msg_type, payload in self.decoder.feed(data):
+                    self.collect(msg_type, payload, received)
+            if self.udp is not None and self.udp in readable:
+                # Drain every datagram that arrived since the last wakeup
+                while True:
+                    try:
+                        datagram = self.udp.recv(65536)
+                    except BlockingIOError:
+                        break
+                    self.collect(*decode_datagram(datagram), received)
+
+            # Only the newest snapshot matters, older or reordered ones are skipped
+            snapshot = max(received, key=snapshot_tick, default=None)
+            if snapshot is None or snapshot_tick(snapshot) <= self.acked_tick:
+                return
+            state = decode_snapshot(snapshot, self.snapshots)
+            if state is None:
+                return
+            self.snapshots[state["tick"]] = state
+            while len(self.snapshots) > SNAPSHOT_HISTORY * 2:
+                self.snapshots.popitem(last=False)
+            self.acked_tick = state["tick"]
+            self.last_receive = time.time()
+            self.latest = (state, time.perf_counter())
+            if state["input_throttled"] and self.interval < self.tick_interval:
+                print(f"[CLIENT] The server is dropping inputs, sending {round(1 / self.tick_interval)} per second "
+                      f"instead of {round(1 / self.interval)}")
+                self.interval = self.tick_interval
+            self.skip_send = state["input_backlog"] > INPUT_BACKLOG_LIMIT
+        except Exception as e:
+            if time.time() - self.last_receive > NETWORK_TIMEOUT:
+                self.closed = f"Connection lost: {e}"
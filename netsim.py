@@ -0,0 +1,68 @@
+import heapq
+import random
+import threading
+import time
+
+# Packet loss / latency simulator for testing the UDP transport on loopback
+#
+# NetSim wraps anything with a sendto(data, addr) method (a UDP socket or an
+# asyncio datagram transport) and drops or delays outgoing datagrams. Wrap
+# the sockets on both ends to simulate a bad link in both directions.
+
+
+class NetSim:
+    """Drop and delay outgoing datagrams of a UDP socket or transport"""
+
+    def __init__(self, sock, loss=0.0, latency=0.0, jitter=0.0, call_later=None, seed=None):
+        self.sock = sock
+        self.loss = loss          # Probability of dropping a datagram
+        self.latency = latency    # Seconds added to every datagram
+        self.jitter = jitter      # Extra random delay in [0, jitter] seconds
+        self.random = random.Random(seed)
+        self.dropped = 0
+        # asyncio callers pass loop.call_later so delayed sends stay on the loop
+        self._call_later = call_later
+        self._queue = []  # Heap of (due time, order, data, addr)
+        self._order = 0
+        self._cond = threading.Condition()
+        if call_later is None and (latency or jitter):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def sendto(self, data, addr):
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return len(data)
+        delay = self.latency + self.random.random() * self.jitter
+        if delay <= 0:
+            return self.sock.sendto(data, addr)
+        data = bytes(data)
+        if self._call_later is not None:
+            self._call_later(delay, self._send, data, addr)
+        else:
+            with self._cond:
+                self._order += 1
+                heapq.heappush(self._queue, (time.monotonic() + delay, self._order, data, addr))
+                self._cond.notify()
+        return len(data)
+
+    def _send(self, data, addr):
+        try:
+            self.sock.sendto(data, addr)
+        except OSError:
+            pass  # Lost, like any other datagram
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                due, _, data, addr = self._queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+            self._send(data, addr)
@@ -0,0 +1,281 @@
+import asyncio
+import selectors
+import socket
+import threading
+from collections import deque
+
+from protocol import MAX_DATAGRAM_FRAME
+
+# Non-blocking send pipeline
+#
+# The game loop never writes to a socket itself: it pushes frames into a small
+# bounded queue per client. In the threaded server an Outbox is drained by a
+# SendLoop thread as each socket becomes writable; in the asyncio server an
+# AsyncOutbox is drained by its own task on the event loop. When a client falls behind, its oldest queued snapshots
+# are dropped and the newest kept. Snapshots are deltas against the client's
+# acked tick, not against the previous snapshot, so any one of them can be
+# applied on its own.
+
+OUTBOX_DEPTH = 2  # Frames queued per client, not counting the one being written
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")  # Scatter/gather send, not available on Windows
+
+
+class FrameQueue:
+    """Bounded queue of outgoing frames for one client"""
+
+    def __init__(self, max_depth=OUTBOX_DEPTH):
+        self.max_depth = max_depth
+        self.frames = deque()   # Each frame is a list of bytes-like parts
+        self.current = None     # Frame being written, never dropped halfway
+        self.lock = threading.Lock()
+        self.closed = False
+        # Counters
+        self.dropped_frames = 0
+        self.sent_frames = 0
+        self.bytes_sent = 0
+
+    def push(self, parts):
+        """Queue a frame, dropping the oldest queued ones if the client is behind"""
+        with self.lock:
+            while len(self.frames) >= self.max_depth:
+                self.frames.popleft()
+                self.dropped_frames += 1
+            self.frames.append(parts)
+
+    @property
+    def queue_depth(self):
+        return len(self.frames) + (self.current is not None)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "dropped_frames": self.dropped_frames,
+            "sent_frames": self.sent_frames,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class Outbox(FrameQueue):
+    """Frame queue drained by a SendLoop thread"""
+
+    def __init__(self, conn, send_loop, max_depth=OUTBOX_DEPTH):
+        super().__init__(max_depth)
+        # Private non-blocking handle on the connection, so the reader
+        # thread keeps its own timeout on the original socket
+        self.conn = conn.dup()
+        self.conn.setblocking(False)
+        self.send_loop = send_loop
+
+    def send(self, parts):
+        """Queue a frame. Never blocks the caller"""
+        self.push(parts)
+        self.send_loop.notify(self)
+
+    def close(self):
+        """Stop sending and close our handle from the I/O thread"""
+        self.send_loop.close(self)
+
+    # Only our dup() of the connection gets closed, the reader keeps the original
+    detach = close
+
+    def flush(self):
+        """Write as much as the socket accepts. Returns True once everything queued is sent"""
+        while True:
+            if self.current is None:
+                with self.lock:
+                    if not self.frames:
+                        return True
+                    self.current = [memoryview(part) for part in self.frames.popleft()]
+            parts = self.current
+            try:
+                if HAS_SENDMSG:
+                    sent = self.conn.sendmsg(parts)
+                else:
+                    sent = self.conn.send(parts[0])
+            except BlockingIOError:
+                return False
+            self.bytes_sent += sent
+            # Drop what went out, keep zero-copy slices of the rest
+            while parts and sent >= len(parts[0]):
+                sent -= len(parts[0])
+                parts.pop(0)
+            if parts:
+                parts[0] = parts[0][sent:]
+                return False  # Socket buffer full, wait until writable again
+            self.current = None
+            self.sent_frames += 1
+
+
+class SendLoop:
+    """Background thread draining every Outbox through a selector"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ)
+        self._lock = threading.Lock()
+        self._ready = set()    # Outboxes with new frames
+        self._closing = set()  # Outboxes whose connection should be closed
+
+    def start(self):
+        threading.Thread(target=self.run, name="send-loop", daemon=True).start()
+
+    def notify(self, outbox):
+        """Tell the I/O thread an Outbox has new frames"""
+        with self._lock:
+            self._ready.add(outbox)
+        self._wake()
+
+    def close(self, outbox):
+        """Stop sending to a client and close its connection from the I/O thread"""
+        outbox.closed = True
+        with self._lock:
+            self._closing.add(outbox)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # Already a wake up pending
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._flush(key.data)
+
+            with self._lock:
+                ready, self._ready = self._ready, set()
+                closing, self._closing = self._closing, set()
+            for outbox in ready:
+                if not outbox.closed and outbox.current is None:
+                    self._flush(outbox)
+            for outbox in closing:
+                self._unregister(outbox)
+                outbox.conn.close()
+
+    def _flush(self, outbox):
+        if outbox.closed:
+            self._unregister(outbox)
+            return
+        try:
+            done = outbox.flush()
+        except OSError:
+            # Dead connection: wake the reader thread so it cleans up the player
+            outbox.closed = True
+            self._unregister(outbox)
+            try:
+                outbox.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        if done:
+            self._unregister(outbox)
+        elif outbox.conn.fileno() != -1:
+            try:
+                self.selector.register(outbox.conn, selectors.EVENT_WRITE, outbox)
+            except KeyError:
+                pass  # Already waiting for writability
+
+    def _unregister(self, outbox):
+        try:
+            self.selector.unregister(outbox.conn)
+        except (KeyError, ValueError):
+            pass
+
+
+class AsyncOutbox(FrameQueue):
+    """Frame queue drained by a task on the running event loop"""
+
+    def __init__(self, writer, max_depth=OUTBOX_DEPTH):
+        super().__init__(max_depth)
+        self.writer = writer
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def send(self, parts):
+        """Queue a frame. Never blocks the caller"""
+        self.push(parts)
+        self._wakeup.set()
+
+    def detach(self):
+        """Stop sending but keep the connection open"""
+        self.closed = True
+        self._task.cancel()
+
+    def close(self):
+        self.detach()
+        self.writer.close()
+
+    async def _drain(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while True:
+                    with self.lock:
+                        if not self.frames:
+                            break
+                        self.current = self.frames.popleft()
+                    self.writer.writelines(self.current)
+                    # Frames queue up here, not in the transport, while the client is behind
+                    await self.writer.drain()
+                    self.bytes_sent += sum(len(part) for part in self.current)
+                    self.current = None
+                    self.sent_frames += 1
+        except OSError:
+            # Dead connection: the reader task sees EOF and cleans up the player
+            self.closed = True
+            self.writer.close()
+
+
+class DatagramOutbox(FrameQueue):
+    """Sends each frame as one UDP datagram right away.
+
+    There is nothing to queue: the kernel drops datagrams it cannot buffer.
+    Frames over MAX_DATAGRAM_FRAME would only arrive as IP fragments, all
+    lost if one is, so they go over the client's TCP connection instead,
+    as do frames sent with send_reliably().
+    """
+
+    def __init__(self, sock, addr, stream):
+        super().__init__(0)
+        self.sock = sock  # UDP socket, asyncio datagram transport or NetSim wrapper
+        self.addr = addr
+        self.stream = stream  # The client's TCP Outbox or AsyncOutbox
+
+    def send(self, parts):
+        data = b"".join(parts)
+        if len(data) > MAX_DATAGRAM_FRAME:
+            self.send_reliably(parts)
+            return
+        try:
+            self.sock.sendto(data, self.addr)
+        except OSError:
+            self.dropped_frames += 1
+            return
+        self.sent_frames += 1
+        self.bytes_sent += len(data)
+
+    def send_reliably(self, parts):
+        """Send a frame that must arrive over TCP"""
+        self.stream.send(parts)
+        self.sent_frames += 1
+        self.bytes_sent += sum(len(part) for part in parts)
+
+    def detach(self):
+        """Stop sending datagrams, the TCP connection stays open"""
+        self.closed = True
+
+    def close(self):
+        self.detach()
+        self.stream.close()
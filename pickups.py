@@ -0,0 +1,161 @@
+import math
+
+from entities import Pickup
+from rules import MAP_WIDTH, MAP_HEIGHT, PLAYER_SIZE
+from spatial import SpatialHash
+
+# Pickups on the map
+#
+# A PickupManager owns every pickup: a dict by ID, a grid for the collection
+# test and each pickup's packed record, ready for the snapshot. How many
+# pickups there should be follows the number of alive players. The server
+# tells the manager when that changes (join, leave, death, respawn) and
+# when a pickup is collected, and the manager adds or removes pickups right
+# then, instead of recounting every player once a second.
+#
+# Where a new pickup appears is up to a spawn rule, which one appears is a
+# weighted draw from the configured pickup types. Every random choice goes
+# through the server's seeded generator, so recordings replay exactly.
+
+PICKUP_MARGIN = 30  # Pickups keep this far from the map edges
+PICKUP_REACH = 35   # Collected within this distance of a player's center
+SPREAD_CANDIDATES = 8  # Positions the spread rule picks from
+
+
+class PickupType:
+    """What a kind of pickup does, and its code on the wire"""
+
+    def __init__(self, code, name, heal, color):
+        self.code = code
+        self.name = name
+        self.heal = heal  # Health given to the player collecting it
+        self.color = color  # How clients draw it
+
+
+HEALTH = PickupType(0, "health", 10, (255, 100, 100))
+MEDKIT = PickupType(1, "medkit", 40, (100, 200, 255))
+PICKUP_TYPES = {kind.name: kind for kind in (HEALTH, MEDKIT)}
+TYPES_BY_CODE = {kind.code: kind for kind in PICKUP_TYPES.values()}
+
+
+def parse_mix(text):
+    """[(PickupType, weight)] from "name:weight,..." such as "health:1,medkit:0.1" """
+    mix = []
+    for item in text.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name not in PICKUP_TYPES:
+            raise ValueError(f"unknown pickup type {name!r}, choose from {', '.join(PICKUP_TYPES)}")
+        mix.append((PICKUP_TYPES[name], float(weight) if weight else 1.0))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError("the pickup mix needs a type with a positive weight")
+    return mix
+
+
+def uniform_spawn(rng, players, pickups):
+    """Anywhere on the map"""
+    return (rng.randint(PICKUP_MARGIN, MAP_WIDTH - PICKUP_MARGIN),
+            rng.randint(PICKUP_MARGIN, MAP_HEIGHT - PICKUP_MARGIN))
+
+
+def spread_spawn(rng, players, pickups):
+    """The candidate position farthest from every alive player and every other pickup"""
+    others = [(p.x + PLAYER_SIZE / 2, p.y + PLAYER_SIZE / 2) for p in players.values() if not p.spectator]
+    others += [(pickup.x, pickup.y) for pickup in pickups.values()]
+    best, best_distance = None, -1.0
+    for _ in range(SPREAD_CANDIDATES):
+        x, y = uniform_spawn(rng, players, pickups)
+        distance = min((math.hypot(x - ox, y - oy) for ox, oy in others), default=0.0)
+        if distance > best_distance:
+            best, best_distance = (x, y), distance
+    return best
+
+
+SPAWN_RULES = {"uniform": uniform_spawn, "spread": spread_spawn}
+
+
+class PickupManager:
+    """Every pickup on the map, kept at a count that follows the alive players"""
+
+    def __init__(self, rng, spawn="uniform", mix="health", per_player=1.0, minimum=1):
+        self.rng = rng
+        self.spawn_rule = spawn
+        self.spawn = SPAWN_RULES[spawn]
+        self.mix_text = mix
+        self.mix = parse_mix(mix)
+        self.per_player = per_player
+        self.minimum = minimum
+        self.pickups = {}  # {id: Pickup}, oldest first
+        self.packed = {}   # {id: packed PICKUP record}
+        self.view = None   # Copy of packed handed to pack_world, until the next change
+        self.grid = SpatialHash()
+        self.next_id = 0
+        self.alive = 0  # Alive players, as reported by the server
+
+    def __len__(self):
+        return len(self.pickups)
+
+    def clear(self):
+        self.pickups.clear()
+        self.packed.clear()
+        self.view = None
+        self.grid.clear()
+        self.next_id = 0
+        self.alive = 0
+
+    def snapshot(self):
+        """{id: packed PICKUP record}, the same dict until a pickup is added or removed"""
+        if self.view is None:
+            self.view = dict(self.packed)
+        return self.view
+
+    @property
+    def target(self):
+        return max(self.minimum, round(self.alive * self.per_player))
+
+    def alive_changed(self, delta, players):
+        """A player joined, left, died or respawned"""
+        self.alive += delta
+        self.rebalance(players)
+
+    def rebalance(self, players):
+        """Add or remove pickups until there are as many as the alive players call for"""
+        while len(self.pickups) < self.target:
+            self.add(players)
+        while len(self.pickups) > self.target:
+            self.remove(self.pickups[next(reversed(self.pickups))])  # Newest first
+
+    def add(self, players):
+        kind = self.mix[0][0]
+        if len(self.mix) > 1:
+            kind = self.rng.choices([kind for kind, _ in self.mix], [weight for _, weight in self.mix])[0]
+        x, y = self.spawn(self.rng, players, self.pickups)
+        self.next_id += 1
+        pickup = Pickup(self.next_id, x, y, kind.code)
+        self.pickups[pickup.id] = pickup
+        self.packed[pickup.id] = pickup.pack()
+        self.view = None
+        self.grid.insert(pickup.id, pickup, x, y)
+        return pickup
+
+    def remove(self, pickup):
+        del self.pickups[pickup.id]
+        del self.packed[pickup.id]
+        self.view = None
+        self.grid.remove(pickup.id)
+
+    def collect(self, player, players):
+        """Take the first pickup (lowest ID) within reach of player and put a new one down.
+
+        Returns the collected Pickup, or None.
+        """
+        cx, cy = player.x + PLAYER_SIZE / 2, player.y + PLAYER_SIZE / 2
+        reach = PICKUP_REACH
+        collected = None
+        for pickup_id, pickup in self.grid.query_rect(cx - reach, cy - reach, 2*reach, 2*reach).items():
+            if (collected is None or pickup_id < collected.id) and math.hypot(cx - pickup.x, cy - pickup.y) < reach:
+                collected = pickup
+        if collected is None:
+            return None
+        self.remove(collected)
+        self.rebalance(players)
+        return collected
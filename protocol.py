@@ -0,0 +1,459 @@
+import struct
+
+# Wire protocol shared by server.py and client.py
+#
+# Every message travels in a frame:
+#   [length: uint32][version: uint8][type: uint8][payload ...]
+# where length counts the version, type and payload bytes. Payloads are fixed
+# layout struct records, so decoding never runs code coming from the network.
+# Positions travel in fixed point, 1/POSITION_SCALE of a pixel per unit, two
+# bytes per coordinate on the 2000 px map.
+#
+# Over UDP every datagram carries exactly one frame. Snapshot ticks double as
+# sequence numbers and input bundles repeat the last INPUT_REDUNDANCY inputs,
+# so a lost datagram costs nothing once the next one arrives.
+#
+# Snapshots are delta encoded: the client acks the last tick it applied and
+# the server only sends the player fields that changed since that baseline.
+# A baseline tick of 0 marks a full snapshot. Everything after the small
+# per-client header is shared, so the server encodes it once per baseline.
+# That header also echoes the seq of the client's last applied input, which
+# the client needs to reconcile its predicted position, and how its inputs
+# fare on the server: how many are still queued and whether the rate limit
+# dropped some, so the client can slow down.
+#
+# Pickups only change when one is collected or the player count changes,
+# so the pickup section lists the pickups added and removed since the
+# baseline, not the whole set.
+#
+# A spectator relay (relay.py) subscribes to every snapshot and unpacks it
+# back into the packed world it was encoded from, so it can encode deltas
+# for its own viewers exactly as the server would. Viewers get VIEWER_ID as
+# their player id, no player has it.
+
+PROTOCOL_VERSION = 10
+DEFAULT_PORT = 5555       # TCP, and UDP when the server enables it
+MAX_FRAME_SIZE = 1 << 20  # 1 MB, far above any real snapshot
+SNAPSHOT_HISTORY = 32     # Snapshots kept as possible delta baselines (~1s at 30Hz)
+MAX_DATAGRAM_FRAME = 1400  # Largest frame sent as one datagram, unfragmented on an Ethernet path
+INPUT_REDUNDANCY = 3      # Inputs repeated in each UDP input datagram
+VIEWER_ID = 0             # Player id in the welcome of a relay viewer, who has no player
+
+FRAME_HEADER = struct.Struct("!IBB")
+
+# Message types
+MSG_WELCOME = 1   # server -> client: assigned player ID
+MSG_INPUT = 2     # client -> server: one frame of input
+MSG_SNAPSHOT = 3  # server -> client: world state
+MSG_INPUTS = 4    # client -> server over UDP: the latest few inputs, newest first
+MSG_CODEC = 5     # client -> server: compress my snapshots with the dictionary the welcome offered
+MSG_SNAPSHOT_Z = 6  # server -> client: world state, body compressed (see compression.py)
+MSG_INTERP = 7   # client -> server: how far behind the newest snapshot it draws other players
+
+# Records
+WELCOME = struct.Struct("!IIHHI")                # player_id, UDP token, UDP port (0: no UDP), tick rate,
+                                                 # snapshot dictionary id (0: no compression)
+CODEC = struct.Struct("!I")                      # snapshot dictionary id the client holds too
+INTERP = struct.Struct("!H")                     # interpolation delay in ms
+INPUT = struct.Struct("!IbbBhhI")                # seq, move x, move y, flags, mouse x, mouse y, acked tick
+INPUTS_HEADER = struct.Struct("!IIB")            # player_id, UDP token, input count
+SNAPSHOT_CLIENT = struct.Struct("!IBIBB")        # player_id, spectator, last applied input seq,
+                                                 # inputs still queued, input flags
+                                                 # (the only per-client part)
+SNAPSHOT_HEADER = struct.Struct("!IIHHB")        # tick, baseline tick, changed players,
+                                                 # removed players, sections
+PLAYER_DELTA = struct.Struct("!IB")              # id, changed fields mask
+PLAYER_ID = struct.Struct("!I")                  # id of a removed player
+POSITION = struct.Struct("!HH")                  # x, y in 1/POSITION_SCALE px
+COLOR = struct.Struct("!BBB")                    # r, g, b
+HEALTH = struct.Struct("!h")                     # health
+SPECTATOR = struct.Struct("!B")                  # spectator
+STATS = struct.Struct("!II")                     # kills, deaths
+COUNT = struct.Struct("!H")                      # length of the bullet or pickup list that follows
+BULLET = struct.Struct("!HH")                    # x, y in 1/POSITION_SCALE px
+PICKUP = struct.Struct("!IHHB")                  # id, x, y, type code (see pickups.py)
+PICKUP_ID = struct.Struct("!I")                  # id of a removed pickup
+
+POSITION_SCALE = 16  # Position units per pixel, a 2000 px map fits in 16 bits
+
+# Optional sections after the players, flags in the snapshot header
+SECTION_PICKUPS = 1
+
+# Player fields, one bit each in the changed fields mask, in wire order
+FIELD_POSITION = 1
+FIELD_COLOR = 2
+FIELD_HEALTH = 4
+FIELD_SPECTATOR = 8
+FIELD_STATS = 16
+FIELD_BULLETS = 32
+PLAYER_FIELDS = (FIELD_POSITION, FIELD_COLOR, FIELD_HEALTH, FIELD_SPECTATOR, FIELD_STATS, FIELD_BULLETS)
+ALL_FIELDS = 63
+FIELD_SIZES = (POSITION.size, COLOR.size, HEALTH.size, SPECTATOR.size, STATS.size, None)  # Bullets vary
+NEW_PLAYER = (POSITION.pack(0, 0), COLOR.pack(255, 255, 255), HEALTH.pack(100), SPECTATOR.pack(False),
+              STATS.pack(0, 0), COUNT.pack(0))  # Packed fields a player starts from, as decode_snapshot's
+
+# Input flags
+INPUT_SPRINT = 1
+INPUT_RESPAWN = 2
+INPUT_SHOOT = 4
+INPUT_SUICIDE = 8
+
+# Input flags in the snapshot header
+INPUT_THROTTLED = 1  # The server dropped inputs sent faster than its rate limit
+
+
+def quantize(value):
+    """Fixed point position unit nearest to value, which must be on the map"""
+    return int(value * POSITION_SCALE + 0.5)
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends a malformed or incompatible frame"""
+
+
+def encode_frame(msg_type, payload=b""):
+    """Wrap a payload in a length-prefixed frame"""
+    return FRAME_HEADER.pack(len(payload) + 2, PROTOCOL_VERSION, msg_type) + payload
+
+
+class FrameDecoder:
+    """Streaming decoder: feed raw socket bytes, get back complete frames"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data):
+        """Append received bytes and return a list of (msg_type, payload) frames"""
+        self._buf += data
+        frames = []
+        offset = 0
+        buf_len = len(self._buf)
+        while buf_len - offset >= FRAME_HEADER.size:
+            length, version, msg_type = FRAME_HEADER.unpack_from(self._buf, offset)
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"unsupported protocol version {version}")
+            if length < 2 or length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"invalid frame length {length}")
+            end = offset + 4 + length
+            if end > buf_len:
+                break  # Wait for the rest of the frame
+            frames.append((msg_type, bytes(self._buf[offset + FRAME_HEADER.size:end])))
+            offset = end
+        if offset:
+            del self._buf[:offset]
+        return frames
+
+
+def decode_datagram(data):
+    """Return (msg_type, payload) of a datagram holding exactly one frame"""
+    if len(data) < FRAME_HEADER.size:
+        raise ProtocolError("datagram too short")
+    length, version, msg_type = FRAME_HEADER.unpack_from(data, 0)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    if length != len(data) - 4:
+        raise ProtocolError(f"invalid frame length {length}")
+    return msg_type, data[FRAME_HEADER.size:]
+
+
+def encode_welcome(player_id, token=0, udp_port=0, tick_rate=60, dictionary_id=0):
+    return encode_frame(MSG_WELCOME, WELCOME.pack(player_id, token, udp_port, tick_rate, dictionary_id))
+
+
+def decode_welcome(payload):
+    """Return (player_id, UDP token, UDP port or 0 without UDP, server tick rate, dictionary id or 0)"""
+    return WELCOME.unpack(payload)
+
+
+def encode_codec(dictionary_id):
+    return encode_frame(MSG_CODEC, CODEC.pack(dictionary_id))
+
+
+def decode_codec(payload):
+    return CODEC.unpack(payload)[0]
+
+
+def encode_interp(delay):
+    """Tell the server the interpolation delay in seconds, which lag compensation rewinds by"""
+    return encode_frame(MSG_INTERP, INTERP.pack(min(65535, max(0, round(delay * 1000)))))
+
+
+def decode_interp(payload):
+    return INTERP.unpack(payload)[0] / 1000
+
+
+def pack_input(input_data):
+    """Pack an input dict {"seq", "move", "shoot", "sprint", "respawn", "ack"} into a record"""
+    move = input_data.get("move", [0, 0])
+    shoot = input_data.get("shoot", None)
+    flags = 0
+    mx = my = 0
+    if input_data.get("sprint", False):
+        flags |= INPUT_SPRINT
+    if input_data.get("respawn", False):
+        flags |= INPUT_RESPAWN
+    if shoot == "suicide":
+        flags |= INPUT_SUICIDE
+    elif shoot is not None:
+        flags |= INPUT_SHOOT
+        mx, my = shoot
+    return INPUT.pack(input_data.get("seq", 0), move[0], move[1], flags, mx, my, input_data.get("ack", 0))
+
+
+def unpack_input(payload, offset=0):
+    """Unpack an input record back into the input dict shape"""
+    seq, move_x, move_y, flags, mx, my, ack = INPUT.unpack_from(payload, offset)
+    if flags & INPUT_SUICIDE:
+        shoot = "suicide"
+    elif flags & INPUT_SHOOT:
+        shoot = [mx, my]
+    else:
+        shoot = None
+    return {
+        "seq": seq,
+        "move": [max(-1, min(1, move_x)), max(-1, min(1, move_y))],
+        "shoot": shoot,
+        "sprint": bool(flags & INPUT_SPRINT),
+        "respawn": bool(flags & INPUT_RESPAWN),
+        "ack": ack,
+    }
+
+
+def encode_input(input_data):
+    return encode_frame(MSG_INPUT, pack_input(input_data))
+
+
+def decode_input(payload):
+    return unpack_input(payload)
+
+
+def encode_inputs(player_id, token, records):
+    """Bundle packed input records, newest first, into one UDP frame"""
+    return encode_frame(MSG_INPUTS, INPUTS_HEADER.pack(player_id, token, len(records)) + b"".join(records))
+
+
+def decode_inputs(payload):
+    """Return (player_id, token, inputs newest first)"""
+    player_id, token, count = INPUTS_HEADER.unpack_from(payload, 0)
+    offset = INPUTS_HEADER.size
+    bundle = []
+    for _ in range(count):
+        bundle.append(unpack_input(payload, offset))
+        offset += INPUT.size
+    return player_id, token, bundle
+
+
+def pack_world(tick, players, pickups, bullets):
+    """Pack every player field once per tick.
+
+    players holds entities.py objects, pickups maps pickup id -> packed
+    PICKUP record and must not change afterwards (PickupManager.snapshot()),
+    bullets maps owner id -> packed BULLET records. The result is shared by
+    all clients and kept as a delta baseline.
+    """
+    world_players = {pid: p.pack(bullets.get(pid)) for pid, p in players.items()}
+    return {"tick": tick, "players": world_players, "pickups": pickups}
+
+
+def encode_player(pid, fields, old=None):
+    """Delta record of one player against its fields in the baseline, b"" if unchanged"""
+    if old is None:
+        return PLAYER_DELTA.pack(pid, ALL_FIELDS) + b"".join(fields)
+    if fields == old:
+        return b""
+    mask = 0
+    changed_fields = []
+    for bit, new, prev in zip(PLAYER_FIELDS, fields, old):
+        if new != prev:
+            mask |= bit
+            changed_fields.append(new)
+    return PLAYER_DELTA.pack(pid, mask) + b"".join(changed_fields)
+
+
+def encode_pickups(pickups, old=None):
+    """Pickup section: the pickups added since old, then the ids removed since old"""
+    if old is None:
+        old = {}
+    added = [record for pickup_id, record in pickups.items() if pickup_id not in old]
+    removed = [PICKUP_ID.pack(pickup_id) for pickup_id in old if pickup_id not in pickups]
+    return COUNT.pack(len(added)) + b"".join(added) + COUNT.pack(len(removed)) + b"".join(removed)
+
+
+def encode_snapshot_body(world, baseline=None):
+    """Encode the shared part of a snapshot as a delta against baseline, or in full if baseline is None"""
+    world_players = world["players"]
+    base_players = baseline["players"] if baseline else {}
+    parts = []
+    changed = 0
+    for pid, fields in world_players.items():
+        record = encode_player(pid, fields, base_players.get(pid))
+        if record:
+            parts.append(record)
+            changed += 1
+
+    removed = [pid for pid in base_players if pid not in world_players]
+    for pid in removed:
+        parts.append(PLAYER_ID.pack(pid))
+
+    sections = 0
+    base_pickups = baseline["pickups"] if baseline else None
+    if base_pickups is not world["pickups"] and base_pickups != world["pickups"]:
+        sections |= SECTION_PICKUPS
+        parts.append(encode_pickups(world["pickups"], base_pickups))
+
+    parts.insert(0, SNAPSHOT_HEADER.pack(world["tick"], baseline["tick"] if baseline else 0,
+                                         changed, len(removed), sections))
+    return b"".join(parts)
+
+
+def encode_snapshot_header(body_len, player_id, spectator, input_seq=0, input_backlog=0, throttled=False,
+                           compressed=False):
+    """Frame header plus per-client fields, to be sent right before a shared snapshot body"""
+    msg_type = MSG_SNAPSHOT_Z if compressed else MSG_SNAPSHOT
+    return (FRAME_HEADER.pack(body_len + SNAPSHOT_CLIENT.size + 2, PROTOCOL_VERSION, msg_type)
+            + SNAPSHOT_CLIENT.pack(player_id, spectator, input_seq, min(255, input_backlog),
+                                   INPUT_THROTTLED if throttled else 0))
+
+
+def snapshot_tick(payload):
+    """Tick of a snapshot payload without decoding it, used to skip stale snapshots"""
+    return SNAPSHOT_HEADER.unpack_from(payload, SNAPSHOT_CLIENT.size)[0]
+
+
+def decode_snapshot(payload, baselines):
+    """Decode a snapshot into the state dict shape.
+
+    baselines maps tick -> previously decoded state. Returns None when the
+    snapshot refers to a baseline we no longer have; the server falls back to
+    a full snapshot once our ack ages out of its history.
+    """
+    player_id, spectator, input_seq, input_backlog, input_flags = SNAPSHOT_CLIENT.unpack_from(payload, 0)
+    tick, baseline_tick, changed, removed, sections = \
+        SNAPSHOT_HEADER.unpack_from(payload, SNAPSHOT_CLIENT.size)
+    if baseline_tick:
+        baseline = baselines.get(baseline_tick)
+        if baseline is None:
+            return None
+        players = dict(baseline["players"])
+        pickups = baseline["pickups"]
+    else:
+        players = {}
+        pickups = {}
+
+    offset = SNAPSHOT_CLIENT.size + SNAPSHOT_HEADER.size
+    for _ in range(changed):
+        pid, mask = PLAYER_DELTA.unpack_from(payload, offset)
+        offset += PLAYER_DELTA.size
+        # Unchanged players keep sharing the baseline dict, changed ones get a copy
+        p = dict(players[pid]) if pid in players else {
+            "x": 0, "y": 0, "color": (255, 255, 255), "bullets": [],
+            "health": 100, "spectator": False, "kills": 0, "deaths": 0,
+        }
+        if mask & FIELD_POSITION:
+            x, y = POSITION.unpack_from(payload, offset)
+            p["x"], p["y"] = x / POSITION_SCALE, y / POSITION_SCALE
+            offset += POSITION.size
+        if mask & FIELD_COLOR:
+            p["color"] = COLOR.unpack_from(payload, offset)
+            offset += COLOR.size
+        if mask & FIELD_HEALTH:
+            p["health"] = HEALTH.unpack_from(payload, offset)[0]
+            offset += HEALTH.size
+        if mask & FIELD_SPECTATOR:
+            p["spectator"] = bool(SPECTATOR.unpack_from(payload, offset)[0])
+            offset += SPECTATOR.size
+        if mask & FIELD_STATS:
+            p["kills"], p["deaths"] = STATS.unpack_from(payload, offset)
+            offset += STATS.size
+        if mask & FIELD_BULLETS:
+            bullet_count = COUNT.unpack_from(payload, offset)[0]
+            offset += COUNT.size
+            bullets = []
+            for _ in range(bullet_count):
+                bx, by = BULLET.unpack_from(payload, offset)
+                offset += BULLET.size
+                bullets.append({"x": bx / POSITION_SCALE, "y": by / POSITION_SCALE})
+            p["bullets"] = bullets
+        players[pid] = p
+
+    for _ in range(removed):
+        players.pop(PLAYER_ID.unpack_from(payload, offset)[0], None)
+        offset += PLAYER_ID.size
+
+    if sections & SECTION_PICKUPS:
+        pickups = dict(pickups)  # Unchanged snapshots keep sharing the baseline dict
+        added_pickups = COUNT.unpack_from(payload, offset)[0]
+        offset += COUNT.size
+        for _ in range(added_pickups):
+            pickup_id, x, y, kind = PICKUP.unpack_from(payload, offset)
+            offset += PICKUP.size
+            pickups[pickup_id] = {"x": x, "y": y, "id": pickup_id, "kind": kind}
+        removed_pickups = COUNT.unpack_from(payload, offset)[0]
+        offset += COUNT.size
+        for _ in range(removed_pickups):
+            pickups.pop(PICKUP_ID.unpack_from(payload, offset)[0], None)
+            offset += PICKUP_ID.size
+
+    return {
+        "players": players,
+        "player_id": player_id,
+        "spectator": bool(spectator),
+        "pickups": pickups,
+        "tick": tick,
+        "input_seq": input_seq,
+        "input_backlog": input_backlog,
+        "input_throttled": bool(input_flags & INPUT_THROTTLED),
+    }
+
+
+def unpack_world(payload, baselines):
+    """Rebuild the packed world (as pack_world returns it) a snapshot payload was encoded from.
+
+    Used by relays to encode the snapshot again for their own clients, so the
+    fields are sliced out of the payload as they are, never decoded.
+    baselines maps tick -> previously unpacked world. Returns None when the
+    snapshot refers to a baseline we no longer have, like decode_snapshot.
+    """
+    tick, baseline_tick, changed, removed, sections = \
+        SNAPSHOT_HEADER.unpack_from(payload, SNAPSHOT_CLIENT.size)
+    if baseline_tick:
+        baseline = baselines.get(baseline_tick)
+        if baseline is None:
+            return None
+        players = dict(baseline["players"])
+        pickups = baseline["pickups"]
+    else:
+        players = {}
+        pickups = {}
+
+    offset = SNAPSHOT_CLIENT.size + SNAPSHOT_HEADER.size
+    for _ in range(changed):
+        pid, mask = PLAYER_DELTA.unpack_from(payload, offset)
+        offset += PLAYER_DELTA.size
+        fields = list(players.get(pid, NEW_PLAYER))
+        for i, (bit, size) in enumerate(zip(PLAYER_FIELDS, FIELD_SIZES)):
+            if mask & bit:
+                if size is None:
+                    size = COUNT.size + COUNT.unpack_from(payload, offset)[0] * BULLET.size
+                fields[i] = payload[offset:offset + size]
+                offset += size
+        players[pid] = tuple(fields)
+
+    for _ in range(removed):
+        players.pop(PLAYER_ID.unpack_from(payload, offset)[0], None)
+        offset += PLAYER_ID.size
+
+    if sections & SECTION_PICKUPS:
+        pickups = dict(pickups)  # Unchanged worlds keep sharing the baseline dict
+        added_pickups = COUNT.unpack_from(payload, offset)[0]
+        offset += COUNT.size
+        for _ in range(added_pickups):
+            pickups[PICKUP_ID.unpack_from(payload, offset)[0]] = payload[offset:offset + PICKUP.size]
+            offset += PICKUP.size
+        removed_pickups = COUNT.unpack_from(payload, offset)[0]
+        offset += COUNT.size
+        for _ in range(removed_pickups):
+            pickups.pop(PICKUP_ID.unpack_from(payload, offset)[0], None)
+            offset += PICKUP_ID.size
+
+    return {"tick": tick, "players": players, "pickups": pickups}
@@ -0,0 +1,158 @@
+import gzip
+import struct
+import zlib
+
+from protocol import PROTOCOL_VERSION, INPUT
+
+# Match recordings
+#
+# A recording holds everything the simulation depends on besides the code:
+# the seed of the server's random generator, the settings that change the
+# rules (tick rate, rewind window, bullet backend, pickup rules) and, in the order the
+# server applied them, every join, leave, input, round trip sample and
+# client interpolation delay, with a marker where each tick starts. Feeding it back through the same code
+# (replay.py) plays the same match bit for bit; a world checksum stored once
+# a second proves it, or shows the first tick that differs.
+#
+# Records are a type byte and a fixed size struct, inputs in their wire
+# format, streamed through gzip. The server flushes once a second, so the
+# log of a server that died is still readable up to its last second.
+
+MAGIC = b"SLRC"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("!4sHHQHH16s")  # magic, format version, protocol version, seed, tick rate,
+                                       # position history capacity, bullet backend
+PICKUP_HEADER = struct.Struct("!16sdH")  # pickup spawn rule, pickups per player, length of the
+                                         # pickup type mix that follows (see pickups.py)
+
+REC_TICK = 1      # tick about to be simulated
+REC_JOIN = 2      # player id
+REC_LEAVE = 3     # player id
+REC_INPUT = 4     # player id, input in the wire format
+REC_RTT = 5       # player id, round trip sample in seconds
+REC_CHECKSUM = 6  # tick, world checksum after simulating it
+REC_INTERP = 7    # player id, interpolation delay in seconds
+
+RECORDS = {
+    REC_TICK: struct.Struct("!I"),
+    REC_JOIN: struct.Struct("!I"),
+    REC_LEAVE: struct.Struct("!I"),
+    REC_INPUT: struct.Struct(f"!I{INPUT.size}s"),
+    REC_RTT: struct.Struct("!Id"),
+    REC_CHECKSUM: struct.Struct("!II"),
+    REC_INTERP: struct.Struct("!Id"),
+}
+
+FLUSH_SIZE = 1 << 16  # Bytes buffered before they go to the compressor
+
+
+class RecordingError(Exception):
+    """A file that is not a recording, or one this version cannot replay"""
+
+
+class MatchRecorder:
+    """Streams the records of a running match to a gzip file"""
+
+    def __init__(self, path, seed, tick_rate, history_capacity, backend, pickups):
+        self.file = gzip.open(path, "wb", compresslevel=6)
+        mix = pickups.mix_text.encode()
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, PROTOCOL_VERSION, seed, tick_rate,
+                                    history_capacity, backend.encode())
+                        + PICKUP_HEADER.pack(pickups.spawn_rule.encode(), pickups.per_player, len(mix)) + mix)
+        self.buffer = bytearray()
+        self.records = 0
+
+    def write(self, rec_type, *values):
+        self.buffer.append(rec_type)
+        self.buffer += RECORDS[rec_type].pack(*values)
+        self.records += 1
+        if len(self.buffer) >= FLUSH_SIZE:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+
+    def flush(self):
+        """Push everything written so far to disk, readable even if the server dies"""
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class RecordingReader:
+    """Header and records of a recording file, decompressed as they are read.
+
+    Memory does not grow with the match length, and a log that was cut
+    short simply ends at its last complete record.
+    """
+
+    def __init__(self, path, chunk_size=1 << 16):
+        self.path = path
+        self.file = open(path, "rb")
+        self.chunk_size = chunk_size
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip framing
+        self.data = bytearray()
+        self.offset = 0
+        try:
+            if not self._fill(HEADER.size):
+                raise RecordingError(f"{path}: too short for a recording")
+            magic, version, protocol, seed, tick_rate, capacity, backend = HEADER.unpack_from(self.data)
+            if magic != MAGIC:
+                raise RecordingError(f"{path}: not a recording")
+            if version != FORMAT_VERSION or protocol != PROTOCOL_VERSION:
+                raise RecordingError(f"{path}: recording format {version}, protocol {protocol}; "
+                                     f"this version replays {FORMAT_VERSION}, {PROTOCOL_VERSION}")
+            self.offset = HEADER.size
+            if not self._fill(PICKUP_HEADER.size):
+                raise RecordingError(f"{path}: header cut short")
+            spawn, per_player, mix_len = PICKUP_HEADER.unpack_from(self.data)
+            self.offset = PICKUP_HEADER.size
+            if not self._fill(mix_len):
+                raise RecordingError(f"{path}: header cut short")
+            mix = bytes(self.data[:mix_len])
+            self.offset = mix_len
+        except BaseException:
+            self.file.close()
+            raise
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.history_capacity = capacity
+        self.backend = backend.rstrip(b"\0").decode()
+        self.pickup_spawn = spawn.rstrip(b"\0").decode()
+        self.pickups_per_player = per_player
+        self.pickup_mix = mix.decode()
+
+    def _fill(self, size):
+        """Make sure size bytes are buffered past the offset, False at the end of the file"""
+        if self.offset:
+            del self.data[:self.offset]
+            self.offset = 0
+        while len(self.data) < size:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return False
+            try:
+                self.data += self.decompressor.decompress(chunk)
+            except zlib.error:
+                return False  # Corrupt tail of a log that was cut short
+        return True
+
+    def __iter__(self):
+        """(record type, values) in the order they were written"""
+        data = self.data
+        try:
+            while True:
+                if self.offset >= len(data) and not self._fill(1):
+                    return
+                rec_type = data[self.offset]
+                rec = RECORDS.get(rec_type)
+                if rec is None:
+                    raise RecordingError(f"{self.path}: unknown record type {rec_type}")
+                if self.offset + 1 + rec.size > len(data) and not self._fill(1 + rec.size):
+                    return  # Cut short in the middle of a record
+                yield rec_type, rec.unpack_from(data, self.offset + 1)
+                self.offset += 1 + rec.size
+        finally:
+            self.file.close()
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+from collections import OrderedDict
+
+from compression import DEFAULT_LEVEL, SnapshotCodec, dictionary_id, load_dictionary
+from logs import AsyncLog
+from outbound import AsyncOutbox
+from protocol import (FrameDecoder, ProtocolError, MSG_CODEC, MSG_INPUT, MSG_SNAPSHOT, MSG_SNAPSHOT_Z, MSG_WELCOME,
+                      SNAPSHOT_HISTORY, VIEWER_ID, decode_codec, decode_input, decode_welcome, encode_codec,
+                      encode_input, encode_snapshot_body, encode_snapshot_header, encode_welcome, unpack_world)
+
+# Spectator relay
+#
+# Every spectator connected to the game server holds a player slot and
+# costs the server an encode and a send per snapshot. A relay takes them
+# off the server: it subscribes once, on the server's --relay-port, to the
+# full snapshot stream (the server sends it what a spectator gets, without
+# a player), unpacks each snapshot back into the packed world it was
+# encoded from and encodes it again for its own viewers, as a delta against
+# what each one acked, the way broadcast_snapshot does. However many people
+# watch, the server pays for one spectator. A relay can also take its
+# stream from another relay's viewer port, so relays fan out as a tree.
+#
+# Viewers are plain client.py instances. Their welcome carries VIEWER_ID
+# and no UDP port, their snapshots are flagged spectator, and what they
+# send is only read for acks. With --delay every world is held back that
+# long before viewers get it, like a broadcast delay; the relay still acks
+# the server right away, so its deltas stay small.
+
+VIEWER_PORT = 5560
+VIEWER_TIMEOUT = 10  # Seconds without a message before a viewer is dropped
+SHUTDOWN_TIMEOUT = 1  # Seconds viewers get to see their connection close once the server is gone
+
+log = AsyncLog()
+
+
+def remember(ring, world):
+    """Keep world as a delta baseline, forgetting the oldest beyond SNAPSHOT_HISTORY"""
+    ring[world["tick"]] = world
+    while len(ring) > SNAPSHOT_HISTORY:
+        ring.popitem(last=False)
+
+
+class Viewer:
+    """One spectator client of the relay"""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.ack = 0  # Newest tick the viewer applied, its delta baseline
+        self.compressed = False  # Set once the viewer asked for compressed snapshots
+
+
+class Relay:
+    """Unpacks the upstream snapshots and fans them out to every viewer"""
+
+    def __init__(self, tick_rate, codec=None):
+        self.tick_rate = tick_rate  # The server's, told to viewers for their interpolation
+        self.codec = codec  # SnapshotCodec offered to viewers, None for plain snapshots only
+        self.received = OrderedDict()  # {tick: packed world}, upstream delta baselines
+        self.published = OrderedDict()  # {tick: packed world}, viewer delta baselines
+        self.viewers = set()
+
+    def receive(self, payload):
+        """Unpack an upstream snapshot payload, None if its baseline is gone"""
+        world = unpack_world(payload, self.received)
+        if world is not None:
+            remember(self.received, world)
+        return world
+
+    def publish(self, world):
+        """Queue world for every viewer, encoding each distinct delta only once"""
+        remember(self.published, world)
+        bodies = {}  # {(baseline tick, compressed): body}
+        for viewer in self.viewers:
+            baseline = self.published.get(viewer.ack) if viewer.ack < world["tick"] else None
+            key = (baseline["tick"] if baseline else 0, viewer.compressed)
+            body = bodies.get(key)
+            if body is None:
+                body = encode_snapshot_body(world, baseline)
+                if viewer.compressed:
+                    body = self.codec.compress(body)
+                bodies[key] = body
+            header = encode_snapshot_header(len(body), VIEWER_ID, True, compressed=viewer.compressed)
+            viewer.outbox.send([header, body])
+
+
+async def serve_viewer(relay, reader, writer):
+    peer = writer.get_extra_info("peername")
+    writer.write(encode_welcome(VIEWER_ID, 0, 0, relay.tick_rate, relay.codec.id if relay.codec else 0))
+    viewer = Viewer(AsyncOutbox(writer))
+    relay.viewers.add(viewer)
+    log(f"[RELAY] Viewer {peer} connected, {len(relay.viewers)} watching")
+    decoder = FrameDecoder()
+    try:
+        while True:
+            data = await asyncio.wait_for(reader.read(4096), VIEWER_TIMEOUT)
+            if not data:
+                break
+            for msg_type, payload in decoder.feed(data):
+                if msg_type == MSG_INPUT:
+                    viewer.ack = decode_input(payload)["ack"]
+                elif msg_type == MSG_CODEC and relay.codec is not None and decode_codec(payload) == relay.codec.id:
+                    viewer.compressed = True
+    except (ConnectionResetError, ConnectionAbortedError):
+        pass
+    except asyncio.TimeoutError:
+        log(f"[RELAY] Viewer {peer} timed out")
+    except (ConnectionError, ProtocolError, ValueError) as e:  # struct.error is a ValueError
+        log(f"[RELAY] Error with viewer {peer}: {e}")
+    relay.viewers.discard(viewer)
+    viewer.outbox.close()
+    log(f"[RELAY] Viewer {peer} disconnected, {len(relay.viewers)} watching")
+
+
+async def subscribe(host, port, compress=True):
+    """Connect to the server's relay port and wait for the welcome.
+
+    Returns (reader, writer, decoder, tick rate, SnapshotCodec or None).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    decoder = FrameDecoder()
+    while True:
+        data = await reader.read(4096)
+        if not data:
+            raise ConnectionError("server closed connection")
+        for msg_type, payload in decoder.feed(data):
+            if msg_type == MSG_WELCOME:
+                _, _, _, tick_rate, offered_dictionary = decode_welcome(payload)
+                codec = None
+                if offered_dictionary and compress:
+                    dictionary = load_dictionary()
+                    if dictionary_id(dictionary) == offered_dictionary:
+                        codec = SnapshotCodec(dictionary)
+                        writer.write(encode_codec(codec.id))
+                return reader, writer, decoder, tick_rate, codec
+
+
+async def follow(relay, reader, writer, decoder, codec, delay):
+    """Publish every upstream snapshot, delay seconds after it arrived, until the server goes away"""
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            return
+        for msg_type, payload in decoder.feed(data):
+            if msg_type == MSG_SNAPSHOT_Z and codec is not None:
+                payload = codec.expand(payload)
+            elif msg_type != MSG_SNAPSHOT:
+                continue
+            world = relay.receive(payload)
+            if world is None:
+                continue  # The server sends a full snapshot once our ack ages out
+            writer.write(encode_input({"ack": world["tick"]}))
+            if delay > 0:
+                loop.call_later(delay, relay.publish, world)
+            else:
+                relay.publish(world)
+
+
+async def run(args):
+    reader, writer, decoder, tick_rate, upstream_codec = await subscribe(
+        args.server_host, args.server_port, not args.no_compress)
+    log(f"[RELAY] Subscribed to {args.server_host}:{args.server_port}"
+        + (" with compressed snapshots" if upstream_codec else ""))
+    viewer_codec = SnapshotCodec(load_dictionary(), args.compress) if args.compress else None
+    relay = Relay(tick_rate, viewer_codec)
+    viewers = await asyncio.start_server(lambda r, w: serve_viewer(relay, r, w), "0.0.0.0", args.port,
+                                         reuse_address=True)
+    log(f"[RELAY] Viewers connect on port {args.port}"
+        + (f", {args.delay:g} s behind the match" if args.delay > 0 else ""))
+    async with viewers:
+        try:
+            await follow(relay, reader, writer, decoder, upstream_codec, args.delay)
+        except (ConnectionError, ProtocolError) as e:
+            log(f"[RELAY] Lost the server: {e}")
+        else:
+            log("[RELAY] Server closed connection")
+        for viewer in list(relay.viewers):
+            viewer.outbox.close()
+        # Their tasks end once they read the close
+        deadline = asyncio.get_running_loop().time() + SHUTDOWN_TIMEOUT
+        while relay.viewers and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shooter LAN - Arena spectator relay")
+    parser.add_argument("--server-host", default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, required=True,
+                        help="the server's --relay-port, or the --port of another relay")
+    parser.add_argument("--port", type=int, default=VIEWER_PORT, help="port spectator clients connect to")
+    parser.add_argument("--delay", type=float, default=0.0, metavar="SECONDS",
+                        help="hold every snapshot back this long before viewers get it")
+    parser.add_argument("--compress", type=int, nargs="?", const=DEFAULT_LEVEL, default=0, metavar="LEVEL",
+                        help=f"offer viewers zlib compressed snapshots with the shipped dictionary "
+                             f"(level 1-9, default {DEFAULT_LEVEL})")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="ask the server for plain snapshots even if it offers compressed ones")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        log("\n[RELAY] Closing relay...")
+    except OSError as e:
+        log(f"[RELAY] Cannot reach the server: {e}")
+    finally:
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
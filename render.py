@@ -0,0 +1,164 @@
+import time
+from collections import OrderedDict, deque
+
+import pygame
+
+from pickups import TYPES_BY_CODE
+from rules import MAP_WIDTH, MAP_HEIGHT, PLAYER_SIZE
+
+# Client render cache
+#
+# Everything that looks the same from one frame to the next is drawn once
+# and then only blitted: the map grid on one map sized surface, the grid
+# coordinates on two strips that slide along the screen edges, text by
+# (font, string, color), and the player, bullet and pickup sprites. The
+# minimap and spectator overlay surfaces are allocated once and reused.
+# Needs pygame.display.set_mode() to have been called.
+
+GRID_STEP = 100
+LABEL_STEP = 200
+BACKGROUND = (40, 40, 40)
+BULLET_RADIUS = 4
+PICKUP_RADIUS = 15
+
+
+class TextCache:
+    """Rendered text surfaces by (string, color), least recently used evicted first"""
+
+    def __init__(self, font, max_size=256):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = self.font.render(text, True, color)
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+class RenderCache:
+    """Pre-rendered map, sprites and reusable surfaces for one window"""
+
+    def __init__(self, label_font, view_size, minimap_size):
+        self.map = self._map_surface()
+        self.x_labels, self.y_labels = self._label_strips(label_font)
+        self.bullet = self._bullet_sprite()
+        # Pickups pulse by up to 4 px of glow, one sprite per step and type
+        self.pickups = {code: [self._pickup_sprite(kind.color, glow) for glow in range(5)]
+                        for code, kind in TYPES_BY_CODE.items()}
+        self.players = {}  # {(color, outlined): sprite}
+        self.minimap = pygame.Surface(minimap_size, pygame.SRCALPHA)
+        self.overlay = pygame.Surface(view_size, pygame.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 100))
+
+    @staticmethod
+    def _map_surface():
+        surface = pygame.Surface((MAP_WIDTH, MAP_HEIGHT)).convert()
+        surface.fill(BACKGROUND)
+        for gx in range(0, MAP_WIDTH, GRID_STEP):
+            color = (60, 60, 60) if (gx // GRID_STEP) % 2 == 0 else (50, 50, 50)
+            pygame.draw.line(surface, color, (gx, 0), (gx, MAP_HEIGHT))
+        for gy in range(0, MAP_HEIGHT, GRID_STEP):
+            color = (60, 60, 60) if (gy // GRID_STEP) % 2 == 0 else (50, 50, 50)
+            pygame.draw.line(surface, color, (0, gy), (MAP_WIDTH, gy))
+        return surface
+
+    @staticmethod
+    def _label_strips(font):
+        """Map coordinate labels along x and along y, on transparent strips"""
+        height = font.get_linesize()
+        x_strip = pygame.Surface((MAP_WIDTH + 50, height), pygame.SRCALPHA)
+        for gx in range(0, MAP_WIDTH, LABEL_STEP):
+            x_strip.blit(font.render(str(gx), True, (150, 150, 150)), (gx, 0))
+        y_strip = pygame.Surface((50, MAP_HEIGHT + height), pygame.SRCALPHA)
+        for gy in range(0, MAP_HEIGHT, LABEL_STEP):
+            y_strip.blit(font.render(str(gy), True, (150, 150, 150)), (0, gy))
+        return x_strip.convert_alpha(), y_strip.convert_alpha()
+
+    @staticmethod
+    def _bullet_sprite():
+        size = BULLET_RADIUS * 2
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, (255, 255, 100), (BULLET_RADIUS, BULLET_RADIUS), BULLET_RADIUS)
+        pygame.draw.circle(sprite, (255, 255, 255), (BULLET_RADIUS, BULLET_RADIUS), 2)
+        return sprite.convert_alpha()
+
+    @staticmethod
+    def _pickup_sprite(color, glow):
+        # Circle in the type's color with white cross, and a glow around it
+        radius = PICKUP_RADIUS + glow
+        sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+        c = radius
+        pygame.draw.circle(sprite, color, (c, c), radius)
+        pygame.draw.circle(sprite, [channel * 4 // 5 for channel in color], (c, c), 12)
+        pygame.draw.line(sprite, (255, 255, 255), (c - 5, c), (c + 5, c), 2)
+        pygame.draw.line(sprite, (255, 255, 255), (c, c - 5), (c, c + 5), 2)
+        return sprite.convert_alpha()
+
+    def player(self, color, outlined=False):
+        """A player's square, with the white outline of the local player if outlined"""
+        key = (tuple(color), outlined)
+        sprite = self.players.get(key)
+        if sprite is None:
+            if outlined:
+                sprite = pygame.Surface((PLAYER_SIZE + 4, PLAYER_SIZE + 4)).convert()
+                sprite.fill((255, 255, 255))
+                sprite.fill(color, (2, 2, PLAYER_SIZE, PLAYER_SIZE))
+            else:
+                sprite = pygame.Surface((PLAYER_SIZE, PLAYER_SIZE)).convert()
+                sprite.fill(color)
+            self.players[key] = sprite
+        return sprite
+
+    def pickup(self, pulse, kind=0):
+        """Sprite of a pickup type code for a pulse of 2 to 8 px"""
+        sprites = self.pickups.get(kind) or self.pickups[0]
+        return sprites[max(0, min(pulse // 2, len(sprites) - 1))]
+
+    def draw_map(self, win, cam_x, cam_y):
+        """Background, grid and coordinate labels for the camera at (cam_x, cam_y)"""
+        width, height = win.get_size()
+        cam_x, cam_y = int(cam_x), int(cam_y)
+        win.blit(self.map, (0, 0), (cam_x, cam_y, width, height))
+        win.blit(self.x_labels, (0, 5), (cam_x, 0, width, self.x_labels.get_height()))
+        win.blit(self.y_labels, (5, 0), (0, cam_y, self.y_labels.get_width(), height))
+
+
+class FrameTimer:
+    """Per phase frame times, averaged over the last frames"""
+
+    def __init__(self, frames=60, refresh=0.5):
+        self.samples = {}  # {phase: deque of seconds}
+        self.frames = frames
+        self.refresh = refresh  # Seconds between updates of the shown numbers
+        self.shown = []
+        self.last_refresh = 0.0
+        self.mark_time = time.perf_counter()
+
+    def start(self):
+        self.mark_time = time.perf_counter()
+
+    def mark(self, phase):
+        """Close the phase running since the previous mark"""
+        now = time.perf_counter()
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.frames)
+        samples.append(now - self.mark_time)
+        self.mark_time = now
+
+    def lines(self):
+        """Text lines for the overlay, refreshed a few times a second so they stay readable"""
+        now = time.perf_counter()
+        if now - self.last_refresh >= self.refresh:
+            self.last_refresh = now
+            means = {phase: sum(s) / len(s) * 1000 for phase, s in self.samples.items() if s}
+            self.shown = [f"{phase:8s}{ms:6.2f} ms" for phase, ms in means.items()]
+            self.shown.append(f"{'total':8s}{sum(means.values()):6.2f} ms")
+        return self.shown
@@ -0,0 +1,120 @@
+import argparse
+import cProfile
+import pstats
+import time
+
+import server
+from bullets import make_bullet_pool
+from history import PositionHistory
+from pickups import PickupManager
+from protocol import unpack_input
+from recording import (RecordingReader, RecordingError, REC_TICK, REC_JOIN, REC_LEAVE, REC_INPUT, REC_RTT,
+                       REC_CHECKSUM, REC_INTERP)
+
+# Headless match replay
+#
+# Feeds a recording (see recording.py) back through the server's own
+# simulation code, as fast as it goes: joins, leaves, inputs and round trip
+# samples are applied in their recorded order and every tick marker runs
+# simulate_tick. Nothing touches the network or the wall clock, so the
+# match plays out exactly as it did live and every stored world checksum
+# must match. Doubles as a repeatable workload for profiling the simulation.
+
+
+class ReplayResult:
+    """What a replay did and whether it matched the recording"""
+
+    def __init__(self):
+        self.ticks = 0
+        self.records = 0
+        self.seconds = 0.0  # Wall time spent replaying
+        self.checksums = 0
+        self.mismatches = 0
+        self.first_mismatch = None  # Tick of the first checksum that differed
+
+    @property
+    def match_seconds(self):
+        return self.ticks / server.TICK_RATE
+
+
+def replay(path, verify=True):
+    """Re-simulate the match in path in this process, returns a ReplayResult"""
+    reader = RecordingReader(path)
+    server.TICK_RATE = reader.tick_rate
+    server.history = PositionHistory(reader.history_capacity)
+    server.bullet_pool = make_bullet_pool(reader.backend)
+    server.rng.seed(reader.seed)
+    server.pickups = PickupManager(server.rng, reader.pickup_spawn, reader.pickup_mix, reader.pickups_per_player)
+    server.recorder = None
+
+    result = ReplayResult()
+    start = time.perf_counter()
+    for rec_type, values in reader:
+        result.records += 1
+        if rec_type == REC_TICK:
+            server.simulate_tick(values[0])
+            result.ticks += 1
+        elif rec_type == REC_INPUT:
+            server.handle_input(values[0], unpack_input(values[1]))
+        elif rec_type == REC_RTT:
+            server.update_rtt(*values)
+        elif rec_type == REC_INTERP:
+            server.set_interp_delay(*values)
+        elif rec_type == REC_JOIN:
+            server.add_player(values[0])
+        elif rec_type == REC_LEAVE:
+            server.remove_player(values[0])
+        elif rec_type == REC_CHECKSUM and verify:
+            tick, checksum = values
+            result.checksums += 1
+            if server.world_checksum() != checksum:
+                result.mismatches += 1
+                if result.first_mismatch is None:
+                    result.first_mismatch = tick
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shooter LAN - Arena match replay")
+    parser.add_argument("recording", help="file written by server.py --record")
+    parser.add_argument("--no-verify", action="store_true", help="skip the world checksums")
+    parser.add_argument("--profile", type=int, nargs="?", const=25, default=0, metavar="N",
+                        help="profile the replay and print the N most expensive functions (default 25)")
+    parser.add_argument("--verbose", action="store_true", help="show the server's messages")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        server.log.enabled = False
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        result = replay(args.recording, not args.no_verify)
+    except RecordingError as e:
+        print(f"[REPLAY] {e}")
+        raise SystemExit(1)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+    speed = result.match_seconds / result.seconds if result.seconds else 0
+    print(f"[REPLAY] {result.ticks} ticks ({result.match_seconds:.1f} s of play, {result.records} records) "
+          f"in {result.seconds:.2f} s, {speed:.1f}x real time, "
+          f"{result.seconds / max(1, result.ticks) * 1000:.3f} ms per tick")
+    if not args.no_verify:
+        if result.mismatches:
+            print(f"[REPLAY] DESYNC: {result.mismatches}/{result.checksums} checksums differ, "
+                  f"first at tick {result.first_mismatch}")
+        else:
+            print(f"[REPLAY] All {result.checksums} checksums match")
+    server.log.close()
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.profile)
+    if result.mismatches:
+        raise SystemExit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Game constants and movement rules shared by the server and the client
+#
+# The client predicts its own player with exactly the same function the
+# server uses, so a prediction only drifts from the authoritative position
+# when inputs are applied for a different length of time on each side.
+# Nothing here may import pygame or the server: the client imports this
+# module at startup.
+
+MAP_WIDTH, MAP_HEIGHT = 2000, 2000
+VIEW_WIDTH, VIEW_HEIGHT = 800, 600  # Client window, the camera follows the player
+PLAYER_SIZE = 40
+PLAYER_SPEED = 300   # Pixels per second
+SPRINT_SPEED = 420
+BULLET_SPEED = 720   # Pixels per second
+BULLET_LIFETIME = 5  # Seconds
+
+
+def camera(x, y):
+    """Top left corner of the view of a client following a player at (x, y)"""
+    return (max(0, min(x - VIEW_WIDTH//2, MAP_WIDTH - VIEW_WIDTH)),
+            max(0, min(y - VIEW_HEIGHT//2, MAP_HEIGHT - VIEW_HEIGHT)))
+
+
+def move(x, y, move_x, move_y, sprint, dt):
+    """Position after moving for dt seconds in direction (move_x, move_y), kept on the map"""
+    speed = (SPRINT_SPEED if sprint else PLAYER_SPEED) * dt
+    return (max(0, min(x + move_x * speed, MAP_WIDTH - PLAYER_SIZE)),
+            max(0, min(y + move_y * speed, MAP_HEIGHT - PLAYER_SIZE)))
@@ -0,0 +1,57 @@
+import time
+
+# Fixed timestep scheduling
+#
+# Real time is added to an accumulator and the simulation runs one fixed
+# step per 1/tick_rate seconds in it, so the game speed does not depend on
+# how long each tick or sleep really took. After a stall at most
+# max_catch_up ticks run back to back; anything beyond that is dropped
+# instead of spiralling. Snapshots have their own rate and are sent at most
+# once per batch of ticks.
+
+
+class TickScheduler:
+    """Fixed timestep with an accumulator, catch-up limit and snapshot rate"""
+
+    def __init__(self, tick_rate=60, send_rate=30, max_catch_up=5, timings=None, clock=time.perf_counter):
+        self.tick_rate = tick_rate
+        self.send_rate = min(send_rate, tick_rate)
+        self.dt = 1 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.timings = timings  # Optional TickTimings for catch-up counters
+        self.clock = clock
+        self.tick = 0
+        self.accumulator = 0.0
+        self.last_time = clock()
+
+    def start(self):
+        """Start counting real time from now"""
+        self.accumulator = 0.0
+        self.last_time = self.clock()
+
+    def sleep_time(self):
+        """Seconds until the next tick is due"""
+        return max(0.0, self.dt - self.accumulator - (self.clock() - self.last_time))
+
+    def due_ticks(self):
+        """Tick numbers to simulate now, oldest first"""
+        now = self.clock()
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        count = int(self.accumulator / self.dt)
+        self.accumulator -= count * self.dt
+        if count > self.max_catch_up:
+            if self.timings is not None:
+                self.timings.skipped_ticks += count - self.max_catch_up
+            count = self.max_catch_up
+        if count > 1 and self.timings is not None:
+            self.timings.catch_ups += 1  # We fell behind by at least a whole tick
+
+        first = self.tick + 1
+        self.tick += count
+        return range(first, self.tick + 1)
+
+    def snapshot_due(self, tick):
+        """Whether a snapshot is due at this tick, for send_rate snapshots per second"""
+        return (tick * self.send_rate) // self.tick_rate != ((tick - 1) * self.send_rate) // self.tick_rate
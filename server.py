@@ -1,20 +1,77 @@
+import argparse
+import asyncio
+import itertools
 import socket
 import threading
-import pickle
 import math
 import time
 import random
-
-players = {}   # {id: {...}}
-id_count = 0
-inputs = {}      # {id: {"move": [dx,dy], "shoot": [mx,my]}}
-conns = {}  # {id: conn}
-health_pickups = []  # List of health pickups on the map : [{"x": x, "y": y, "id": unique_id}, ...]
-health_pickup_id = 0  # Unique ID for each health pickup
-MAP_WIDTH, MAP_HEIGHT = 2000, 2000
-WIDTH, HEIGHT = 800, 600
-FPS = 60
-lock = threading.Lock()
+import struct
+import zlib
+from collections import OrderedDict
+
+from netsim import NetSim
+from bullets import make_bullet_pool
+from rules import MAP_WIDTH, MAP_HEIGHT, camera, move
+from history import PositionHistory
+from smoothing import INTERP_DELAY
+from entities import Player, InputState, IDLE_INPUT, MAX_HEALTH
+from scheduler import TickScheduler
+from pickups import PICKUP_TYPES, SPAWN_RULES, TYPES_BY_CODE, PickupManager, parse_mix
+from telemetry import TickTimings, Counter, Histogram, SIZE_BUCKETS, prometheus_metric, prometheus_histogram
+from logs import AsyncLog
+from monitor import start_monitor
+from recording import (MatchRecorder, REC_TICK, REC_JOIN, REC_LEAVE, REC_INPUT, REC_RTT, REC_CHECKSUM,
+                       REC_INTERP)
+from outbound import Outbox, AsyncOutbox, DatagramOutbox, SendLoop
+from mailbox import Mailbox
+from compression import DEFAULT_LEVEL, SnapshotCodec, load_dictionary
+from protocol import (DEFAULT_PORT, FrameDecoder, ProtocolError, MSG_INPUT, MSG_INPUTS, MSG_CODEC, MSG_INTERP,
+                      SNAPSHOT_HISTORY, encode_welcome, decode_input, decode_codec, decode_interp, decode_datagram,
+                      decode_inputs, pack_input, pack_world, encode_snapshot_body, encode_snapshot_header)
+
+players = {}   # {id: Player}
+player_ids = itertools.count(1)  # Ids of new connections, next() is atomic: two threads accept
+inputs = {}      # {id: InputState}
+conns = {}  # {id: Outbox}
+relays = {}  # {id: Outbox} of the spectator relays taking every snapshot, see relay.py
+mailboxes = {}  # {id: Mailbox}, added and closed by the readers, joined and removed by the game loop
+acks = {}  # {id: last snapshot tick the client applied}
+input_seqs = {}  # {id: seq of the last input applied}, echoed in snapshots for client prediction
+udp_sock = None  # UDP socket (or transport) when the UDP transport is enabled
+udp_port = 0  # Port the welcome tells clients to send UDP inputs to, 0 without UDP
+codec = None  # SnapshotCodec offered to clients with --compress, see compression.py
+snapshot_ring = OrderedDict()  # {tick: packed world}, recent snapshots used as delta baselines
+snapshot_times = OrderedDict()  # {tick: time it was sent}, to measure round trips from acks
+rtts = {}  # {id: smoothed round trip time in seconds}
+interp_delays = {}  # {id: seconds the client draws other players behind its newest snapshot}
+bullet_pool = make_bullet_pool()  # Every bullet in flight, see bullets.py
+TICK_RATE = 60  # Simulation ticks per second
+SEND_RATE = 30  # Snapshots per second
+SHOT_COOLDOWN = 0.2  # Seconds
+REGEN_INTERVAL = 2  # Seconds between health regeneration steps
+MAX_REWIND = 0.25  # Seconds hit detection may rewind for lag compensation, 0 turns it off
+RTT_SMOOTHING = 0.125  # Weight of a new round trip sample, as TCP's SRTT
+log = AsyncLog()  # Prints from a background thread, see logs.py
+bytes_received = Counter()  # Every byte read from clients, TCP and UDP
+bytes_sent_retired = 0  # Bytes sent by outboxes that are gone, game loop only
+departures = Counter()  # Connections closed so far, an arena reports it to the router (see arenas.py)
+snapshot_sizes = Histogram(SIZE_BUCKETS)  # Bytes of each snapshot frame queued, game loop only
+input_delays = Histogram()  # Seconds from an input's arrival to the tick applying it, game loop only
+inputs_throttled = 0  # Inputs dropped by the per-client rate limit or a full queue, game loop only
+throttled_clients = set()  # Player ids throttled since their last snapshot, game loop only
+INPUT_RATE_SLACK = 1.25  # Inputs per tick a client may send on average before the rate limit drops some
+CLIENT_TIMEOUT = 10  # Seconds without input before a client is dropped
+send_loop = SendLoop()  # Drains every client's Outbox on its own thread
+game_thread = None  # Thread running game_loop in the threaded server
+stopping = threading.Event()  # Set to end the threaded game loop after its current tick
+tick_timings = TickTimings()  # Per phase tick time histograms, see tick_stats()
+scheduler = TickScheduler(TICK_RATE, SEND_RATE, timings=tick_timings)
+history = PositionHistory(round(MAX_REWIND * TICK_RATE) + 1)  # Positions bullets are tested against
+rng = random.Random()  # Every random choice of the simulation, seeded for recordings and benchmarks
+pickups = PickupManager(rng)  # Pickups on the map, see pickups.py
+recorder = None  # MatchRecorder while --record is on, see recording.py
+CHECKSUM_INTERVAL = 1  # Seconds between world checksums in a recording
 
 # Available player colors
 PLAYER_COLORS = [
@@ -30,275 +87,781 @@ PLAYER_COLORS = [
 
 def get_spawn_position():
     """Generate a random spawn position on the map"""
-    return random.randint(50, MAP_WIDTH-50), random.randint(50, MAP_HEIGHT-50)
+    return rng.randint(50, MAP_WIDTH-50), rng.randint(50, MAP_HEIGHT-50)
 
 def get_player_color():
     """Assign a random color to the player"""
-    return random.choice(PLAYER_COLORS)
-
-def spawn_health_pickup():
-    """Generate a new health pickup at a random position"""
-    global health_pickup_id
-    health_pickup_id += 1
-    return {
-        "x": random.randint(30, MAP_WIDTH-30),
-        "y": random.randint(30, MAP_HEIGHT-30),
-        "id": health_pickup_id
-    }
-
-def maintain_health_pickups():
-    """Maintain the number of health pickups equal to the number of players"""
-    global health_pickups
-    current_players = len([p for p in players.values() if not p.get("spectator", False)])
-    target_pickups = max(1, current_players)  # Min 1 health pickup
-
-    # Add health pickups if needed
-    while len(health_pickups) < target_pickups:
-        health_pickups.append(spawn_health_pickup())
-
-    # Remove excess health pickups
-    while len(health_pickups) > target_pickups:
-        health_pickups.pop()
-
-def manage_client(conn, player_id):
-    global players, inputs, conns
+    return rng.choice(PLAYER_COLORS)
+
+def add_player(player_id):
+    """Create a new player at a random spawn point"""
+    if recorder is not None:
+        recorder.write(REC_JOIN, player_id)
+    spawn_x, spawn_y = get_spawn_position()
+    players[player_id] = Player(spawn_x, spawn_y, get_player_color(), last_shot=-SHOT_COOLDOWN)
+    pickups.alive_changed(1, players)
+
+def handle_input(player_id, input_data, arrived=None):
+    """Store the latest input of a player and apply respawn requests"""
+    if recorder is not None:
+        recorder.write(REC_INPUT, player_id, pack_input(input_data))
+    inp = inputs[player_id] = InputState.from_dict(input_data)
+    if inp.ack > acks.get(player_id, 0) and inp.ack in snapshot_times:
+        update_rtt(player_id, (arrived or time.perf_counter()) - snapshot_times[inp.ack])
+    acks[player_id] = inp.ack
+    input_seqs[player_id] = inp.seq
+    # Verify if player wants to respawn
+    if inp.respawn and players[player_id].spectator:
+        # Respawn player
+        x, y = get_spawn_position()
+        players[player_id].respawn(x, y)
+        bullet_pool.clear_owner(player_id)
+        pickups.alive_changed(1, players)
+        log(f"[SERVER] Player {player_id} respawned at ({x}, {y})", "respawn")
+
+def update_rtt(player_id, sample):
+    """Fold a round trip sample (snapshot sent -> its first ack received) into the estimate"""
+    if recorder is not None:
+        recorder.write(REC_RTT, player_id, sample)
+    rtt = rtts.get(player_id)
+    rtts[player_id] = sample if rtt is None else rtt + (sample - rtt) * RTT_SMOOTHING
+
+def rewind_ticks(player_id):
+    """How many ticks behind the server this player's screen is, up to the rewind cap.
+
+    The client shows other players as they were a round trip plus its
+    interpolation delay ago, INTERP_DELAY until it tells us its own.
+    """
+    rtt = rtts.get(player_id)
+    if rtt is None:
+        return 0
+    return min(history.capacity - 1, round((rtt + interp_delays.get(player_id, INTERP_DELAY)) * TICK_RATE))
+
+def set_interp_delay(player_id, delay):
+    """Rewind this player's shots by the interpolation delay its client reported"""
+    if recorder is not None:
+        recorder.write(REC_INTERP, player_id, delay)
+    interp_delays[player_id] = delay
+
+def remove_player(player_id):
+    """Forget everything about a player, returning its outbox if it had one"""
+    global bytes_sent_retired
+    if recorder is not None and player_id in players:
+        recorder.write(REC_LEAVE, player_id)
+    p = players.pop(player_id, None)
+    if p is not None and not p.spectator:
+        pickups.alive_changed(-1, players)
+    inputs.pop(player_id, None)
+    acks.pop(player_id, None)
+    input_seqs.pop(player_id, None)
+    rtts.pop(player_id, None)
+    interp_delays.pop(player_id, None)
+    history.remove(player_id)
+    bullet_pool.clear_owner(player_id)
+    outbox = conns.pop(player_id, None)
+    if outbox is not None:
+        bytes_sent_retired += outbox.bytes_sent
+    return outbox
+
+def remove_relay(relay_id):
+    """Forget a relay, returning its outbox"""
+    global bytes_sent_retired
+    acks.pop(relay_id, None)
+    outbox = relays.pop(relay_id)
+    bytes_sent_retired += outbox.bytes_sent
+    return outbox
+
+def handle_datagram(data, addr):
+    """Post a bundle of redundant inputs sent over UDP to the player's mailbox"""
+    bytes_received.add(len(data))
     try:
-        conn.send(pickle.dumps(player_id))  # Send player ID to client
-        print(f"[SERVER] Player {player_id} connected.")
-        with lock:
-            conns[player_id] = conn  # Save connection
+        msg_type, payload = decode_datagram(data)
+        if msg_type != MSG_INPUTS:
+            return
+        player_id, token, bundle = decode_inputs(payload)
+    except (ProtocolError, ValueError) as e:  # struct.error is a ValueError
+        log(f"[SERVER] Bad datagram from {addr}: {e}", "bad-datagram")
+        return
+    mailbox = mailboxes.get(player_id)
+    if mailbox is None or mailbox.token != token:
+        return
+    mailbox.last_seen = time.time()
+    mailbox.udp_addr = addr  # The game loop moves the player's snapshots to this address
+
+    # Post, oldest first, every input we have not seen yet; stale datagrams change nothing
+    for input_data in reversed(bundle):
+        if input_data["seq"] > mailbox.last_seq:
+            mailbox.post(input_data)
+            mailbox.last_seq = input_data["seq"]
+
+def udp_loop():
+    """Receive UDP input datagrams for the threaded server"""
+    while True:
+        try:
+            data, addr = udp_sock.recvfrom(65536)
+        except OSError:
+            continue  # e.g. ICMP port unreachable from a client that went away
+        handle_datagram(data, addr)
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    """Receive UDP input datagrams for the asyncio server"""
+
+    def datagram_received(self, data, addr):
+        handle_datagram(data, addr)
 
+def manage_client(conn, player_id, relay=False):
+    kind = "Relay" if relay else "Player"
+    mailbox = None
+    try:
+        token = random.getrandbits(32)
+        conn.sendall(encode_welcome(player_id, token, 0 if relay else udp_port, TICK_RATE,
+                                    codec.id if codec else 0))  # Send player ID to client
+        log(f"[SERVER] {kind} {player_id} connected.")
+        # A timeout also keeps the socket non-blocking underneath, which the Outbox handle relies on
+        conn.settimeout(CLIENT_TIMEOUT)
+        # The game loop adds the player on its next tick
+        mailbox = mailboxes[player_id] = Mailbox(Outbox(conn, send_loop), token, TICK_RATE * INPUT_RATE_SLACK,
+                                                 relay)
+
+        decoder = FrameDecoder()
         while True:
             try:
                 data = conn.recv(4096)
                 if not data:
                     break
-                input_data = pickle.loads(data)
-                with lock:
-                    inputs[player_id] = input_data
-                    # Verify if player wants to respawn
-                    if input_data.get("respawn", False) and players[player_id].get("spectator", False):
-                        # Respawn player
-                        x, y = get_spawn_position()
-                        players[player_id].update({
-                            "x": x, "y": y, "health": 100, "spectator": False, "bullets": []
-                        })
-                        print(f"[SERVER] Player {player_id} respawned at ({x}, {y})")
+                bytes_received.add(len(data))
+                for msg_type, payload in decoder.feed(data):
+                    if msg_type == MSG_INPUT:
+                        mailbox.post(decode_input(payload))
+                    elif msg_type == MSG_CODEC and codec is not None and decode_codec(payload) == codec.id:
+                        mailbox.compressed = True
+                    elif msg_type == MSG_INTERP:
+                        mailbox.interp_delay = decode_interp(payload)
             except (ConnectionResetError, ConnectionAbortedError):
                 break
+            except socket.timeout:
+                if time.time() - mailbox.last_seen < CLIENT_TIMEOUT:
+                    continue  # Inputs arrive over UDP, only the handshake connection is idle
+                log(f"[SERVER] {kind} {player_id} timed out.")
+                break
             except Exception as e:
-                print(f"[SERVER] Error processing {player_id} player data: {e}")
+                log(f"[SERVER] Error processing {player_id} player data: {e}")
                 break
     except Exception as e:
-        print(f"[SERVER] Initial error with player {player_id}: {e}")
-
-    # Clean up on disconnect
-    with lock:
-        if player_id in players:
-            del players[player_id]
-        if player_id in inputs:
-            del inputs[player_id]
-        if player_id in conns:
-            del conns[player_id]
-    print(f"[SERVER] Player {player_id} disconnected.")
+        log(f"[SERVER] Initial error with player {player_id}: {e}")
+
+    # Clean up on disconnect, the game loop removes the player on its next tick
+    if mailbox is not None:
+        mailbox.closed = True
+    if not relay:
+        departures.add()
+    log(f"[SERVER] {kind} {player_id} disconnected.")
     conn.close()
 
-def game_loop():
-    global players, inputs, conns, health_pickups
-    last_time = time.time()
-    tick_count = 0
+def apply_mailboxes():
+    """Join, update and remove players as their readers posted. Game loop only"""
+    global bytes_sent_retired, inputs_throttled
+    now = time.perf_counter()
+    for player_id, mailbox in list(mailboxes.items()):
+        if mailbox.closed:
+            del mailboxes[player_id]
+            if player_id in players:
+                outbox = remove_player(player_id)
+            elif player_id in relays:
+                outbox = remove_relay(player_id)
+            else:
+                outbox = mailbox.outbox  # Gone before its first tick
+            if outbox is not None:
+                outbox.close()
+            continue
+        if mailbox.relay:
+            # A relay has no player, its inputs only ack snapshots
+            relays[player_id] = mailbox.outbox
+            input_data, _ = mailbox.drain()
+            if input_data is not None:
+                acks[player_id] = input_data["ack"]
+            continue
+        if player_id not in players:
+            add_player(player_id)
+            conns[player_id] = mailbox.outbox
+
+        # The first valid datagram moves the player's snapshots from TCP to UDP
+        addr = mailbox.udp_addr
+        if addr is not None:
+            outbox = conns.get(player_id)
+            if not isinstance(outbox, DatagramOutbox) or outbox.addr != addr:
+                # Full and oversized snapshots still go over the TCP connection
+                conns[player_id] = DatagramOutbox(udp_sock, addr, mailbox.outbox)
+                if outbox is not None:
+                    if outbox is not mailbox.outbox:
+                        outbox.detach()
+                    bytes_sent_retired += outbox.bytes_sent
+                log(f"[SERVER] Player {player_id} switched to UDP from {addr}")
+
+        delay = mailbox.interp_delay
+        if delay is not None and interp_delays.get(player_id) != delay:
+            set_interp_delay(player_id, delay)
+
+        dropped = mailbox.take_throttled()
+        if dropped:
+            inputs_throttled += dropped
+            throttled_clients.add(player_id)
+        input_data, arrived = mailbox.drain()
+        if input_data is not None:
+            input_delays.observe(now - arrived)
+            handle_input(player_id, input_data, arrived)
+
+def net_stats():
+    """Per player send queue counters (queue depth, dropped frames, frames and bytes sent) and round trip"""
+    # The game loop owns these tables; list() copies one in a single step under the GIL
+    round_trips = dict(rtts)
+    return {pid: dict(outbox.stats(), rtt_ms=round_trips[pid] * 1000 if pid in round_trips else None)
+            for pid, outbox in list(conns.items())}
+
+def collect_snapshot(tick_count):
+    """Pack the world and list who gets it. Game loop only"""
+    world = pack_world(tick_count, players, pickups.snapshot(), bullet_pool.packed_by_owner())
+    snapshot_times[tick_count] = time.perf_counter()
+    while len(snapshot_times) > SNAPSHOT_HISTORY:
+        snapshot_times.popitem(last=False)
+    targets = [(pid, outbox, players[pid].spectator, acks.get(pid, 0), input_seqs.get(pid, 0),
+                input_status(pid), wants_compression(pid))
+               for pid, outbox in conns.items() if pid in players]
+    # Relays watch like spectators, however many viewers they serve
+    targets += [(rid, outbox, True, acks.get(rid, 0), 0, (0, False), wants_compression(rid))
+                for rid, outbox in relays.items()]
+    throttled_clients.clear()
+    return world, targets
+
+def input_status(player_id):
+    """(commands still queued, throttled since the last snapshot) for a client's snapshot header"""
+    mailbox = mailboxes.get(player_id)
+    return (mailbox.backlog() if mailbox is not None else 0), player_id in throttled_clients
+
+def wants_compression(player_id):
+    mailbox = mailboxes.get(player_id)
+    return codec is not None and mailbox is not None and mailbox.compressed
+
+def broadcast_snapshot(world, targets):
+    """Queue a packed world for every client, encoding each distinct delta only once.
+
+    targets is a list of (pid, outbox, spectator, acked tick, last input seq,
+    input status, compressed), input status being (input backlog,
+    throttled). Compressed bodies are shared the same way as plain ones.
+    """
+    tick = world["tick"]
+    snapshot_ring[tick] = world
+    while len(snapshot_ring) > SNAPSHOT_HISTORY:
+        snapshot_ring.popitem(last=False)
+
+    bodies = {}  # {baseline tick: body}, shared by every client with that baseline
+    compressed_bodies = {}  # {baseline tick: compressed body}
+    for pid, outbox, spectator, ack, input_seq, status, compressed in targets:
+        # Delta against the client's last acked tick, full snapshot on a new
+        # join or when that tick is no longer in the ring
+        baseline = snapshot_ring.get(ack)
+        key = baseline["tick"] if baseline else 0
+        body = bodies.get(key)
+        if body is None:
+            body = bodies[key] = encode_snapshot_body(world, baseline)
+        if compressed:
+            shared = compressed_bodies.get(key)
+            if shared is None:
+                shared = compressed_bodies[key] = codec.compress(body)
+            body = shared
+        # Never blocks: a slow client only loses its own stale snapshots
+        header = encode_snapshot_header(len(body), pid, spectator, input_seq, *status, compressed)
+        snapshot_sizes.observe(len(header) + len(body))
+        if baseline is None and isinstance(outbox, DatagramOutbox):
+            outbox.send_reliably([header, body])  # The client's next baseline, it must arrive
+        else:
+            outbox.send([header, body])
+
+def collect_pickup(pid, p):
+    """Give p the first pickup within reach, if any"""
+    collected = pickups.collect(p, players)
+    if collected is not None:
+        kind = TYPES_BY_CODE[collected.kind]
+        p.health = min(MAX_HEALTH, p.health + kind.heal)
+        log(f"[SERVER] Player {pid} picked {kind.name} up at ({collected.x}, {collected.y}) - Health: {p.health}",
+            "pickup")
+
+def every(seconds):
+    """Tick interval for something that happens every so many seconds"""
+    return max(1, round(seconds * TICK_RATE))
+
+def simulate_tick(tick_count):
+    """Advance the world by one tick. Game loop only"""
+    start = time.perf_counter()
+    now = tick_count / TICK_RATE  # Simulation time, wall clock hiccups do not change the game
+    if recorder is not None:
+        recorder.write(REC_TICK, tick_count)
+
+    # Process player movements and actions
+    for pid, p in players.items():
+        if p.spectator:
+            continue
+
+        inp = inputs.get(pid, IDLE_INPUT)
+
+        # Movement with variable speed, same rules as the client's prediction
+        p.x, p.y = move(p.x, p.y, inp.move_x, inp.move_y, inp.sprint, 1 / TICK_RATE)
+
+        # Verify pickup collisions
+        if p.health < MAX_HEALTH:  # Only if not full health
+            collect_pickup(pid, p)
+
+        # Shooting mechanics
+        shoot = inp.shoot
+
+        if shoot == "suicide":
+            p.health -= 10
+        elif shoot is not None and now - p.last_shot > SHOT_COOLDOWN:
+            mx, my = shoot
+            # The mouse position is relative to the shooter's view
+            cam_x, cam_y = camera(p.x, p.y)
+            target_x = mx + cam_x
+            target_y = my + cam_y
+
+            dx, dy = target_x - (p.x+20), target_y - (p.y+20)
+            dist = math.hypot(dx, dy)
+            if dist > 0:
+                dx, dy = dx/dist, dy/dist
+                bullet_pool.spawn(pid, p.x+20, p.y+20, dx, dy)
+                p.last_shot = now
+        # A command's shot or suicide happens once, only the held keys carry over until the next one
+        if shoot is not None or inp.respawn:
+            inputs[pid] = inp.held()
+
+    collide_start = time.perf_counter()
+    tick_timings.record("simulate", collide_start - start)
+
+    # Update bullets positions and check for collisions with other players,
+    # as each shooter saw them
+    if history.capacity > 1:
+        history.record(tick_count, players)
+        hits = bullet_pool.step(players, TICK_RATE, history, tick_count,
+                                {pid: rewind_ticks(pid) for pid in rtts})
+    else:
+        hits = bullet_pool.step(players, TICK_RATE)
+    for pid, oid in hits:
+        p, o = players[pid], players[oid]
+        o.health -= 15  # More damage
+        # Statistics
+        if o.health <= 0:
+            p.kills += 1
+            o.deaths += 1
+
+    # Spectator mode and health regeneration
+    regen = tick_count % every(REGEN_INTERVAL) == 0
+    for pid, p in players.items():
+        if not p.spectator:
+            if p.health <= 0:
+                p.spectator = True
+                p.death_time = now
+                pickups.alive_changed(-1, players)
+            elif p.health < MAX_HEALTH and regen:
+                p.health = min(MAX_HEALTH, p.health + 2)
+
+    tick_timings.record("collide", time.perf_counter() - collide_start)
+
+    if recorder is not None and tick_count % every(CHECKSUM_INTERVAL) == 0:
+        recorder.write(REC_CHECKSUM, tick_count, world_checksum())
+        recorder.flush()
+
+def world_checksum():
+    """CRC32 of the whole simulated world, to check a replay against its recording"""
+    crc = 0
+    for pid, p in players.items():
+        crc = zlib.crc32(struct.pack("!Iddh?IIdBBB", pid, p.x, p.y, p.health, p.spectator,
+                                     p.kills, p.deaths, p.last_shot, *p.color), crc)
+    for pickup in pickups.pickups.values():
+        crc = zlib.crc32(struct.pack("!IiiB", pickup.id, pickup.x, pickup.y, pickup.kind), crc)
+    for owner, packed in sorted(bullet_pool.packed_by_owner().items()):
+        crc = zlib.crc32(struct.pack("!I", owner) + packed, crc)
+    return crc
+
+def end_tick(start):
+    """Record how long a tick took and whether it blew its time budget"""
+    elapsed = time.perf_counter() - start
+    tick_timings.record("tick", elapsed)
+    tick_timings.ticks += 1
+    if elapsed > scheduler.dt:
+        tick_timings.overruns += 1
+
+def tick_stats():
+    """Tick counters and per phase (inputs, simulate, collide, broadcast, tick) timing summaries"""
+    return tick_timings.summary()
+
+def metrics_text():
+    """Every metric in the Prometheus text format, for the /metrics endpoint"""
+    # The game loop owns the tables; list() copies one in a single step under the GIL
+    outboxes = list(conns.items())
+    relay_outboxes = list(relays.values())
+    everyone = list(players.values())
+    round_trips = dict(rtts)
+    clients = {pid: (outbox.queue_depth, outbox.dropped_frames, round_trips.get(pid)) for pid, outbox in outboxes}
+    bytes_sent = (bytes_sent_retired + sum(outbox.bytes_sent for _, outbox in outboxes)
+                  + sum(outbox.bytes_sent for outbox in relay_outboxes))
+    alive = sum(not p.spectator for p in everyone)
+    spectators = len(everyone) - alive
+    bullets = len(bullet_pool)
+    timings = tick_stats()
+    lines = []
+    lines += prometheus_histogram("shooter_tick_phase_seconds", "Time spent in each phase of a tick",
+                                  [({"phase": name}, h) for name, h in tick_timings.phases.items()])
+    lines += prometheus_metric("shooter_ticks_total", "counter", "Ticks simulated", [(None, timings["ticks"])])
+    lines += prometheus_metric("shooter_tick_overruns_total", "counter", "Ticks that took longer than their budget",
+                               [(None, timings["overruns"])])
+    lines += prometheus_metric("shooter_tick_catch_ups_total", "counter", "Times several ticks ran back to back",
+                               [(None, timings["catch_ups"])])
+    lines += prometheus_metric("shooter_skipped_ticks_total", "counter", "Ticks dropped by the catch-up limit",
+                               [(None, timings["skipped_ticks"])])
+    lines += prometheus_histogram("shooter_input_delay_seconds",
+                                  "Time from an input's arrival to the tick that applies it",
+                                  [(None, input_delays)])
+    lines += prometheus_metric("shooter_inputs_throttled_total", "counter",
+                               "Inputs dropped because a client sent faster than the rate limit or its queue was full",
+                               [(None, inputs_throttled)])
+    lines += prometheus_metric("shooter_received_bytes_total", "counter", "Bytes received from clients",
+                               [(None, bytes_received.value)])
+    lines += prometheus_metric("shooter_sent_bytes_total", "counter", "Bytes sent to clients",
+                               [(None, bytes_sent)])
+    lines += prometheus_histogram("shooter_snapshot_bytes", "Size of each snapshot frame sent to a client",
+                                  [(None, snapshot_sizes)])
+    lines += prometheus_metric("shooter_players", "gauge", "Players in the match",
+                               [({"state": "alive"}, alive), ({"state": "spectator"}, spectators)])
+    lines += prometheus_metric("shooter_relays", "gauge", "Spectator relays subscribed to the snapshots",
+                               [(None, len(relay_outboxes))])
+    lines += prometheus_metric("shooter_bullets", "gauge", "Bullets in flight", [(None, bullets)])
+    lines += prometheus_metric("shooter_client_rtt_seconds", "gauge", "Smoothed round trip time per client",
+                               [({"player": pid}, rtt) for pid, (_, _, rtt) in clients.items() if rtt is not None])
+    lines += prometheus_metric("shooter_client_queue_depth", "gauge", "Frames waiting in each client's send queue",
+                               [({"player": pid}, depth) for pid, (depth, _, _) in clients.items()])
+    lines += prometheus_metric("shooter_client_dropped_frames_total", "counter",
+                               "Snapshots dropped because a client fell behind",
+                               [({"player": pid}, dropped) for pid, (_, dropped, _) in clients.items()])
+    return "\n".join(lines) + "\n"
+
+def timing_reporter(interval):
+    while True:
+        time.sleep(interval)
+        log(f"[SERVER] Tick timings: {tick_timings.report()}")
 
+def game_loop():
+    scheduler.start()
+    while not stopping.is_set():
+        time.sleep(scheduler.sleep_time())
+        run_ticks(scheduler.due_ticks())
+
+def run_ticks(ticks):
+    """Apply the clients' inputs, simulate and send the newest state. The world belongs to this thread"""
+    # After a stall only the newest state is worth sending
+    send = any(scheduler.snapshot_due(tick_count) for tick_count in ticks)
+
+    for tick_count in ticks:
+        start = time.perf_counter()
+        apply_mailboxes()
+        tick_timings.record("inputs", time.perf_counter() - start)
+        simulate_tick(tick_count)
+
+        # Send game state to all players
+        if send and tick_count == ticks[-1]:
+            broadcast_start = time.perf_counter()
+            broadcast_snapshot(*collect_snapshot(tick_count))
+            tick_timings.record("broadcast", time.perf_counter() - broadcast_start)
+        end_tick(start)
+
+async def async_game_loop():
+    """Same tick as game_loop, run as a task on the event loop instead of a thread"""
+    scheduler.start()
     while True:
-        now = time.time()
-        dt = now - last_time
-        if dt < 1/FPS:
-            time.sleep(1/FPS - dt)
-
-        last_time = now
-        tick_count += 1
-
-        with lock:
-            # Maintain correct number of health pickups every 60 ticks (1 second)
-            if tick_count % 60 == 0:
-                maintain_health_pickups()
-
-            # Process player movements and actions
-            for pid, p in players.items():
-                if p.get("spectator", False):
-                    continue
-
-                inp = inputs.get(pid, {})
-                move = inp.get("move", [0,0])
-
-                # Movement with variable speed
-                speed = 7 if inp.get("sprint", False) else 5
-                p["x"] += move[0] * speed
-                p["y"] += move[1] * speed
-                p["x"] = max(0, min(p["x"], MAP_WIDTH-40))
-                p["y"] = max(0, min(p["y"], MAP_HEIGHT-40))
-
-                # Verify heatlh pickup collisions
-                player_rect = (p["x"], p["y"], 40, 40)
-                for pickup in health_pickups[:]:  # Copy to avoid modification during iteration
-                    pickup_radius = 15
-                    # Distance between player center and health center
-                    dist = math.hypot((p["x"]+20) - pickup["x"], (p["y"]+20) - pickup["y"])
-                    if dist < pickup_radius + 20 and p["health"] < 100:  # Only if not full health
-                        # Pickup collected
-                        p["health"] = min(100, p["health"] + 10)
-                        health_pickups.remove(pickup)
-                        # Spawn a new health pickup
-                        health_pickups.append(spawn_health_pickup())
-                        print(f"[SERVER] Player {pid} picked health up at ({pickup['x']}, {pickup['y']}) - Health: {p['health']}")
-                        break
-
-                # Shooting mechanics
-                shoot = inp.get("shoot", None)
-                current_time = time.time()
-
-                if shoot == "suicide":
-                    p["health"] -= 10
-                elif isinstance(shoot, list) and current_time - p.get("last_shot", 0) > 0.2:  # 200ms cooldown
-                    mx, my = shoot
-                    # Calculate camera offset
-                    cam_x = max(0, min(p["x"] - WIDTH//2, MAP_WIDTH - WIDTH))
-                    cam_y = max(0, min(p["y"] - HEIGHT//2, MAP_HEIGHT - HEIGHT))
-                    target_x = mx + cam_x
-                    target_y = my + cam_y
-
-                    dx, dy = target_x - (p["x"]+20), target_y - (p["y"]+20)
-                    dist = math.hypot(dx, dy)
-                    if dist > 0:
-                        dx, dy = dx/dist, dy/dist
-                        p["bullets"].append({
-                            "x": p["x"]+20, "y": p["y"]+20,
-                            "dx": dx, "dy": dy,
-                            "owner": pid,
-                            "lifetime": 0
-                        })
-                        p["last_shot"] = current_time
-
-            # Update bullets positions and check for collisions
-            for pid, p in players.items():
-                if p.get("spectator", False):
-                    continue
-
-                new_bullets = []
-                for bullet in p["bullets"]:
-                    bullet["x"] += bullet["dx"] * 12  # Velocity increased
-                    bullet["y"] += bullet["dy"] * 12
-                    bullet["lifetime"] += 1
-
-                    # Delete bullets that go out of bounds or are too old
-                    if (0 < bullet["x"] < MAP_WIDTH and 0 < bullet["y"] < MAP_HEIGHT
-                        and bullet["lifetime"] < 300):  # 5 seconds at 60fps
-
-                        # Collision detection with other players
-                        hit = False
-                        for oid, o in players.items():
-                            if oid == pid or o.get("spectator", False):
-                                continue
-
-                            # Improved collision detection
-                            if (o["x"] <= bullet["x"] <= o["x"]+40 and
-                                o["y"] <= bullet["y"] <= o["y"]+40):
-                                o["health"] -= 15  # More damage
-                                hit = True
-                                # Statistics
-                                p["kills"] = p.get("kills", 0)
-                                if o["health"] <= 0:
-                                    p["kills"] = p.get("kills", 0) + 1
-                                    o["deaths"] = o.get("deaths", 0) + 1
-                                break
-
-                        if not hit:
-                            new_bullets.append(bullet)
-
-                p["bullets"] = new_bullets
-
-            # Spectator mode and health regeneration
-            for pid, p in players.items():
-                if not p.get("spectator", False):
-                    if p["health"] <= 0:
-                        p["spectator"] = True
-                        p["death_time"] = time.time()
-                    elif p["health"] < 100 and tick_count % 120 == 0:  # Regenerate every 2 seconds
-                        p["health"] = min(100, p["health"] + 2)
-
-            # Send game state to all players
-            if tick_count % 2 == 0:  # Reduce frequency to every 2 ticks (30 times per second)
-                connections_to_remove = []
-                for pid, conn in conns.items():
-                    if pid in players:
-                        state = {
-                            "players": players.copy(),
-                            "player_id": pid,
-                            "spectator": players[pid].get("spectator", False),
-                            "health_pickups": health_pickups.copy(),
-                            "tick": tick_count
-                        }
-                        try:
-                            data = pickle.dumps(state)
-                            conn.sendall(data)
-                        except (BrokenPipeError, ConnectionResetError):
-                            connections_to_remove.append(pid)
-                        except Exception as e:
-                            print(f"[SERVER] Error sendint to player {pid}: {e}")
-                            connections_to_remove.append(pid)
-
-                # Clean up disconnected players
-                for pid in connections_to_remove:
-                    if pid in conns:
-                        del conns[pid]
+        await asyncio.sleep(scheduler.sleep_time())
+        run_ticks(scheduler.due_ticks())
 
-def main():
-    global id_count, players
+async def async_manage_client(reader, writer, relay=False):
+    log(f"[NEW CONNECTION] {writer.get_extra_info('peername')}")
+    player_id = next(player_ids)
+    kind = "Relay" if relay else "Player"
+    mailbox = None
+
+    try:
+        token = random.getrandbits(32)
+        writer.write(encode_welcome(player_id, token, 0 if relay else udp_port, TICK_RATE,
+                                    codec.id if codec else 0))  # Send player ID to client
+        log(f"[SERVER] {kind} {player_id} connected.")
+        # The game loop adds the player on its next tick
+        mailbox = mailboxes[player_id] = Mailbox(AsyncOutbox(writer), token, TICK_RATE * INPUT_RATE_SLACK, relay)
+
+        decoder = FrameDecoder()
+        while True:
+            try:
+                data = await asyncio.wait_for(reader.read(4096), CLIENT_TIMEOUT)
+            except asyncio.TimeoutError:
+                if time.time() - mailbox.last_seen < CLIENT_TIMEOUT:
+                    continue  # Inputs arrive over UDP, only the handshake connection is idle
+                raise
+            if not data:
+                break
+            bytes_received.add(len(data))
+            for msg_type, payload in decoder.feed(data):
+                if msg_type == MSG_INPUT:
+                    mailbox.post(decode_input(payload))
+                elif msg_type == MSG_CODEC and codec is not None and decode_codec(payload) == codec.id:
+                    mailbox.compressed = True
+                elif msg_type == MSG_INTERP:
+                    mailbox.interp_delay = decode_interp(payload)
+    except (ConnectionResetError, ConnectionAbortedError):
+        pass
+    except asyncio.TimeoutError:
+        log(f"[SERVER] {kind} {player_id} timed out.")
+    except Exception as e:
+        log(f"[SERVER] Error processing {player_id} player data: {e}")
+
+    # Clean up on disconnect, the game loop removes the player on its next tick
+    if mailbox is not None:
+        mailbox.closed = True
+    if not relay:
+        departures.add()
+    writer.close()
+    log(f"[SERVER] {kind} {player_id} disconnected.")
+
+async def async_open_udp(port, netsim=None):
+    """Bind the UDP transport on the running event loop"""
+    global udp_sock, udp_port
+    loop = asyncio.get_running_loop()
+    udp_sock, _ = await loop.create_datagram_endpoint(UdpProtocol, local_addr=("0.0.0.0", port))
+    if netsim:
+        udp_sock = NetSim(udp_sock, call_later=loop.call_later, **netsim)
+    udp_port = port
+    log(f"[SERVER] UDP transport enabled on port {port}")
+
+async def async_open_relay_port(port):
+    """Accept spectator relays on their own port, on the running event loop"""
+    async def accept_relay(reader, writer):
+        await async_manage_client(reader, writer, relay=True)
+
+    relay_server = await asyncio.start_server(accept_relay, "0.0.0.0", port, reuse_address=True)
+    log(f"[SERVER] Accepting spectator relays on port {port}")
+    return relay_server
+
+async def async_main(port, udp=False, netsim=None, relay_port=0):
+    server = await asyncio.start_server(async_manage_client, "0.0.0.0", port, reuse_address=True)
+    log(f"[SERVER] Server starting in port {port} (asyncio)...")
+    if udp:
+        await async_open_udp(port, netsim)
+    if relay_port:
+        await async_open_relay_port(relay_port)
+    log("[SERVER] Waiting for players...")
+    async with server:
+        await asyncio.gather(server.serve_forever(), async_game_loop())
+
+def open_udp(port, netsim=None):
+    """Bind the UDP transport and start its receive thread"""
+    global udp_sock, udp_port
+    udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_sock.bind(("0.0.0.0", port))
+    if netsim:
+        udp_sock = NetSim(udp_sock, **netsim)
+    udp_port = port
+    threading.Thread(target=udp_loop, name="udp-recv", daemon=True).start()
+    log(f"[SERVER] UDP transport enabled on port {port}")
+
+def start_game_loop():
+    """Start the game loop and send pipeline in separate threads"""
+    global game_thread
+    send_loop.start()
+    game_thread = threading.Thread(target=game_loop, name="game-loop", daemon=True)
+    game_thread.start()
+
+def stop_game_loop(timeout=1):
+    """End the threaded game loop after its current tick"""
+    stopping.set()
+    if game_thread is not None:
+        game_thread.join(timeout)
+
+def accept_client(conn, addr, relay=False):
+    """Serve a new TCP connection on its own thread"""
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # As asyncio does by default
+    log(f"[NEW CONNECTION] {addr}")
+    player_id = next(player_ids)
+    threading.Thread(target=manage_client, args=(conn, player_id, relay), name=f"client-{player_id}").start()
+
+def relay_accept_loop(listener):
+    while True:
+        try:
+            accept_client(*listener.accept(), relay=True)
+        except OSError as e:
+            log(f"[SERVER] Error accepting a relay: {e}")
+
+def open_relay_port(port):
+    """Accept spectator relays on their own port, on a thread of their own"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("0.0.0.0", port))
+    listener.listen(10)
+    threading.Thread(target=relay_accept_loop, args=(listener,), name="relay-accept", daemon=True).start()
+    log(f"[SERVER] Accepting spectator relays on port {port}")
+
+def run_threaded(port, udp=False, netsim=None, relay_port=0):
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow address reuse
 
     try:
-        server.bind(("0.0.0.0", 5555))
+        server.bind(("0.0.0.0", port))
         server.listen(10)  # Allow up to 10 connections in the queue
-        print("[SERVER] Server starting in port 5555...")
-        print("[SERVER] Waiting for players...")
+        log(f"[SERVER] Server starting in port {port}...")
+        log("[SERVER] Waiting for players...")
 
-        # Start game loop in a separate thread
-        threading.Thread(target=game_loop, daemon=True).start()
+        if udp:
+            open_udp(port, netsim)
+        if relay_port:
+            open_relay_port(relay_port)
+        start_game_loop()
 
         while True:
             try:
-                conn, addr = server.accept()
-                print(f"[NEW CONNECTION] {addr}")
-                id_count += 1
-
-                # Create new player
-                spawn_x, spawn_y = get_spawn_position()
-                color = get_player_color()
-
-                with lock:
-                    players[id_count] = {
-                        "x": spawn_x, "y": spawn_y,
-                        "color": color,
-                        "bullets": [],
-                        "health": 100,
-                        "spectator": False,
-                        "kills": 0,
-                        "deaths": 0,
-                        "last_shot": 0
-                    }
-
-                threading.Thread(target=manage_client, args=(conn, id_count)).start()
+                accept_client(*server.accept())
 
             except KeyboardInterrupt:
-                print("\n[SERVER] Closing server...")
+                log("\n[SERVER] Closing server...")
                 break
             except Exception as e:
-                print(f"[SERVER] Error accepting connections: {e}")
+                log(f"[SERVER] Error accepting connections: {e}")
 
     except Exception as e:
-        print(f"[SERVER] Error starting server: {e}")
+        log(f"[SERVER] Error starting server: {e}")
     finally:
         server.close()
 
+def stop_recording():
+    """Close the recording; the game loop must be stopped first"""
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        log(f"[SERVER] Recording closed after {recorder.records} records")
+        recorder = None
+
+def configure(args):
+    """Apply the simulation, recording and monitoring options of the command line"""
+    global bullet_pool, scheduler, history, recorder, pickups, codec, TICK_RATE
+    bullet_pool = make_bullet_pool(args.bullets)
+    pickups = PickupManager(rng, args.pickup_spawn, args.pickup_types, args.pickups_per_player)
+    log(f"[SERVER] Bullet backend: {bullet_pool.backend}")
+    TICK_RATE = args.tick_rate
+    scheduler = TickScheduler(args.tick_rate, args.send_rate, args.max_catch_up, timings=tick_timings)
+    history = PositionHistory(round(args.max_rewind * TICK_RATE) + 1)
+    if args.compress:
+        dictionary = load_dictionary()
+        codec = SnapshotCodec(dictionary, args.compress)
+        log(f"[SERVER] Offering compressed snapshots (zlib level {args.compress}, "
+            + (f"{len(dictionary)} B dictionary)" if dictionary else "no dictionary found)"))
+    seed = args.seed
+    if seed is None and args.record:
+        seed = random.getrandbits(63)
+    if seed is not None:
+        rng.seed(seed)
+    if args.record:
+        recorder = MatchRecorder(args.record, seed, TICK_RATE, history.capacity, bullet_pool.backend, pickups)
+        log(f"[SERVER] Recording the match to {args.record} (seed {seed})")
+    if args.metrics_port:
+        start_monitor(args.metrics_port, metrics_text)
+        log(f"[SERVER] Metrics on http://127.0.0.1:{args.metrics_port}/metrics, profiler on /profile")
+    if args.timing_report > 0:
+        threading.Thread(target=timing_reporter, args=(args.timing_report,), name="timing-report", daemon=True).start()
+
+def reset_world():
+    """Forget every player, connection, bullet, pickup and sent snapshot, keeping what configure() set.
+
+    For benchmarks that play several matches in one process; the game loop
+    must not be running.
+    """
+    global bullet_pool
+    for table in (players, inputs, conns, relays, mailboxes, acks, input_seqs, rtts, interp_delays, snapshot_ring,
+                  snapshot_times):
+        table.clear()
+    throttled_clients.clear()
+    bullet_pool = make_bullet_pool(bullet_pool.backend)
+    history.clear()
+    pickups.clear()
+
+def netsim_options(args):
+    """NetSim keyword arguments for the --sim-* options, None when they are all off"""
+    if args.sim_loss or args.sim_latency or args.sim_jitter:
+        return {"loss": args.sim_loss, "latency": args.sim_latency, "jitter": args.sim_jitter}
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Shooter LAN - Arena server")
+    parser.add_argument("--mode", choices=["threads", "asyncio"], default="threads",
+                        help="threads: one thread per client (default), asyncio: single event loop")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--arenas", type=int, default=1,
+                        help="independent arenas, each in its own process behind a router on --port "
+                             "(1: one world in this process, 0: one per available core)")
+    parser.add_argument("--arena-size", type=int, default=16,
+                        help="players the router puts in an arena before filling the next one")
+    parser.add_argument("--bullets", choices=["auto", "numpy", "python"], default="auto",
+                        help="bullet simulation backend (auto: numpy when installed)")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE, help="simulation ticks per second")
+    parser.add_argument("--send-rate", type=int, default=SEND_RATE, help="snapshots per second")
+    parser.add_argument("--max-catch-up", type=int, default=5,
+                        help="most ticks run back to back after a stall, the rest are skipped")
+    parser.add_argument("--max-rewind", type=float, default=MAX_REWIND, metavar="SECONDS",
+                        help="most time hit detection rewinds to compensate for lag (0: off)")
+    parser.add_argument("--compress", type=int, nargs="?", const=DEFAULT_LEVEL, default=0, metavar="LEVEL",
+                        help=f"offer clients zlib compressed snapshots with the shipped dictionary "
+                             f"(level 1-9, default {DEFAULT_LEVEL})")
+    parser.add_argument("--metrics-port", type=int, default=0, metavar="PORT",
+                        help="serve /metrics (Prometheus) and /profile on localhost:PORT (0: off)")
+    parser.add_argument("--timing-report", type=float, default=0, metavar="SECONDS",
+                        help="print tick timing percentiles every SECONDS (0: never)")
+    parser.add_argument("--pickup-spawn", choices=sorted(SPAWN_RULES), default="uniform",
+                        help="where pickups appear (uniform: anywhere, spread: away from players and pickups)")
+    parser.add_argument("--pickup-types", default="health", metavar="MIX",
+                        help="pickup types and their weights, such as health:1,medkit:0.1 "
+                             f"(types: {', '.join(PICKUP_TYPES)})")
+    parser.add_argument("--pickups-per-player", type=float, default=1.0,
+                        help="pickups on the map per alive player (at least one is always there)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the simulation's random choices (spawns, colors, pickups)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the match to PATH for replay.py (a random seed is picked if none is given)")
+    parser.add_argument("--udp", action="store_true",
+                        help="also accept UDP clients on the same port (TCP stays for the handshake)")
+    parser.add_argument("--relay-port", type=int, default=0, metavar="PORT",
+                        help="accept spectator relays (relay.py) on PORT, each takes every snapshot "
+                             "without a player slot (0: off)")
+    parser.add_argument("--sim-loss", type=float, default=0.0,
+                        help="drop this fraction of outgoing UDP datagrams (testing only)")
+    parser.add_argument("--sim-latency", type=float, default=0.0,
+                        help="delay outgoing UDP datagrams by this many seconds (testing only)")
+    parser.add_argument("--sim-jitter", type=float, default=0.0,
+                        help="add up to this many seconds of random delay (testing only)")
+    args = parser.parse_args()
+    try:
+        parse_mix(args.pickup_types)
+    except ValueError as e:
+        parser.error(f"--pickup-types: {e}")
+
+    if args.arenas != 1:
+        import arenas
+        arenas.run_router(args)
+        return
+
+    configure(args)
+    try:
+        if args.mode == "asyncio":
+            try:
+                asyncio.run(async_main(args.port, args.udp, netsim_options(args), args.relay_port))
+            except KeyboardInterrupt:
+                log("\n[SERVER] Closing server...")
+        else:
+            run_threaded(args.port, args.udp, netsim_options(args), args.relay_port)
+    finally:
+        stop_game_loop()
+        stop_recording()
+        log.close()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+import math
+from collections import deque
+
+from rules import BULLET_SPEED, move
+
+# Client side smoothing of server snapshots
+#
+# Remote players and bullets are drawn a little in the past: SnapshotBuffer
+# keeps the recent snapshots on the server's clock (tick / tick rate) and
+# interpolates between the two around "now - delay". When the next snapshot
+# is late it extrapolates for a short while, then holds the last position.
+#
+# The local player is drawn in the present: Predictor applies each input as
+# soon as it is sent, and when a snapshot arrives it restarts from the
+# server's position, replaying the inputs the server had not applied yet
+# (the snapshot echoes the seq of the last one it did). Any difference left
+# is blended out over a few frames instead of snapping.
+
+INTERP_DELAY = 0.1        # Seconds remote entities are drawn behind the newest snapshot
+MAX_EXTRAPOLATION = 0.15  # Seconds we keep moving entities past the newest snapshot
+CLOCK_DRIFT = 0.01        # How fast the clock offset follows slower snapshot arrivals
+TELEPORT_DISTANCE = 200   # Pixels; farther jumps (respawns) are not interpolated
+CORRECTION_RATE = 10      # 1/seconds; how fast prediction errors are blended out
+SNAP_DISTANCE = 150       # Pixels; larger prediction errors are corrected at once
+
+
+class SnapshotBuffer:
+    """Recent snapshots on the server's clock, sampled at a delayed render time"""
+
+    def __init__(self, tick_rate, delay=INTERP_DELAY, size=32):
+        self.tick_rate = tick_rate
+        self.delay = delay
+        self.states = deque(maxlen=size)  # (server time, state), oldest first
+        self.offset = None  # Local time minus server time of the fastest snapshot seen
+
+    def push(self, state, now):
+        server_time = state["tick"] / self.tick_rate
+        if self.states and server_time <= self.states[-1][0]:
+            return
+        sample = now - server_time
+        if self.offset is None or sample < self.offset:
+            self.offset = sample
+        else:
+            # Follow clock drift and route changes slowly, ignoring jitter
+            self.offset += (sample - self.offset) * CLOCK_DRIFT
+        self.states.append((server_time, state))
+
+    def clear(self):
+        self.states.clear()
+
+    def sample(self, now):
+        """Players dict, as in a state, interpolated for the render time"""
+        states = self.states
+        if not states:
+            return {}
+        render_time = now - self.offset - self.delay
+        if render_time <= states[0][0] or len(states) == 1:
+            return states[0][1]["players"]
+        for i in range(len(states) - 1, 0, -1):
+            t0, s0 = states[i - 1]
+            t1, s1 = states[i]
+            if t0 <= render_time:
+                if render_time > t1:
+                    # Newest snapshot is late, keep going for a bit
+                    render_time = t1 + min(render_time - t1, MAX_EXTRAPOLATION)
+                return blend_players(s0["players"], s1["players"], (render_time - t0) / (t1 - t0), t1 - t0)
+        return states[0][1]["players"]
+
+
+def lerp(a, b, f):
+    return a + (b - a) * f
+
+
+def blend_players(old, new, f, interval):
+    """Players of new moved fraction f of the way from their position in old (f > 1 extrapolates)"""
+    blended = {}
+    for pid, p in new.items():
+        o = old.get(pid)
+        if (o is None or o["spectator"] != p["spectator"]
+                or abs(p["x"] - o["x"]) + abs(p["y"] - o["y"]) > TELEPORT_DISTANCE):
+            blended[pid] = p
+            continue
+        q = dict(p)
+        q["x"] = lerp(o["x"], p["x"], f)
+        q["y"] = lerp(o["y"], p["y"], f)
+        if p["bullets"] or o["bullets"]:
+            q["bullets"] = blend_bullets(o["bullets"], p["bullets"], f, interval)
+        blended[pid] = q
+    return blended
+
+
+def blend_bullets(old, new, f, interval):
+    """Interpolate bullets, pairing each with its position in the older snapshot.
+
+    Both lists are in firing order and bullets only disappear or get
+    appended, so a single forward scan finds the pairs.
+    """
+    reach = BULLET_SPEED * interval * 1.5 + 10  # Manhattan distance a bullet can cover
+    blended = []
+    i = 0
+    for b in new:
+        j = i
+        while j < len(old) and abs(old[j]["x"] - b["x"]) + abs(old[j]["y"] - b["y"]) > reach:
+            j += 1
+        if j == len(old):
+            blended.append(b)  # Fired since the older snapshot
+            continue
+        o = old[j]
+        blended.append({"x": lerp(o["x"], b["x"], f), "y": lerp(o["y"], b["y"], f)})
+        i = j + 1
+    return blended
+
+
+class Predictor:
+    """Local player position predicted from inputs the server has not applied yet"""
+
+    def __init__(self, size=256):
+        self.pending = deque(maxlen=size)  # (seq, move_x, move_y, sprint, dt), oldest first
+        self.x = self.y = None  # Predicted position, None until the first snapshot
+        self.error_x = self.error_y = 0.0  # Drawn position minus predicted position
+
+    def reset(self):
+        self.pending.clear()
+        self.x = self.y = None
+        self.error_x = self.error_y = 0.0
+
+    def add_input(self, seq, move_x, move_y, sprint, dt):
+        """Apply an input as it is sent"""
+        self.pending.append((seq, move_x, move_y, sprint, dt))
+        if self.x is not None:
+            self.x, self.y = move(self.x, self.y, move_x, move_y, sprint, dt)
+        # Blend out what is left of the last correction
+        decay = math.exp(-CORRECTION_RATE * dt)
+        self.error_x *= decay
+        self.error_y *= decay
+
+    def reconcile(self, x, y, input_seq):
+        """Restart from the server's position after input_seq and replay the rest"""
+        while self.pending and self.pending[0][0] <= input_seq:
+            self.pending.popleft()
+        for _, move_x, move_y, sprint, dt in self.pending:
+            x, y = move(x, y, move_x, move_y, sprint, dt)
+        if self.x is not None:
+            self.error_x += self.x - x
+            self.error_y += self.y - y
+            if math.hypot(self.error_x, self.error_y) > SNAP_DISTANCE:
+                self.error_x = self.error_y = 0.0
+        self.x, self.y = x, y
+
+    def position(self):
+        """Where to draw the local player"""
+        return self.x + self.error_x, self.y + self.error_y
@@ -0,0 +1,68 @@
+# Uniform spatial hash over the map
+#
+# Entities are stored in every grid cell their bounding box touches, so a
+# point or rectangle query only has to look at the entities in the cells it
+# covers instead of every entity on the map. Bounds are inclusive, matching
+# the collision checks in the game loop.
+
+CELL_SIZE = 128
+
+
+class SpatialHash:
+    """Grid of cells mapping keys to values by bounding box"""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # {(cx, cy): {key: value}}
+        self.keys = {}   # {key: [(cx, cy), ...]}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+
+    def _cell_range(self, x, y, w, h):
+        size = self.cell_size
+        return (int(x // size), int((x + w) // size),
+                int(y // size), int((y + h) // size))
+
+    def insert(self, key, value, x, y, w=0, h=0):
+        """Store value under key in every cell touched by the box (x, y, w, h)"""
+        if key in self.keys:
+            self.remove(key)
+        x0, x1, y0, y1 = self._cell_range(x, y, w, h)
+        cells = self.cells
+        touched = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cell = cells[(cx, cy)] = {}
+                cell[key] = value
+                touched.append((cx, cy))
+        self.keys[key] = touched
+
+    def remove(self, key):
+        for cell_key in self.keys.pop(key, ()):
+            cell = self.cells[cell_key]
+            del cell[key]
+            if not cell:
+                del self.cells[cell_key]
+
+    def query_point(self, x, y):
+        """Every {key: value} whose cell contains the point. Do not modify the result"""
+        size = self.cell_size
+        return self.cells.get((int(x // size), int(y // size)), {})
+
+    def query_rect(self, x, y, w, h):
+        """Every {key: value} touching the cells covered by the box (x, y, w, h)"""
+        x0, x1, y0, y1 = self._cell_range(x, y, w, h)
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return found
@@ -0,0 +1,206 @@
+import bisect
+import math
+import threading
+
+# Lightweight timing histograms
+#
+# Observing a value is a bisect and a few additions, cheap enough for every
+# tick. Bucket bounds are in seconds and chosen around the 16.6 ms budget of
+# a 60 Hz tick.
+#
+# Bucket bounds are all a histogram's percentiles can tell apart. Benchmarks
+# that need exact percentiles keep every value in Samples instead, which is
+# fine for a run of a few minutes.
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.0166, 0.025, 0.05, 0.1, 0.25, math.inf)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, math.inf)  # Bytes
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the observations of a histogram with the same buckets"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        """Bucket counts and totals, to rebuild the histogram in another process"""
+        return {"counts": self.counts, "count": self.count, "sum": self.sum, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data, buckets=DEFAULT_BUCKETS):
+        histogram = cls(buckets)
+        histogram.counts = list(data["counts"])
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        histogram.max = data["max"]
+        return histogram
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (0 < q <= 1)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class Samples:
+    """Every observed value, for exact percentiles; same interface as Histogram"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def observe(self, value):
+        self.values.append(value)
+
+    def merge(self, other):
+        self.values.extend(other.values)
+
+    def percentile(self, q, ordered=None):
+        """The q-th quantile (0 < q <= 1), nearest rank"""
+        if not self.values:
+            return 0.0
+        if ordered is None:
+            ordered = sorted(self.values)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def summary(self):
+        ordered = sorted(self.values)
+        return {
+            "count": len(ordered),
+            "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+            "p50": self.percentile(0.5, ordered),
+            "p95": self.percentile(0.95, ordered),
+            "p99": self.percentile(0.99, ordered),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+
+class TickTimings:
+    """One histogram per tick phase plus scheduler counters"""
+
+    def __init__(self, phases=("inputs", "simulate", "collide", "broadcast", "tick")):
+        self.lock = threading.Lock()
+        self.phases = {name: Histogram() for name in phases}
+        self.samples = None  # {phase: Samples} once keep_samples() is called
+        self.ticks = 0
+        self.overruns = 0       # Ticks that took longer than their time budget
+        self.catch_ups = 0      # Times the loop fell behind and ran several ticks back to back
+        self.skipped_ticks = 0  # Ticks dropped because the catch-up limit was hit
+
+    def record(self, phase, seconds):
+        with self.lock:
+            self.phases[phase].observe(seconds)
+            if self.samples is not None:
+                self.samples[phase].observe(seconds)
+
+    def keep_samples(self):
+        """Also keep every timing from now on, so summaries give exact percentiles (benchmarks)"""
+        with self.lock:
+            self.samples = {name: Samples() for name in self.phases}
+
+    def reset(self):
+        """Start every histogram and counter over, e.g. after a warm-up"""
+        with self.lock:
+            self.phases = {name: Histogram(h.buckets) for name, h in self.phases.items()}
+            if self.samples is not None:
+                self.samples = {name: Samples() for name in self.phases}
+            self.ticks = self.overruns = self.catch_ups = self.skipped_ticks = 0
+
+    def summary(self):
+        with self.lock:
+            return {
+                "ticks": self.ticks,
+                "overruns": self.overruns,
+                "catch_ups": self.catch_ups,
+                "skipped_ticks": self.skipped_ticks,
+                "phases": {name: h.summary() for name, h in (self.samples or self.phases).items()},
+            }
+
+    def report(self):
+        """One line summary in milliseconds, for logs"""
+        summary = self.summary()
+        phases = " ".join(f"{name} p50={s['p50']*1000:.2f} p95={s['p95']*1000:.2f} max={s['max']*1000:.2f}"
+                          for name, s in summary["phases"].items())
+        return (f"ticks={summary['ticks']} overruns={summary['overruns']} catch_ups={summary['catch_ups']} "
+                f"skipped={summary['skipped_ticks']} | {phases} (ms)")
+
+
+class Counter:
+    """A total that several threads add to"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def add(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+# Prometheus text exposition format
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_metric(name, kind, help_text, samples):
+    """Lines for a counter or gauge; samples is a list of (labels dict or None, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+    return lines
+
+
+def prometheus_histogram(name, help_text, histograms):
+    """Lines for histograms; histograms is a list of (labels dict or None, Histogram)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        labels = labels or {}
+        counts = list(histogram.counts)  # One copy, so the buckets and the count agree
+        total = 0
+        for bound, count in zip(histogram.buckets, counts):
+            total += count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=le))} {total}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {total}")
+    return lines